@@ -4,6 +4,7 @@ import { Button } from "@/components/ui/button";
 import { Download, Share2, Activity, Clock, AlertTriangle, ShieldCheck, ArrowRight, X, Loader2, Sparkles, Target, FileText } from "lucide-react";
 import { AreaChart, Area, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, BarChart, Bar, Legend } from "recharts";
 import { toast } from "sonner";
+import { traceHeaders } from "@/services/api";
 
 interface DetailedReportViewProps {
     reportData: any;
@@ -52,7 +53,7 @@ const DetailedReportView = ({ reportData, onClose, onRestart }: DetailedReportVi
 
             const response = await fetch(`${apiUrl}/llm/generate_report`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', ...traceHeaders() },
                 body: JSON.stringify({ analysis_data: reportData })
             });
 
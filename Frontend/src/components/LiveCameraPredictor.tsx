@@ -13,6 +13,7 @@ import {
   DropdownMenuSeparator,
 } from "@/components/ui/dropdown-menu";
 import { cn } from "@/lib/utils";
+import { COLUMNAR_JSON, decodeDetections } from "@/services/api";
 
 interface LiveCameraPredictorProps {
   onReportGenerated?: (report: any) => void;
@@ -101,12 +102,13 @@ const LiveCameraPredictor = ({ onReportGenerated }: LiveCameraPredictorProps) =>
             const startTime = Date.now();
             const response = await fetch('http://localhost:5000/stream/detect', {
               method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
+              headers: { 'Content-Type': 'application/json', Accept: COLUMNAR_JSON },
               body: JSON.stringify({ frame: frameBase64 })
             });
 
             if (response.ok) {
               const data = await response.json();
+              data.detections = decodeDetections(data.detections);
               if (data.success && data.detections) {
                 const duration = Date.now() - startTime;
                 const realFps = Math.round(1000 / duration);
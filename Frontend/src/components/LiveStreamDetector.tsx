@@ -3,6 +3,7 @@ import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { AlertCircle, X, Download, Wifi, Radio, Zap } from "lucide-react";
 import { toast } from "sonner";
+import { COLUMNAR_JSON, decodeDetections } from "@/services/api";
 
 // ============================================================================
 // TYPE DEFINITIONS
@@ -399,7 +400,7 @@ const LiveStreamDetector = () => {
 
         const response = await fetch("http://localhost:5000/stream/detect", {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: { "Content-Type": "application/json", Accept: COLUMNAR_JSON },
           body: JSON.stringify({ frame: frameBase64 }),
         });
 
@@ -408,6 +409,7 @@ const LiveStreamDetector = () => {
         }
 
         const data = await response.json();
+        data.detections = decodeDetections(data.detections);
         const detectionLatency = Date.now() - detectionStartTime;
         latenciesRef.current.push(detectionLatency);
         if (latenciesRef.current.length > 30) {
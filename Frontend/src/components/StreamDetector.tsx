@@ -6,6 +6,7 @@ import { Alert, AlertDescription } from '@/components/ui/alert';
 import { AlertCircle, Play, Square, Download, Upload, Video, FileVideo, CheckCircle2, Scan, Activity, ChevronRight, BarChart4 } from 'lucide-react';
 import { toast } from 'sonner';
 import { cn } from '@/lib/utils';
+import { COLUMNAR_JSON, decodeDetections, startTrace, traceHeaders } from '@/services/api';
 
 interface StreamDetectorProps {
   onReportGenerated?: (report: any) => void;
@@ -56,9 +57,11 @@ export default function StreamDetector({ onReportGenerated }: StreamDetectorProp
       return;
     }
     setMode('watching');
+    startTrace();
 
     try {
       let processPath = streamSource;
+      let uploadId: string | null = null;
 
       // Step 1: Upload File if selected (same as processAndReport)
       if (selectedFile) {
@@ -68,21 +71,22 @@ export default function StreamDetector({ onReportGenerated }: StreamDetectorProp
         // We don't show a progress bar for "Watching", just start it
         const uploadRes = await fetch('http://localhost:5000/upload', {
           method: 'POST',
+          headers: traceHeaders(),
           body: formData
         });
 
         if (uploadRes.ok) {
           const uploadData = await uploadRes.json();
-          processPath = uploadData.file_path;
+          uploadId = uploadData.upload_id;
         }
       }
 
       // Step 2: Start Analysis Stream for LIVE OVERLAY
       const response = await fetch('http://localhost:5000/stream/detect', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', Accept: COLUMNAR_JSON, ...traceHeaders() },
         body: JSON.stringify({
-          video_path: processPath,
+          ...(uploadId ? { upload_id: uploadId } : { video_path: processPath }),
           conf_thresh: 0.25
         })
       });
@@ -108,6 +112,7 @@ export default function StreamDetector({ onReportGenerated }: StreamDetectorProp
           if (line.trim()) {
             try {
               const result = JSON.parse(line);
+              result.detections = decodeDetections(result.detections);
               // Update Overlay Stats with REAL Data
               if (result.detections && result.detections.length > 0) {
                 const topDet = result.detections[0];
@@ -141,9 +146,12 @@ export default function StreamDetector({ onReportGenerated }: StreamDetectorProp
     setMode('processing');
     setIsProcessing(true);
     setProgress(5);
+    // Upload, stream and the report generated from it share one trace
+    startTrace();
 
     try {
       let processPath = streamSource;
+      let uploadId: string | null = null;
 
       // Step 1: Upload File if selected
       if (selectedFile) {
@@ -154,22 +162,23 @@ export default function StreamDetector({ onReportGenerated }: StreamDetectorProp
         // Upload to backend
         const uploadRes = await fetch('http://localhost:5000/upload', {
           method: 'POST',
+          headers: traceHeaders(),
           body: formData
         });
 
         if (!uploadRes.ok) throw new Error("Upload failed");
 
         const uploadData = await uploadRes.json();
-        processPath = uploadData.file_path; // Server-side path
+        uploadId = uploadData.upload_id; // Opaque id of the stored upload
         setProgress(30);
       }
 
       // Step 2: Start Analysis Stream
       const response = await fetch('http://localhost:5000/stream/detect', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', Accept: COLUMNAR_JSON, ...traceHeaders() },
         body: JSON.stringify({
-          video_path: processPath,
+          ...(uploadId ? { upload_id: uploadId } : { video_path: processPath }),
           conf_thresh: 0.25
         })
       });
@@ -200,6 +209,7 @@ export default function StreamDetector({ onReportGenerated }: StreamDetectorProp
           if (line.trim()) {
             try {
               const result = JSON.parse(line);
+              result.detections = decodeDetections(result.detections);
               if (result.detections && result.detections.length > 0) {
                 allDetections.push(...result.detections);
 
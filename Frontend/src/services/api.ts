@@ -14,6 +14,84 @@ export interface PredictionResult {
   boxes?: any[];
 }
 
+// Opt-in compact detection format for /stream/detect (frames and video NDJSON);
+// send it as the Accept header and pass the response's detections to decodeDetections()
+export const COLUMNAR_JSON = 'application/vnd.agrovision.columnar+json';
+
+export interface DetectionBox {
+  class: string;
+  conf: number;
+  x1: number;
+  y1: number;
+  x2: number;
+  y2: number;
+  x: number;
+  y: number;
+  w: number;
+  h: number;
+}
+
+export interface ColumnarDetections {
+  classes: string[];
+  cls: number[];
+  conf: number[];
+  x1: number[];
+  y1: number[];
+  x2: number[];
+  y2: number[];
+}
+
+/**
+ * Expand columnar detections into the row format ({class, conf, x1..y2, x/y/w/h});
+ * row-format lists (the default response, fallback model) pass through unchanged
+ * @param detections - `detections` from a /stream/detect response or NDJSON record
+ * @returns One box per detection
+ */
+export function decodeDetections(detections: DetectionBox[] | ColumnarDetections | undefined): DetectionBox[] {
+  if (!detections) return [];
+  if (Array.isArray(detections)) return detections;
+  const { classes, cls, conf, x1, y1, x2, y2 } = detections;
+  return cls.map((c, i) => ({
+    class: classes[c],
+    conf: conf[i],
+    x1: x1[i],
+    y1: y1[i],
+    x2: x2[i],
+    y2: y2[i],
+    x: x1[i],
+    y: y1[i],
+    w: x2[i] - x1[i],
+    h: y2[i] - y1[i],
+  }));
+}
+
+// Trace id shared by every request of one user action (upload → predict → analyze → report),
+// so the backend's spans for those requests land in a single trace
+let currentTraceId: string | null = null;
+
+function randomHex(bytes: number): string {
+  const values = crypto.getRandomValues(new Uint8Array(bytes));
+  return Array.from(values, (v) => v.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * Start a new trace for a user action; later traceHeaders() calls join it
+ * @returns The new trace id
+ */
+export function startTrace(): string {
+  currentTraceId = randomHex(16);
+  return currentTraceId;
+}
+
+/**
+ * W3C traceparent header for the current action (starts one if none is active)
+ * @returns Headers to merge into a fetch() call
+ */
+export function traceHeaders(): Record<string, string> {
+  const traceId = currentTraceId ?? startTrace();
+  return { traceparent: `00-${traceId}-${randomHex(8)}-01` };
+}
+
 /**
  * Upload an image to the backend for disease prediction
  * @param file - The image file to analyze
@@ -24,8 +102,10 @@ export async function predictDisease(file: File): Promise<PredictionResult> {
     const formData = new FormData();
     formData.append('file', file);
 
+    startTrace();
     const response = await fetch(`${API_BASE_URL}/predict`, {
       method: 'POST',
+      headers: traceHeaders(),
       body: formData,
     });
 
@@ -0,0 +1,326 @@
+"""
+Admission control and load shedding for inference routes.
+
+Every inference request asks the AdmissionController for a slot before it
+decodes anything. Slots are limited globally (the detector is shared) and
+per route. A request that can't run immediately waits in one bounded queue
+ordered by priority (live frames before photo uploads before bulk video),
+then arrival order. When the queue is full, a request either displaces the
+lowest-priority waiter or is rejected straight away. A waiter that outlives
+its route's max_wait is rejected too. Rejections become 429 responses with
+a Retry-After estimated from recent service times. Overload therefore
+costs callers a fast retry instead of inflating everyone's latency.
+"""
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITY_LIVE = 0
+PRIORITY_UPLOAD = 1
+PRIORITY_BULK = 2
+
+
+@dataclass
+class RouteLimit:
+    """
+    Admission settings for one route class.
+
+    Args:
+        max_concurrent: Requests of this route running at once
+        max_queue: Requests of this route waiting at once
+        max_wait_s: Longest a request may wait for a slot before it is rejected
+        priority: Queue order (PRIORITY_LIVE / _UPLOAD / _BULK)
+    """
+    max_concurrent: int
+    max_queue: int
+    max_wait_s: float
+    priority: int = PRIORITY_UPLOAD
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; carries the Retry-After hint in seconds"""
+
+    def __init__(self, route: str, reason: str, retry_after: int):
+        super().__init__(f"{route}: {reason}")
+        self.route = route
+        self.reason = reason  # 'queue_full' | 'timeout' | 'evicted'
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('route', 'priority', 'seq', 'granted', 'evicted')
+
+    def __init__(self, route: str, priority: int, seq: int):
+        self.route = route
+        self.priority = priority
+        self.seq = seq
+        self.granted = False
+        self.evicted = False
+
+
+class _RouteStats:
+    def __init__(self):
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {'queue_full': 0, 'timeout': 0, 'evicted': 0}
+        self.service_ewma_s = 0.0
+        self.waits = deque(maxlen=1024)  # Seconds spent queued by recently admitted requests
+
+
+class Ticket:
+    """A granted slot; release() it (or use AdmissionController.admit) when the work is done"""
+
+    def __init__(self, controller: "AdmissionController", route: str):
+        self._controller = controller
+        self.route = route
+        self.started = time.perf_counter()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """
+    Args:
+        max_concurrent: Slots shared by all routes
+        max_queue: Waiters across all routes
+        routes: Per-route limits, keyed by route name
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, routes: Dict[str, RouteLimit]):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.routes = routes
+        self._in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stats = {name: _RouteStats() for name in routes}
+
+    # ------------------------------------------------------------------
+    # Acquire / release
+    # ------------------------------------------------------------------
+
+    def _can_run(self, route: str) -> bool:
+        return (self._in_flight < self.max_concurrent
+                and self._stats[route].in_flight < self.routes[route].max_concurrent)
+
+    def _grant(self, route: str):
+        self._in_flight += 1
+        self._stats[route].in_flight += 1
+        self._stats[route].admitted += 1
+
+    def _dispatch(self):
+        """Hand free slots to waiters in (priority, arrival) order, skipping routes at their cap"""
+        for waiter in sorted(self._waiters, key=lambda w: (w.priority, w.seq)):
+            if self._in_flight >= self.max_concurrent:
+                break
+            if self._can_run(waiter.route):
+                self._waiters.remove(waiter)
+                self._stats[waiter.route].queued -= 1
+                self._grant(waiter.route)
+                waiter.granted = True
+        self._cond.notify_all()
+
+    def _reject(self, route: str, reason: str) -> AdmissionRejected:
+        self._stats[route].rejected[reason] += 1
+        return AdmissionRejected(route, reason, self.retry_after(route))
+
+    def acquire(self, route: str, priority: Optional[int] = None) -> Ticket:
+        """
+        Wait for a slot on route.
+
+        Raises:
+            AdmissionRejected: queue full, waited longer than max_wait_s, or displaced
+                               by a higher-priority request
+        """
+        limit = self.routes[route]
+        priority = limit.priority if priority is None else priority
+        stats = self._stats[route]
+        arrived = time.perf_counter()
+
+        with self._cond:
+            if self._can_run(route) and not any(w.route == route for w in self._waiters):
+                self._grant(route)
+                stats.waits.append(0.0)
+                return Ticket(self, route)
+
+            if len(self._waiters) >= self.max_queue or stats.queued >= limit.max_queue:
+                # Full: displace the worst waiter of lower priority, else shed this request
+                pool = self._waiters if len(self._waiters) >= self.max_queue else \
+                    [w for w in self._waiters if w.route == route]
+                victim = max(pool, key=lambda w: (w.priority, w.seq), default=None)
+                if victim is None or victim.priority <= priority:
+                    raise self._reject(route, 'queue_full')
+                self._waiters.remove(victim)
+                self._stats[victim.route].queued -= 1
+                victim.evicted = True
+                self._cond.notify_all()
+
+            self._seq += 1
+            waiter = _Waiter(route, priority, self._seq)
+            self._waiters.append(waiter)
+            stats.queued += 1
+
+            deadline = arrived + limit.max_wait_s
+            while not waiter.granted and not waiter.evicted:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._waiters.remove(waiter)
+                    stats.queued -= 1
+                    raise self._reject(route, 'timeout')
+                self._cond.wait(remaining)
+
+            if waiter.evicted:
+                raise self._reject(route, 'evicted')
+            stats.waits.append(time.perf_counter() - arrived)
+            return Ticket(self, route)
+
+    def _release(self, ticket: Ticket):
+        service_s = time.perf_counter() - ticket.started
+        with self._cond:
+            stats = self._stats[ticket.route]
+            stats.in_flight -= 1
+            self._in_flight -= 1
+            stats.service_ewma_s = service_s if stats.service_ewma_s == 0 else \
+                0.8 * stats.service_ewma_s + 0.2 * service_s
+            self._dispatch()
+
+    def admit(self, route: str, priority: Optional[int] = None) -> "_Admission":
+        """Context manager form: `with controller.admit('predict'): ...`"""
+        return _Admission(self, route, priority)
+
+    def retry_after(self, route: str) -> int:
+        """Seconds until a slot is likely free: queued work ahead / route concurrency x service time"""
+        stats = self._stats[route]
+        limit = self.routes[route]
+        service = stats.service_ewma_s or 1.0
+        return max(1, math.ceil(service * (stats.queued + 1) / limit.max_concurrent))
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict:
+        with self._cond:
+            routes = {}
+            for name, stats in self._stats.items():
+                waits = sorted(stats.waits)
+                routes[name] = {
+                    'in_flight': stats.in_flight,
+                    'queued': stats.queued,
+                    'admitted': stats.admitted,
+                    'rejected': dict(stats.rejected),
+                    'service_ewma_ms': round(stats.service_ewma_s * 1000, 1),
+                    'wait_p50_ms': _percentile_ms(waits, 0.50),
+                    'wait_p99_ms': _percentile_ms(waits, 0.99),
+                    'limits': {
+                        'max_concurrent': self.routes[name].max_concurrent,
+                        'max_queue': self.routes[name].max_queue,
+                        'max_wait_s': self.routes[name].max_wait_s,
+                        'priority': self.routes[name].priority
+                    }
+                }
+            return {
+                'in_flight': self._in_flight,
+                'queue_depth': len(self._waiters),
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'routes': routes
+            }
+
+
+class _Admission:
+    def __init__(self, controller: AdmissionController, route: str, priority: Optional[int]):
+        self._controller = controller
+        self._route = route
+        self._priority = priority
+        self._ticket: Optional[Ticket] = None
+
+    def __enter__(self) -> Ticket:
+        self._ticket = self._controller.acquire(self._route, self._priority)
+        return self._ticket
+
+    def __exit__(self, *exc):
+        self._ticket.release()
+        return False
+
+
+class TicketedStream:
+    """
+    Response iterable that holds an admission ticket until the stream is closed.
+
+    A plain generator's finally block never runs if the client disconnects before
+    the first chunk, so the ticket is released from close(), which the WSGI
+    server always calls.
+    """
+
+    def __init__(self, iterable: Iterable, ticket: Ticket):
+        self._iterable = iterable
+        self._ticket = ticket
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        try:
+            close = getattr(self._iterable, 'close', None)
+            if close:
+                close()
+        finally:
+            self._ticket.release()
+
+
+def _percentile_ms(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return round(sorted_values[index] * 1000, 1)
+
+
+# Route defaults: (max_concurrent, max_queue, max_wait_s, priority). A live frame older than
+# half a second is no longer worth answering; uploads and bulk video can wait longer.
+DEFAULT_ROUTES = {
+    'live': (2, 8, 0.5, PRIORITY_LIVE),
+    'predict': (2, 16, 10.0, PRIORITY_UPLOAD),
+    'video': (1, 4, 30.0, PRIORITY_BULK),
+}
+
+
+def from_env() -> AdmissionController:
+    """
+    Controller configured from the environment.
+
+    ADMISSION_MAX_CONCURRENT / ADMISSION_MAX_QUEUE set the shared limits;
+    ADMISSION_<ROUTE>_CONCURRENCY, _QUEUE and _WAIT_S override a route
+    (e.g. ADMISSION_LIVE_WAIT_S=0.25).
+    """
+    routes = {}
+    for name, (concurrent, queue, wait_s, priority) in DEFAULT_ROUTES.items():
+        prefix = f'ADMISSION_{name.upper()}_'
+        routes[name] = RouteLimit(
+            max_concurrent=int(os.environ.get(prefix + 'CONCURRENCY', concurrent)),
+            max_queue=int(os.environ.get(prefix + 'QUEUE', queue)),
+            max_wait_s=float(os.environ.get(prefix + 'WAIT_S', wait_s)),
+            priority=priority
+        )
+    controller = AdmissionController(
+        max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', '4')),
+        max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', '24')),
+        routes=routes
+    )
+    logger.info(f"🚦 Admission control: {controller.max_concurrent} slots, queue {controller.max_queue}, "
+                f"routes {', '.join(f'{n}={r.max_concurrent}' for n, r in routes.items())}")
+    return controller
@@ -10,14 +10,14 @@ Features:
 Usage:
   USE_YOLO=1 python app.py
   USE_YOLO=0 python app.py (fallback mode)
+  APP_ROLE=control python app.py (health/registry/LLM routes only, no ML stack)
 """
 
 import os
 import json
-import cv2
-import numpy as np
 import logging
 from io import BytesIO
+from urllib.parse import urlencode
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
@@ -29,24 +29,47 @@ from datetime import datetime
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_file, g
 from werkzeug.utils import secure_filename
 
-# Initialize logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s | %(levelname)s | %(message)s'
-)
+# Initialize logging (LOG_FORMAT=json, LOG_LEVELS / LOG_SAMPLE per subsystem; see log_config.py)
+from log_config import configure_logging
+configure_logging()
 logger = logging.getLogger(__name__)
+# Per-request routes log under their own names so they can be turned down or sampled alone
+predict_log = logging.getLogger('app.predict')
+stream_log = logging.getLogger('app.stream')
+admission_log = logging.getLogger('app.admission')
 
 # Create Flask app
 app = Flask(__name__)
+# orjson-backed jsonify when installed; gzip/brotli negotiated in after_request (see serialization.py)
+import serialization
+serialization.install_json_provider(app)
+compression = serialization.from_env()
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB for video files
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'mp4', 'avi', 'mov'}
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov'}
+# Directories a client-supplied video_path may point into, separated by os.pathsep (never the upload store)
+VIDEO_PATH_ROOTS = [p for p in os.environ.get('VIDEO_PATH_ROOTS', '').split(os.pathsep) if p]
+# Cameras and stream URLs clients may open live, as "name=uri,name=uri" (e.g. "gate=rtsp://10.0.0.5/main,usb=0")
+LIVE_SOURCES = dict(item.split('=', 1) for item in os.environ.get('LIVE_SOURCES', '').split(',') if '=' in item)
+# /stream/detect bodies taken as one encoded frame instead of JSON
+BINARY_FRAME_TYPES = {'image/jpeg', 'image/png', 'application/octet-stream'}
+JOBS_FOLDER = os.environ.get('VIDEO_JOBS_DIR', 'jobs')
+# Queued (not yet running) video jobs beyond this are refused with 429
+VIDEO_JOB_MAX_QUEUED = int(os.environ.get('VIDEO_JOB_MAX_QUEUED', '50'))
 USE_YOLO = os.environ.get('USE_YOLO', '1') in ('1', 'true', 'True')  # YOLO enabled by default
+# Process role: 'all' (default), 'inference', or 'control' - a slim process serving only
+# health/registry/LLM/analysis routes that never imports cv2, torch or Ultralytics
+APP_ROLE = os.environ.get('APP_ROLE', 'all').lower()
+SERVES_INFERENCE = APP_ROLE != 'control'
+# Set by gunicorn.conf.py when preload_app is on: the master loads the weights once and
+# workers share them copy-on-write; per-process threads start in init_worker() after fork
+PREFORK = os.environ.get('APP_PREFORK') == '1'
 
 # Create uploads directory
 if not os.path.exists(UPLOAD_FOLDER):
@@ -57,6 +80,8 @@ yolo_detector = None
 fallback_detector = None
 
 # Optimized Async Model Loading with Model Registry
+import queue
+import asyncio
 import threading
 import time
 from model_registry import ModelRegistry
@@ -64,9 +89,40 @@ from model_registry import ModelRegistry
 # Initialize Registry
 from model_registry import ModelRegistry
 from llm_registry import LLMRegistry
+from chunked_upload import ChunkedUploadManager, ChunkedUploadError, DEFAULT_CHUNK_SIZE
+import upload_store
+from upload_store import UploadStoreError
+from process_memory import process_memory
+import admission
+from admission import AdmissionRejected, TicketedStream
+from live_stream import LiveStream, LiveResponse
+import inference_scheduler
+from inference_scheduler import inference_class, FrameExpired, LIVE, UPLOAD, BATCH
+from profiling import Profiler, MAX_SAMPLE_SECONDS, MIN_SAMPLE_INTERVAL_S
+import tracing
+import detection_format
+
+if SERVES_INFERENCE:
+    # Inference plane (pulls in cv2/numpy; torch and Ultralytics load with the model)
+    from video_pipeline import iter_video_detections
+    from video_jobs import VideoJobManager, VideoJobError
+    from frame_sampler import AdaptiveFrameSampler
+    from stream_handler import StreamDetector
+    from video_renderer import render_annotated_video
+    from mjpeg_stream import MJPEGHub, BOUNDARY
+    from capture_supervisor import is_live_source
+    from stream_multiplexer import StreamMultiplexer, StreamSourceError
 
 model_registry = ModelRegistry()
 llm_registry = LLMRegistry()
+# Concurrency limits and load shedding for /predict and /stream/detect
+admission_control = admission.from_env()
+# Orders access to the shared model: live frames, then uploads, then batch video
+scheduler = inference_scheduler.from_env()
+# On-demand sampling / cProfile / tracemalloc; the admin routes exist only with PROFILING_TOKEN set
+profiler = Profiler(os.environ.get('PROFILING_TOKEN'))
+# Request-scoped trace ids and stage spans (exported only with TRACE_EXPORTER / OTEL_EXPORTER_OTLP_ENDPOINT)
+tracer = tracing.install(tracing.from_env())
 
 # Global status tracking
 model_status = {
@@ -87,44 +143,74 @@ def load_active_model_async():
         model_status["details"] = "No active model configuration"
         return
 
-    logger.info(f"🧵 [Background] Loading active model: {active_model.name} ({active_model.id})")
+    logger.info("🧵 [Background] Loading active model: %s (%s)", active_model.name, active_model.id)
     model_status["status"] = "loading"
     model_status["active_model_id"] = active_model.id
+    model_status["timings"] = {}
+    load_started = time.perf_counter()
     
     try:
         # Clear existing models to free memory
         yolo_detector = None
         fallback_detector = None
-        
-        # Simulate small delay for server responsiveness
-        time.sleep(1)
 
         if active_model.type == 'yolo':
-            logger.info(f"   Type: YOLO | Path: {active_model.path}")
+            logger.info("   Type: YOLO | Path: %s", active_model.path)
             from yolo_detector import YOLODetector
             
+            if PREFORK:
+                # No intra-op thread pool may exist at fork time (OpenMP pools don't survive it)
+                import torch
+                torch.set_num_threads(1)
+            
             yolo_detector = YOLODetector(
                 model_path=active_model.path,
                 conf_threshold=float(os.environ.get('YOLO_CONF_THRESH', '0.25')),
-                device=os.environ.get('YOLO_DEVICE', None)
+                # A pre-fork master stays off the GPU: a CUDA context can't be inherited by workers
+                device='cpu' if PREFORK else os.environ.get('YOLO_DEVICE', None),
+                warmup=False if PREFORK else None,
+                prepare_in_background=not PREFORK,
+                scheduler=scheduler
+            )
+            model_status["timings"] = dict(yolo_detector.timings)
+            model_status["cache"] = yolo_detector.cache_status
+            model_status["status"] = "ready"
+            model_status["details"] = f"Loaded {active_model.name}"
+            logger.info("✅ [Background] Model ready: %s", active_model.name)
+            
+        elif active_model.type == 'mock':
+            logger.info("   Type: Mock | Options: %s", active_model.options)
+            from mock_detector import MockDetector, MockCost
+            # MOCK_DETECTOR_OPTIONS (JSON) tunes the cost model per process, e.g. from loadgen.py
+            options = {**active_model.options, **json.loads(os.environ.get('MOCK_DETECTOR_OPTIONS') or '{}')}
+            yolo_detector = MockDetector(
+                conf_threshold=float(os.environ.get('YOLO_CONF_THRESH', '0.25')),
+                cost=MockCost.from_options(options),
+                scheduler=scheduler
             )
             model_status["status"] = "ready"
             model_status["details"] = f"Loaded {active_model.name}"
-            logger.info(f"✅ [Background] Model ready: {active_model.name}")
+            logger.info("✅ [Background] Model ready: %s", active_model.name)
             
         elif active_model.type == 'fallback':
-            logger.info(f"   Type: Fallback/Keras | Path: {active_model.path}")
+            logger.info("   Type: Fallback/Keras | Path: %s", active_model.path)
             # Note: The fallback implementation in predict.py might need path adjustment
             # For now, we reuse the existing _init_fallback logic but mapped to this model
             if _init_fallback():
+                model_status["timings"] = {'load_ms': round((time.perf_counter() - load_started) * 1000, 1)}
                 model_status["status"] = "ready"
                 model_status["details"] = f"Loaded {active_model.name}"
-                logger.info(f"✅ [Background] Model ready: {active_model.name}")
+                logger.info("✅ [Background] Model ready: %s", active_model.name)
             else:
                 raise RuntimeError("Fallback initialization failed")
+        
+        model_status["timings"]["total_ms"] = round((time.perf_counter() - load_started) * 1000, 1)
+        # Wall-clock from process start (registry init) to the first servable model
+        model_status.setdefault("time_to_ready_s", round(time.time() - model_status["start_time"], 2))
+        logger.info("⏱️  Model load phases: %s", model_status['timings'])
                 
     except Exception as e:
-        logger.error(f"❌ [Background] Model load failed: {e}")
+        logger.exception("❌ [Background] Model load failed: %s", e)
         model_status["status"] = "error"
         model_status["details"] = str(e)
 
@@ -158,18 +244,170 @@ logger.info("🚀 DISEASE DETECTION API - MANAGED MODEL SYSTEM")
 logger.info(f"👉 Active Model: {model_registry.active_model_id}")
 logger.info("="*60)
 
-# Start background thread
-loading_thread = threading.Thread(target=load_active_model_async, daemon=True)
-loading_thread.start()
+stream_detector = None
+video_jobs = None
+if SERVES_INFERENCE:
+    if PREFORK:
+        # Load before fork so every worker maps the same weight pages
+        load_active_model_async()
+    else:
+        # Start background thread
+        loading_thread = threading.Thread(target=load_active_model_async, daemon=True)
+        loading_thread.start()
+
+    # Frame-source helpers (video properties, keyframe-seek previews); uses the shared yolo_detector
+    stream_detector = StreamDetector(use_yolo=False)
+
+    # Background video jobs (resumed from checkpoints after a restart)
+    video_jobs = VideoJobManager(
+        JOBS_FOLDER,
+        detector_provider=lambda: yolo_detector,
+        num_workers=int(os.environ.get('VIDEO_JOB_WORKERS', '1')),
+        max_queued=VIDEO_JOB_MAX_QUEUED,
+        retention_s=float(os.environ.get('VIDEO_JOB_RETENTION_S', str(7 * 24 * 3600)))
+    )
+    if not PREFORK:
+        video_jobs.start()
+else:
+    model_status["status"] = "control-plane"
+    model_status["details"] = "Inference is served by separate worker processes (APP_ROLE=control)"
+    logger.info("🎛️  Control-plane role: model loading and inference routes disabled")
+
+_jobs_lock_file = None
+
+def init_worker():
+    """
+    Per-worker setup after a pre-fork (called from gunicorn's post_fork hook).
+    
+    Sizes torch's thread pool for this worker, moves the model to the GPU if one
+    was requested, warms the model up, and starts the video job workers in exactly
+    one worker (whichever holds the jobs-dir lock; a replacement worker takes over
+    if that one dies).
+    """
+    global _jobs_lock_file
+    if not SERVES_INFERENCE:
+        return
+    uploads.start()
+    
+    if yolo_detector is not None:
+        import torch
+        torch.set_num_threads(int(os.environ.get('TORCH_THREADS_PER_WORKER', '1')))
+        device = os.environ.get('YOLO_DEVICE')
+        if device and device != 'cpu':
+            yolo_detector.set_device(device)
+        yolo_detector.warmup()
+    
+    import fcntl
+    os.makedirs(JOBS_FOLDER, exist_ok=True)
+    lock_file = open(os.path.join(JOBS_FOLDER, '.workers.lock'), 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        # Another worker runs the jobs; this one submits and reads through the jobs dir
+        lock_file.close()
+        video_jobs.attach()
+        return
+    _jobs_lock_file = lock_file  # Held for the life of this worker
+    video_jobs.start(watch_disk=True)
+    logger.info(f"🎬 Worker {os.getpid()} owns the video job queue")
+
+def _on_chunked_upload_complete(session):
+    """
+    Move an assembled upload into the upload store (under the session's id) and hand
+    video uploads that requested it to the job queue
+    """
+    # Idempotent: when a retried completion finds the id already adopted, only the job submission
+    # failed last time. On UploadStoreError the file stays put and the client gets the status.
+    record = uploads.get(session.id)
+    if record is None:
+        record, _ = uploads.adopt(session.file_path, session.filename, upload_id=session.id,
+                                  sha256=session.sha256)
+    session.file_path = os.path.abspath(os.path.join(uploads.root, record.blob))
+    ext = session.filename.rsplit('.', 1)[-1].lower()
+    if session.auto_detect and ext in VIDEO_EXTENSIONS:
+        # A full job queue raises VideoJobError (429); the client retries completion later
+        session.job_id = video_jobs.submit(session.file_path).id
+
+# Deduplicated upload blobs behind opaque ids; a background sweeper enforces TTL and quota
+uploads = upload_store.from_env(UPLOAD_FOLDER)
+chunked_uploads = ChunkedUploadManager(UPLOAD_FOLDER, on_complete=_on_chunked_upload_complete)
+# Abandoned chunked sessions expire with the same TTL
+uploads.on_sweep = lambda: chunked_uploads.expire(uploads.ttl_s) if uploads.ttl_s else 0
+# Videos of queued and running jobs must outlive TTL and quota eviction
+uploads.pinned = lambda: video_jobs.video_paths_in_use() if video_jobs else []
+if SERVES_INFERENCE and not PREFORK:
+    uploads.start()
+
+# Routes a control-plane process serves; everything else needs the inference plane
+CONTROL_ENDPOINTS = {
+    'health', 'status', 'analyze', 'metrics',
+    'profile_sample', 'profile_requests', 'profile_memory',
+    'list_models', 'get_active_model_info', 'switch_model',
+    'list_llm_models', 'get_active_llm', 'switch_llm', 'generate_llm_report'
+}
+
+@app.before_request
+def start_request_trace():
+    # Registered first so requests the role check turns away are traced too
+    if request.method != 'OPTIONS':
+        g.trace = tracer.start_request(
+            request.endpoint or 'unmatched',
+            traceparent=request.headers.get('traceparent'),
+            trace_id=request.headers.get('X-Trace-Id'),
+            **{'http.method': request.method, 'http.route': request.url_rule.rule if request.url_rule else request.path,
+               'app.role': APP_ROLE}
+        )
+
+@app.before_request
+def enforce_app_role():
+    if SERVES_INFERENCE or request.endpoint is None or request.endpoint in CONTROL_ENDPOINTS:
+        return None
+    return jsonify({
+        'success': False,
+        'error': 'Inference is not served by this process (APP_ROLE=control)'
+    }), 503
+
+@app.before_request
+def profile_request_start():
+    # The profiling endpoints themselves are never profiled
+    if profiler.active and not (request.endpoint or '').startswith('profile_'):
+        g.profile = profiler.request_started(request.endpoint)
+
+@app.teardown_request
+def profile_request_end(exc):
+    handle = g.pop('profile', None)
+    if handle is not None:
+        profiler.request_finished(handle)
+
+@app.teardown_request
+def end_request_trace(exc):
+    handle = g.pop('trace', None)
+    if handle is not None:
+        tracer.end_request(handle, error=f"{type(exc).__name__}: {exc}" if exc else None)
 
 # CORS support
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+    response.headers.add('Access-Control-Allow-Headers',
+                         'Content-Type,Authorization,X-Chunk-SHA256,traceparent,X-Trace-Id')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
+    response.headers.add('Access-Control-Expose-Headers', 'X-Trace-Id,traceparent,X-Detections-Format')
+    trace = g.get('trace')
+    if trace is not None:
+        span = trace[0]
+        span.set(**{'http.status_code': response.status_code})
+        if response.status_code >= 500:
+            span.fail(f"HTTP {response.status_code}")
+        # The frontend sends this back on the next step of the same action
+        response.headers['X-Trace-Id'] = span.context.trace_id
+        response.headers['traceparent'] = span.context.traceparent
     return response
 
+@app.after_request
+def compress_response(response):
+    return compression.apply(response, request.endpoint, request.accept_encodings)
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
@@ -203,8 +441,10 @@ def switch_model():
         return jsonify({'success': False, 'error': 'Current model_id is required'}), 400
     
     if model_registry.set_active_model(model_id):
-        # Trigger reload in background
-        threading.Thread(target=load_active_model_async, daemon=True).start()
+        # Trigger reload in background (control-plane processes only persist the choice;
+        # inference workers pick it up on their next start)
+        if SERVES_INFERENCE:
+            threading.Thread(target=load_active_model_async, daemon=True).start()
         
         return jsonify({
             'success': True,
@@ -270,7 +510,7 @@ def generate_llm_report():
             'report': report
         }), 200
     except Exception as e:
-        logger.error(f"Failed to generate LLM report: {e}")
+        logger.exception("Failed to generate LLM report: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -284,6 +524,109 @@ def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _number(value, name: str, cast, default, low, high):
+    """
+    A numeric request parameter, clamped to [low, high].
+    
+    Returns:
+        default when value is missing or empty
+    
+    Raises:
+        ValueError: naming the parameter, when value is not a number (the route answers 400)
+    """
+    if value is None or value == '':
+        return default
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if number != number:  # NaN
+        raise ValueError(f'{name} must be a number')
+    return min(max(number, low), high)
+
+def _resolve_video(data: Dict):
+    """
+    Server path of the video a request names, by upload_id or by video_path.
+    
+    A video_path must lie inside one of VIDEO_PATH_ROOTS and outside the upload
+    store: stored content is named by its hash, so it is reachable by upload_id only.
+    
+    Returns:
+        (path, None), or (None, error response)
+    """
+    if data.get('upload_id'):
+        try:
+            return uploads.resolve(str(data['upload_id'])), None
+        except UploadStoreError as e:
+            return None, (jsonify({'success': False, 'error': str(e)}), e.status)
+    
+    video_path = os.path.realpath(str(data.get('video_path', '')))
+    roots = [os.path.realpath(root) for root in VIDEO_PATH_ROOTS]
+    store_root = os.path.realpath(uploads.root)
+    if (os.path.commonpath([video_path, store_root]) == store_root
+            or not any(os.path.commonpath([video_path, root]) == root for root in roots)):
+        return None, (jsonify({'success': False, 'error': 'video_path is outside the allowed directories; '
+                                                          'upload the file and pass upload_id'}), 403)
+    if not os.path.exists(video_path):
+        return None, (jsonify({'success': False, 'error': 'Video not found'}), 404)
+    return video_path, None
+
+def _resolve_live_source(value):
+    """
+    What /stream/mjpeg and /streams may open: a LIVE_SOURCES name (or its exact URI),
+    or a video file allowed by _resolve_video. Never an arbitrary URL, device or path.
+    
+    Returns:
+        (source, None), or (None, error response)
+    """
+    value = str(value)
+    if value in LIVE_SOURCES:
+        return LIVE_SOURCES[value], None
+    if value in LIVE_SOURCES.values():
+        return value, None
+    if is_live_source(value):
+        return None, (jsonify({'success': False, 'error': 'Unknown live source; use one of the configured '
+                                                          'LIVE_SOURCES', 'available': sorted(LIVE_SOURCES)}), 403)
+    return _resolve_video({'video_path': value})
+
+def _resolve_profile(name: Optional[str]):
+    """
+    Look up a named inference profile of the active model.
+    Returns (profile, None) or (None, error response tuple); no name means model defaults.
+    """
+    if not name:
+        return None, None
+    profile = model_registry.get_profile(name)
+    if profile is None:
+        model = model_registry.get_active_model()
+        available = sorted(model.profiles) if model else []
+        return None, (jsonify({
+            'success': False,
+            'error': f'Unknown inference profile: {name}',
+            'available_profiles': available
+        }), 400)
+    return profile, None
+
+def _admit(route: str):
+    """
+    Take an admission slot for route.
+    
+    Returns:
+        (ticket, None) when admitted, or (None, 429 response with Retry-After) when shed
+    """
+    try:
+        return admission_control.acquire(route), None
+    except AdmissionRejected as e:
+        admission_log.warning("🚦 Shed %s request (%s), retry in %ss", route, e.reason, e.retry_after,
+                              extra={'route': route, 'reason': e.reason})
+        response = jsonify({
+            'success': False,
+            'error': f'Server busy ({e.reason}), retry after {e.retry_after}s',
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return None, (response, 429)
+
 def _normalize_bbox(bbox: Dict, img_width: int, img_height: int) -> Dict:
     """
     Normalize bounding box coordinates to 0-1 range
@@ -313,7 +656,7 @@ def _normalize_bbox(bbox: Dict, img_width: int, img_height: int) -> Dict:
             'percent': round(w * h * 100, 2)
         }
     except Exception as e:
-        logger.warning(f"Bbox normalization failed: {e}")
+        predict_log.warning("Bbox normalization failed: %s", e)
         return bbox
 
 # ============================================================================
@@ -342,6 +685,7 @@ def status():
     active_model = model_registry.get_active_model()
     return jsonify({
         'status': 'ok',
+        'role': APP_ROLE,
         'model_status': model_status.get("status"),
         'active_model': {
             'id': active_model.id if active_model else 'unknown',
@@ -349,14 +693,136 @@ def status():
             'type': active_model.type if active_model else 'unknown'
         },
         'loading_details': model_status.get("details"),
+        'startup': {
+            'timings_ms': model_status.get("timings", {}),
+            'model_cache': model_status.get("cache"),
+            'time_to_ready_s': model_status.get("time_to_ready_s")
+        },
         'uptime_seconds': round(time.time() - model_status["start_time"]),
+        'process': process_memory(),
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Admission metrics (in-flight, queue depth, rejections, wait percentiles), per-class
+    inference latency against its SLO, and the video job backlog
+    """
+    jobs = video_jobs.count_by_status() if video_jobs is not None else {}
+    return jsonify({
+        'success': True,
+        'role': APP_ROLE,
+        'pid': os.getpid(),
+        'admission': admission_control.stats(),
+        'scheduler': scheduler.stats(),
+        'uploads': uploads.usage(),
+        'video_jobs': {'by_status': jobs, 'max_queued': VIDEO_JOB_MAX_QUEUED}
     }), 200
 
+# ============================================================================
+# PROFILING (admin, token-gated)
+# ============================================================================
+
+def _profiling_gate():
+    """None if the request may use the profiler, else the error response"""
+    if not profiler.enabled:
+        return jsonify({'error': 'Endpoint not found', 'path': request.path, 'method': request.method}), 404
+    supplied = request.headers.get('X-Profiling-Token') or \
+        request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not profiler.authorized(supplied):
+        return jsonify({'success': False, 'error': 'Invalid profiling token'}), 401
+    return None
+
+@app.route('/admin/profile/sample', methods=['GET'])
+def profile_sample():
+    """
+    Sample all thread stacks for N seconds
+    Query: seconds (default 10, max 60), interval_ms (default 10, 1-1000)
+    Returns: collapsed stacks (text/plain) for flamegraph.pl / speedscope
+    """
+    error = _profiling_gate()
+    if error:
+        return error
+    try:
+        seconds = _number(request.args.get('seconds'), 'seconds', float, 10.0, 0.1, MAX_SAMPLE_SECONDS)
+        interval_s = _number(request.args.get('interval_ms'), 'interval_ms', float, 10.0,
+                             MIN_SAMPLE_INTERVAL_S * 1000, 1000.0) / 1000
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    logger.info("🔬 Sampling stacks for %ss", seconds)
+    counts = profiler.sample(seconds, interval_s)
+    return Response(profiler.collapsed(counts), mimetype='text/plain'), 200
+
+@app.route('/admin/profile/requests', methods=['GET', 'POST'])
+def profile_requests():
+    """
+    POST: cProfile the next K requests. JSON {count (default 10), endpoint (optional, e.g. "stream_detect")}
+    GET: progress until they are done, then the stats (format=text, default, sorted by sort;
+         format=pstats for a .prof dump for snakeviz/flameprof)
+    """
+    error = _profiling_gate()
+    if error:
+        return error
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        try:
+            count = _number(data.get('count'), 'count', int, 10, 1, 1000)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        profiler.arm_requests(count, data.get('endpoint'))
+        return jsonify({'success': True, **profiler.request_status()}), 202
+    
+    try:
+        limit = _number(request.args.get('limit'), 'limit', int, 50, 1, 1000)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    status = profiler.request_status()
+    fmt = request.args.get('format', 'text')
+    report = profiler.request_report(fmt, sort=request.args.get('sort', 'cumulative'), limit=limit)
+    if status['remaining'] > 0 or report is None:
+        return jsonify({'success': True, 'done': False, **status}), 202
+    if fmt == 'pstats':
+        return send_file(BytesIO(report), mimetype='application/octet-stream', as_attachment=True,
+                         download_name='requests.prof')
+    return Response(report, mimetype='text/plain'), 200
+
+@app.route('/admin/profile/memory', methods=['GET', 'POST'])
+def profile_memory():
+    """
+    POST: JSON {action: "start" | "stop", frames (traceback depth, default 10)}
+    GET: allocation growth since the previous GET (top=N) and memory retained per request by endpoint
+    """
+    error = _profiling_gate()
+    if error:
+        return error
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('action') == 'start':
+            try:
+                frames = _number(data.get('frames'), 'frames', int, 10, 1, 64)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            profiler.start_memory(frames)
+        elif data.get('action') == 'stop':
+            profiler.stop_memory()
+        else:
+            return jsonify({'success': False, 'error': 'action must be start or stop'}), 400
+        return jsonify({'success': True, 'tracing': data['action'] == 'start'}), 200
+    
+    try:
+        top = _number(request.args.get('top'), 'top', int, 20, 1, 1000)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    report = profiler.memory_report(top=top)
+    if report is None:
+        return jsonify({'success': False, 'error': 'tracemalloc is not running; POST {"action": "start"} first'}), 409
+    return jsonify({'success': True, **report}), 200
+
 @app.route('/predict', methods=['POST', 'OPTIONS'])
 def predict():
     """
     Single image disease detection
-    Accepts: file upload (multipart/form-data)
+    Accepts: file upload (multipart/form-data), optional profile (e.g. survey for full-res lab images)
     Returns: disease name, confidence, bounding boxes with normalized coordinates
     """
     if request.method == 'OPTIONS':
@@ -390,16 +856,27 @@ def predict():
             'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'
         }), 400
     
+    profile, error = _resolve_profile(request.form.get('profile') or request.args.get('profile'))
+    if error:
+        return error
+    
+    ticket, error = _admit('predict')
+    if error:
+        return error
+    
     saved_path = None
     try:
         # Save uploaded file
         filename = secure_filename(file.filename)
         saved_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(saved_path)
-        logger.info(f"📸 Processing: {filename}")
+        with tracing.span('upload.save'):
+            file.save(saved_path)
+        predict_log.info("📸 Processing: %s", filename)
         
         # Get image dimensions
-        img = cv2.imread(saved_path)
+        import cv2
+        with tracing.span('image.decode', bytes=os.path.getsize(saved_path)):
+            img = cv2.imread(saved_path)
         if img is None:
             raise ValueError("Cannot read image")
         h, w = img.shape[:2]
@@ -407,9 +884,10 @@ def predict():
         # Primary detection: YOLO
         if yolo_detector:
             try:
-                result = yolo_detector.predict(saved_path)
+                with inference_class(UPLOAD):
+                    result = yolo_detector.predict(saved_path, profile=profile)
                 detections = result.get('detections', [])
-                logger.info(f"✅ YOLO: {len(detections)} detections")
+                predict_log.info("✅ YOLO: %d detections", len(detections), extra={'detections': len(detections)})
                 
                 # Find top detection
                 top_detection = None
@@ -434,17 +912,19 @@ def predict():
                     'disease': top_detection['class_name'] if top_detection else None,
                     'confidence': round(top_detection['confidence'] * 100, 1) if top_detection else 0,
                     'boxes': boxes,
+                    'profile': profile.name if profile else None,
                     'timestamp': datetime.now().isoformat()
                 }), 200
             
             except Exception as e:
-                logger.error(f"❌ YOLO prediction failed: {e}")
+                predict_log.exception("❌ YOLO prediction failed: %s", e)
         
         # Fallback: classifier
         if fallback_detector:
             try:
-                result = fallback_detector(saved_path)
-                logger.info(f"✅ Fallback: {result['disease']} ({result.get('confidence', 0)}%)")
+                with tracing.span('fallback.classify'):
+                    result = fallback_detector(saved_path)
+                predict_log.info("✅ Fallback: %s (%s%%)", result['disease'], result.get('confidence', 0))
                 
                 return jsonify({
                     'success': True,
@@ -464,7 +944,7 @@ def predict():
                 }), 200
             
             except Exception as e:
-                logger.error(f"❌ Fallback prediction failed: {e}")
+                predict_log.exception("❌ Fallback prediction failed: %s", e)
         
         return jsonify({
             'success': False,
@@ -472,13 +952,14 @@ def predict():
         }), 503
     
     except Exception as e:
-        logger.error(f"❌ Prediction error: {e}")
+        predict_log.exception("❌ Prediction error: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
     
     finally:
+        ticket.release()
         # Clean up
         if saved_path and os.path.exists(saved_path):
             try:
@@ -489,11 +970,33 @@ def predict():
 def upload_file():
     """
     Upload a file for processing
-    Returns: file_path (server-side path)
+    Accepts: multipart file, or JSON to reuse content the server already holds without sending it again:
+             {sha256, filename, size} returns a challenge (token, offset, length); resend with
+             proof = hex SHA-256 of the token followed by bytes [offset, offset + length) of the file.
+             404 (upload_required) when the content isn't stored or the proof is wrong.
+    Returns: upload_id (pass it to /stream/detect or /jobs/video), sha256, size,
+             and whether identical content was already stored
     """
     if request.method == 'OPTIONS':
         return '', 204
     
+    if request.is_json:
+        data = request.get_json() or {}
+        if not allowed_file(data.get('filename', '')):
+            return jsonify({'success': False, 'error': 'File type not allowed'}), 400
+        sha256, size = str(data.get('sha256', '')), data.get('size')
+        if len(sha256) != 64 or not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+            return jsonify({'success': False, 'error': 'sha256 (hex) and size (bytes) are required'}), 400
+        if not data.get('proof'):
+            # Same answer whether or not the content is stored: only the file's owner can answer it
+            return jsonify({'success': True, 'challenge': uploads.challenge(sha256, size)}), 200
+        record = uploads.link(sha256, data['filename'], size, data.get('token', ''), data['proof'])
+        if record is None:
+            return jsonify({'success': False, 'error': 'Content not stored; upload the file',
+                            'upload_required': True}), 404
+        return jsonify({'success': True, 'message': 'File already stored', 'upload_id': record.id,
+                        **record.to_dict(), 'deduplicated': True}), 200
+    
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
     
@@ -502,22 +1005,245 @@ def upload_file():
         return jsonify({'error': 'No selected file'}), 400
     
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        # Create unique filename to avoid collisions
-        unique_filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}"
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(save_path)
+        try:
+            record, deduplicated = uploads.put(file.stream, file.filename, max_bytes=MAX_FILE_SIZE)
+        except UploadStoreError as e:
+            return jsonify({'success': False, 'error': str(e)}), e.status
         
-        logger.info(f"💾 File uploaded: {save_path}")
         return jsonify({
             'success': True,
             'message': 'File uploaded successfully',
-            'file_path': os.path.abspath(save_path),
-            'filename': unique_filename
+            'upload_id': record.id,
+            **record.to_dict(),
+            'deduplicated': deduplicated
         }), 200
     
     return jsonify({'error': 'File type not allowed'}), 400
 
+@app.route('/uploads/<upload_id>', methods=['GET', 'DELETE', 'OPTIONS'])
+def stored_upload(upload_id):
+    """
+    GET: an upload's metadata (filename, size, sha256, last access)
+    DELETE: forget the id; the content is removed once no other id refers to it
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    if request.method == 'DELETE':
+        if uploads.delete(upload_id):
+            return jsonify({'success': True, 'upload_id': upload_id}), 200
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    
+    record = uploads.get(upload_id)
+    if record is None:
+        return jsonify({'success': False, 'error': 'Upload not found'}), 404
+    return jsonify({'success': True, 'upload_id': record.id, **record.to_dict()}), 200
+
+def _upload_session_response(session, status_code: int = 200):
+    """Serialize an upload session for the chunked upload routes"""
+    body = {
+        'success': True,
+        'upload_id': session.id,
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.offset,
+        'status': session.status,
+        'complete': session.status == 'complete',
+        'chunk_size': DEFAULT_CHUNK_SIZE
+    }
+    if session.status == 'complete' and session.job_id:
+        body['job_id'] = session.job_id
+    return jsonify(body), status_code
+
+@app.route('/upload/chunked', methods=['POST', 'OPTIONS'])
+def create_chunked_upload():
+    """
+    Start a resumable upload
+    Accepts: JSON {filename, size, sha256 (optional), auto_detect (optional)}
+    Returns: upload_id and the offset to send the first chunk at
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    data = request.get_json() or {}
+    filename = data.get('filename', '')
+    if not allowed_file(filename):
+        return jsonify({'success': False, 'error': 'File type not allowed'}), 400
+    
+    try:
+        session = chunked_uploads.create(
+            filename=filename,
+            size=data.get('size'),
+            sha256=data.get('sha256'),
+            auto_detect=data.get('auto_detect', False)
+        )
+        return _upload_session_response(session, 201)
+    except ChunkedUploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+
+@app.route('/upload/chunked/<upload_id>', methods=['GET', 'PUT', 'DELETE', 'OPTIONS'])
+def chunked_upload(upload_id):
+    """
+    GET: current offset (resume point) and status
+    PUT: raw chunk bytes at ?offset=N, optional X-Chunk-SHA256 header
+    DELETE: abort the upload
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    if request.method == 'DELETE':
+        if chunked_uploads.abort(upload_id):
+            return jsonify({'success': True, 'upload_id': upload_id}), 200
+        return jsonify({'success': False, 'error': 'Upload session not found'}), 404
+    
+    if request.method == 'GET':
+        session = chunked_uploads.get(upload_id)
+        if not session:
+            return jsonify({'success': False, 'error': 'Upload session not found'}), 404
+        return _upload_session_response(session)
+    
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'offset query parameter is required'}), 400
+    
+    try:
+        session = chunked_uploads.write_chunk(
+            upload_id,
+            offset=offset,
+            stream=request.stream,
+            length=request.content_length,
+            checksum=request.headers.get('X-Chunk-SHA256')
+        )
+        return _upload_session_response(session)
+    except ChunkedUploadError as e:
+        body = {'success': False, 'error': str(e)}
+        if e.offset is not None:
+            body['offset'] = e.offset
+        return jsonify(body), e.status
+
+
+# ============================================================================
+# VIDEO JOB ROUTES
+# ============================================================================
+
+@app.route('/jobs/video', methods=['POST', 'OPTIONS'])
+def submit_video_job():
+    """
+    Queue a video for background detection
+    Accepts: JSON {upload_id or video_path, every_n (fixed stride) or target_fps/min_speed (adaptive, default)}
+    Returns: job status; poll /jobs/<job_id> and fetch /jobs/<job_id>/results
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    data = request.get_json() or {}
+    if not data.get('upload_id') and not data.get('video_path'):
+        return jsonify({'success': False, 'error': 'upload_id or video_path is required'}), 400
+    video_path, error = _resolve_video(data)
+    if error:
+        return error
+    
+    try:
+        every_n = _number(data.get('every_n'), 'every_n', int, None, 1, 1000)
+        target_fps = _number(data.get('target_fps'), 'target_fps', float, 10.0, 0.1, 120.0)
+        min_speed = _number(data.get('min_speed'), 'min_speed', float, 1.0, 0.0, 100.0)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        job = video_jobs.submit(video_path, every_n=every_n, target_fps=target_fps, min_speed=min_speed)
+    except VideoJobError as e:
+        response = jsonify({'success': False, 'error': str(e), 'retry_after': e.retry_after})
+        if e.retry_after:
+            response.headers['Retry-After'] = str(e.retry_after)
+        return response, e.status
+    return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+@app.route('/jobs', methods=['GET'])
+def list_video_jobs():
+    """List video jobs, newest first"""
+    return jsonify({'success': True, 'jobs': video_jobs.list_jobs()}), 200
+
+@app.route('/jobs/<job_id>', methods=['GET', 'DELETE', 'OPTIONS'])
+def video_job(job_id):
+    """GET: status, progress, fps and ETA. DELETE: cancel the job"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    job = video_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    if request.method == 'DELETE':
+        if not video_jobs.cancel(job_id):
+            return jsonify({'success': False, 'error': f'Job already {job.status}'}), 409
+    
+    return jsonify({'success': True, 'job': job.to_dict()}), 200
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def video_job_results(job_id):
+    """Stream NDJSON detections; ?follow=1 keeps streaming until the job finishes"""
+    if not video_jobs.get(job_id):
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    follow = request.args.get('follow', '0') in ('1', 'true', 'True')
+    results = LiveStream(lambda: video_jobs.stream_results(job_id, follow=follow),
+                         lambda: video_jobs.astream_results(job_id, follow=follow))
+    return LiveResponse(results, mimetype='application/x-ndjson'), 200
+
+# Annotated MP4 renders, keyed by job id
+render_status: Dict[str, Dict] = {}
+
+def _annotated_video_path(job_id: str) -> str:
+    return os.path.join(JOBS_FOLDER, job_id, 'annotated.mp4')
+
+def _run_render(job):
+    """Render the annotated video for a completed job (background thread)"""
+    try:
+        result = render_annotated_video(job.video_path, video_jobs.results_path(job.id),
+                                        _annotated_video_path(job.id))
+        render_status[job.id] = {'status': 'complete', **result}
+    except Exception as e:
+        logger.error(f"❌ Render failed for job {job.id}: {e}")
+        render_status[job.id] = {'status': 'failed', 'error': str(e)}
+
+@app.route('/jobs/<job_id>/render', methods=['GET', 'POST', 'OPTIONS'])
+def render_job_video(job_id):
+    """
+    POST: start rendering an annotated MP4 from a completed job's detections
+    GET: render status
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    job = video_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    state = render_status.get(job_id)
+    if state is None and os.path.exists(_annotated_video_path(job_id)):
+        state = {'status': 'complete'}
+    
+    if request.method == 'POST' and (state is None or state['status'] == 'failed'):
+        if job.status != 'complete':
+            return jsonify({'success': False, 'error': f'Job is {job.status}; render needs a completed job'}), 409
+        state = render_status[job_id] = {'status': 'rendering'}
+        threading.Thread(target=_run_render, args=(job,), daemon=True).start()
+        return jsonify({'success': True, 'render': state, 'video_url': f'/jobs/{job_id}/video'}), 202
+    
+    if state is None:
+        return jsonify({'success': False, 'error': 'Not rendered yet'}), 404
+    return jsonify({'success': True, 'render': state, 'video_url': f'/jobs/{job_id}/video'}), 200
+
+@app.route('/jobs/<job_id>/video', methods=['GET'])
+def job_annotated_video(job_id):
+    """Serve the annotated MP4 with HTTP Range support so players can seek"""
+    path = _annotated_video_path(job_id)
+    if not video_jobs.get(job_id) or not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Annotated video not found'}), 404
+    return send_file(os.path.abspath(path), mimetype='video/mp4', conditional=True)
+
 
 @app.route('/api/rtsp-proxy', methods=['GET', 'OPTIONS'])
 def rtsp_proxy():
@@ -534,17 +1260,18 @@ def rtsp_proxy():
         if not stream_url:
             return jsonify({'error': 'Missing url parameter'}), 400
         
-        # For RTSP streams, we need FFmpeg or similar
-        # For now, return the URL as-is for HLS/DASH streams
+        # Browsers can't play RTSP; point them at the server-rendered MJPEG preview instead
         if stream_url.startswith('rtsp://'):
+            _, error = _resolve_live_source(stream_url)
+            if error:
+                return error
             logger.info(f"📡 RTSP stream requested: {stream_url[:50]}...")
-            # Note: Direct RTSP playback in browser not supported
-            # Would need to convert RTSP to HLS using FFmpeg
             return jsonify({
-                'success': False,
-                'error': 'RTSP streams require server-side transcoding. Use HLS/DASH URLs or configure FFmpeg.',
-                'hint': 'Convert RTSP to HLS using: ffmpeg -i rtsp://... -c:v copy -c:a aac -f hls output.m3u8'
-            }), 415
+                'success': True,
+                'url': f"/stream/mjpeg?{urlencode({'source': stream_url})}",
+                'format': 'mjpeg',
+                'message': 'RTSP is served as an MJPEG preview with detection overlay'
+            }), 200
         
         # For HLS/DASH/MP4 URLs, return with CORS headers
         logger.info(f"🎥 Stream URL: {stream_url[:50]}...")
@@ -561,38 +1288,187 @@ def rtsp_proxy():
             'error': str(e)
         }), 500
 
+# Decodes each source once with the shared detector (YOLO or mock); renditions only resize and encode
+mjpeg_hub = MJPEGHub(detector_provider=lambda: yolo_detector) if SERVES_INFERENCE else None
+
+@app.route('/stream/mjpeg', methods=['GET'])
+def stream_mjpeg():
+    """
+    Live MJPEG preview with server-side detection overlay
+    Query: source (LIVE_SOURCES name, or a video under the allowed directories),
+           width (default 640, 160-1920), quality (default 70, 10-95)
+    One decode/inference pass per source is shared by all viewers
+    """
+    if not request.args.get('source'):
+        return jsonify({'success': False, 'error': 'Missing source parameter'}), 400
+    source, error = _resolve_live_source(request.args['source'])
+    if error:
+        return error
+    if yolo_detector is None:
+        return jsonify({
+            'success': False,
+            'error': f'Model initializing or unavailable: {model_status.get("details")}'
+        }), 503
+    
+    try:
+        width = _number(request.args.get('width'), 'width', int, 640, 0, 1920)
+        quality = _number(request.args.get('quality'), 'quality', int, 70, 10, 95)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    broadcaster = mjpeg_hub.get(source, width=width, quality=quality)
+    return LiveResponse(LiveStream(broadcaster.stream, broadcaster.astream),
+                        mimetype=f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+
+# ============================================================================
+# MULTI-SOURCE STREAMS (shared detector)
+# ============================================================================
+
+stream_mux = StreamMultiplexer(
+    detector_provider=lambda: yolo_detector,
+    batch_size=int(os.environ.get('STREAM_MUX_BATCH', '4')),
+    max_sources=int(os.environ.get('STREAM_MUX_MAX_SOURCES', '16'))
+) if SERVES_INFERENCE else None
+
+@app.route('/streams', methods=['GET', 'POST', 'OPTIONS'])
+def streams():
+    """
+    GET: all sources with per-source fps, lag and drop counters
+    POST: add a source, JSON {id, source, max_fps (optional, 0-120; 0 = no cap)}
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    if request.method == 'GET':
+        return jsonify({'success': True, 'sources': stream_mux.stats()}), 200
+    
+    data = request.get_json() or {}
+    source_id, source = data.get('id'), data.get('source')
+    if not source_id or source is None:
+        return jsonify({'success': False, 'error': 'id and source are required'}), 400
+    source, error = _resolve_live_source(source)
+    if error:
+        return error
+    
+    try:
+        max_fps = _number(data.get('max_fps'), 'max_fps', float, 0.0, 0.0, 120.0)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        added = stream_mux.add_source(str(source_id), source, max_fps=max_fps)
+    except StreamSourceError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    return jsonify({'success': True, 'source': added.stats()}), 201
+
+@app.route('/streams/<source_id>', methods=['GET', 'DELETE', 'OPTIONS'])
+def stream_source(source_id):
+    """GET: stats and latest result for one source. DELETE: stop and remove it"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    source = stream_mux.sources.get(source_id)
+    if not source:
+        return jsonify({'success': False, 'error': 'Source not found'}), 404
+    
+    if request.method == 'DELETE':
+        stream_mux.remove_source(source_id)
+        return jsonify({'success': True, 'id': source_id}), 200
+    
+    return jsonify({'success': True, 'source': source.stats(), 'latest': source.latest_result}), 200
+
+@app.route('/streams/events', methods=['GET'])
+def stream_events():
+    """NDJSON feed of multiplexed results; ?source_id= filters to one source"""
+    source_id = request.args.get('source_id')
+    if source_id and source_id not in stream_mux.sources:
+        return jsonify({'success': False, 'error': 'Source not found'}), 404
+    
+    def generate():
+        subscription = stream_mux.subscribe(source_id)
+        try:
+            while True:
+                try:
+                    yield json.dumps(subscription.get(timeout=15)) + '\n'
+                except queue.Empty:
+                    yield '\n'  # Keep-alive so proxies don't close an idle feed
+        finally:
+            stream_mux.unsubscribe(subscription)
+    
+    async def agenerate():
+        subscription = stream_mux.subscribe_async(source_id)
+        try:
+            while True:
+                try:
+                    yield json.dumps(await asyncio.wait_for(subscription.get(), 15)) + '\n'
+                except asyncio.TimeoutError:
+                    yield '\n'
+        finally:
+            stream_mux.unsubscribe(subscription)
+    
+    return LiveResponse(LiveStream(generate, agenerate), mimetype='application/x-ndjson')
+
 @app.route('/stream/detect', methods=['POST', 'OPTIONS'])
 def stream_detect():
     """
     Real-time video frame detection - Optimized for live camera feed
-    Accepts: JSON with frame (base64)
-    Returns: Detections with pixel coordinates for direct canvas rendering
+    Accepts: JSON with frame (base64), or upload_id / video_path (NDJSON stream; add preview=N
+             for a quick N-frame disease distribution); optional profile
+             (fast-scan for live scouting, survey for full resolution).
+             A raw image body (Content-Type image/jpeg, image/png or
+             application/octet-stream) is a single frame without the base64
+             overhead; profile then goes in the query string.
+    Returns: Detections normalized to 0-1 for direct canvas rendering; with
+             Accept: application/vnd.agrovision.columnar+json (or +msgpack)
+             as parallel arrays instead (see detection_format.py)
     """
     if request.method == 'OPTIONS':
         return '', 204
     
+    arrived = time.perf_counter()  # A live frame's deadline counts from here
+    ticket = None
+    response_format = detection_format.negotiate(request.accept_mimetypes)
     try:
-        data = request.get_json() or {}
+        raw_frame = None
+        if request.mimetype in BINARY_FRAME_TYPES:
+            raw_frame = request.get_data()
+            data = {'frame': None, 'profile': request.args.get('profile')}
+        else:
+            data = request.get_json() or {}
+        profile, error = _resolve_profile(data.get('profile'))
+        if error:
+            return error
+        
+        # Live frames queue ahead of video files; both are shed with 429 under overload
+        is_video = 'upload_id' in data or 'video_path' in data
+        route = 'live' if 'frame' in data else 'video' if is_video else None
+        if route:
+            ticket, error = _admit(route)
+            if error:
+                return error
+        
+        import cv2
+        import numpy as np
         
         if 'frame' in data:
             # Single frame detection
             import base64
-            frame_data = base64.b64decode(data['frame'])
+            frame_data = raw_frame if raw_frame is not None else base64.b64decode(data['frame'])
             
             if not frame_data:
-                 logger.warning("⚠️  Received empty frame data")
+                 stream_log.warning("⚠️  Received empty frame data")
                  return jsonify({'success': False, 'error': 'Empty frame data'}), 400
 
             nparr = np.frombuffer(frame_data, np.uint8)
             
             if nparr.size == 0:
-                 logger.warning("⚠️  Decoded frame buffer is empty")
+                 stream_log.warning("⚠️  Decoded frame buffer is empty")
                  return jsonify({'success': False, 'error': 'Empty frame buffer'}), 400
 
             try:
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                with tracing.span('frame.decode', bytes=int(nparr.size)):
+                    frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             except cv2.error as e:
-                logger.error(f"❌ OpenCV decode error: {e}")
+                stream_log.error("❌ OpenCV decode error: %s", e)
                 return jsonify({'success': False, 'error': 'Frame decode failed'}), 400
 
             if frame is None:
@@ -608,9 +1484,32 @@ def stream_detect():
             
             # Use whichever detector is loaded
             if yolo_detector:
-                result = yolo_detector.predict_frame(frame)
+                try:
+                    with inference_class(LIVE, since=arrived):
+                        result = yolo_detector.predict_frame(frame, profile=profile)
+                except FrameExpired as e:
+                    # Answering late is worse than not at all: the camera has a newer frame
+                    return jsonify({
+                        'success': False,
+                        'dropped': True,
+                        'detections': [],
+                        'error': str(e)
+                    }), 503
                 detections = result.get('detections', [])
                 
+                if response_format != detection_format.JSON:
+                    # Columns straight from detector output: no per-box dicts, no duplicated keys
+                    body = {
+                        'success': True,
+                        'format': 'columnar',
+                        'detections': detection_format.columns_from_detections(detections, w, h),
+                        'count': len(detections),
+                        'frame_size': [h, w],
+                        'profile': profile.name if profile else None
+                    }
+                    return Response(detection_format.dumps(body, response_format), mimetype=response_format,
+                                    headers={'Vary': 'Accept'}), 200
+                
                 # Convert pixel coordinates to normalized (0-1) for frontend
                 boxes = []
                 for det in detections:
@@ -643,7 +1542,8 @@ def stream_detect():
                     'success': True,
                     'detections': boxes,
                     'count': len(boxes),
-                    'frame_size': [h, w]
+                    'frame_size': [h, w],
+                    'profile': profile.name if profile else None
                 }), 200
             elif fallback_detector:
                  # Fallback detector usually only handles files, not raw frames efficiently
@@ -662,69 +1562,88 @@ def stream_detect():
                     'error': f'Model initializing or unavailable: {model_status.get("details")}'
                 }), 503
         
-        elif 'video_path' in data:
+        elif is_video:
             # Video file detection (streaming)
-            video_path = data['video_path']
+            video_path, error = _resolve_video(data)
+            if error:
+                return error
             
-            if not os.path.exists(video_path):
-                return jsonify({'error': 'Video not found'}), 404
+            detector = yolo_detector
             
-            def generate_detections():
+            if data.get('preview'):
+                # Coarse disease distribution from N seeked frames instead of a full decode
+                if detector is None:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Model initializing or unavailable: {model_status.get("details")}'
+                    }), 503
+                try:
+                    num_samples = 16 if data['preview'] is True else \
+                        _number(data['preview'], 'preview', int, 16, 1, 128)
+                except ValueError as e:
+                    return jsonify({'success': False, 'error': str(e)}), 400
+                with inference_class(UPLOAD):
+                    preview = stream_detector.sample_preview(video_path, num_samples=num_samples,
+                                                             detector=detector, profile=profile)
+                if 'error' in preview:
+                    return jsonify({'success': False, 'error': preview['error']}), 422
+                return jsonify({'success': True, 'preview': preview}), 200
+            
+            # Adaptive stride by default; an explicit every_n keeps the fixed-stride behaviour
+            try:
+                fixed_stride = _number(data.get('every_n'), 'every_n', int, None, 1, 1000)
+                target_fps = _number(data.get('target_fps'), 'target_fps', float, 10.0, 0.1, 120.0)
+                min_speed = _number(data.get('min_speed'), 'min_speed', float, 1.0, 0.0, 100.0)
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            sampler = None
+            every_n = fixed_stride or 2
+            if not fixed_stride:
                 cap = cv2.VideoCapture(video_path)
-                frame_count = 0
-                
-                while cap.isOpened():
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-                    
-                    frame_count += 1
-                    
-                    # Process every Nth frame for performance
-                    if frame_count % 2 == 0:  # Every 2nd frame
-                        if yolo_detector:
-                            result = yolo_detector.predict_frame(frame)
-                            detections = result.get('detections', [])
-                            
-                            h, w = frame.shape[:2]
-                            boxes = []
-                            for det in detections:
-                                x1, y1, x2, y2 = det['x1'], det['y1'], det['x2'], det['y2']
-                                boxes.append({
-                                    'class': det['class_name'],
-                                    'conf': round(det['confidence'] * 100, 1),
-                                    'x1': round(x1 / w, 4),
-                                    'y1': round(y1 / h, 4),
-                                    'x2': round(x2 / w, 4),
-                                    'y2': round(y2 / h, 4)
-                                })
-                            
-                            output = {
-                                'frame': frame_count,
-                                'detections': boxes,
-                                'frame_size': [h, w]
-                            }
-                            
-                            yield json.dumps(output) + '\n'
-                
+                source_fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
                 cap.release()
+                sampler = AdaptiveFrameSampler(source_fps, target_fps=target_fps, min_speed=min_speed)
             
-            return Response(generate_detections(), mimetype='application/x-ndjson'), 200
+            # The body streams after the request context is gone, so the span is parented explicitly
+            trace_parent = tracing.current()
+            
+            def generate_detections():
+                if detector is None:
+                    return
+                # A whole-file scan is batch work: it fills the gaps between live frames and uploads.
+                # One span for the whole stream rather than one per frame.
+                with inference_class(BATCH), tracing.span('video.stream', parent=trace_parent,
+                                                           children=False) as span:
+                    records = 0
+                    for record in iter_video_detections(detector, video_path, every_n=every_n, sampler=sampler,
+                                                        profile=profile):
+                        records += 1
+                        yield detection_format.stream_record(record, response_format)
+                    span.set(records=records)
+            
+            # The slot is held until the stream is closed
+            stream, ticket = TicketedStream(generate_detections(), ticket), None
+            headers = {'Vary': 'Accept'}
+            if response_format != detection_format.JSON:
+                headers['X-Detections-Format'] = 'columnar'
+            return Response(stream, mimetype=detection_format.stream_mimetype(response_format), headers=headers), 200
         
         else:
             return jsonify({
                 'success': False,
-                'error': 'Provide frame (base64) or video_path'
+                'error': 'Provide frame (base64), upload_id or video_path'
             }), 400
     
     except Exception as e:
-        logger.error(f"❌ Stream detection error: {e}")
-        import traceback
-        traceback.print_exc()
+        stream_log.exception("❌ Stream detection error: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+    
+    finally:
+        if ticket:
+            ticket.release()
 
 @app.route('/analyze', methods=['POST', 'OPTIONS'])
 def analyze():
@@ -797,7 +1716,7 @@ def analyze():
         }), 200
     
     except Exception as e:
-        logger.error(f"❌ Analysis error: {e}")
+        logger.exception("❌ Analysis error: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -0,0 +1,406 @@
+"""
+ASGI entry point: the Flask app behind an event loop.
+
+    cd backend && uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+    cd backend && GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+
+Under `app.run(threaded=True)` or gunicorn's gthread workers, every open
+connection holds an OS thread. That includes a slow upload, an idle
+keep-alive, a client reading an NDJSON scan slowly, or a multi-minute
+Ollama report. Here the event loop owns the connections:
+
+- Request bodies are read on the loop (spooled to disk above 1 MB), and the
+  route runs only once the whole body has arrived.
+- Routes run in one of two bounded thread pools. Inference routes
+  (INFERENCE_ENDPOINTS) get ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUE
+  threads plus ASGI_INFERENCE_HEADROOM, so a request past the admission
+  queue still reaches admission control and gets its 429 at once. When even
+  the headroom is taken, the loop answers 429 itself instead of letting the
+  request wait for a thread.
+  Everything else (LLM reports, uploads, jobs, admin) runs on
+  ASGI_IO_THREADS threads, so a hung LLM call can't starve inference.
+- A streamed body that computes its chunks (an NDJSON video scan) runs each
+  next() on the route's pool; a buffered one (JSON, send_file) on the I/O
+  pool, since files are read from disk. While the client is slow to read, the
+  connection is just a socket on the loop.
+- Bodies that mostly wait (MJPEG viewers, /streams/events, followed job
+  results) are live_stream.LiveStreams. Their async side waits on the loop,
+  so an idle viewer holds no pool thread.
+- /stream/ws is a native WebSocket. Each binary JPEG message (or a JSON text
+  message {"frame": <base64>}) is answered with the body /stream/detect
+  would return for it, without a new HTTP request per frame. Any other
+  message gets an error reply; video scans stay on HTTP.
+
+The routes themselves are app.py's, unchanged: the same status codes,
+headers, admission control, tracing and compression.
+"""
+import io
+import os
+import sys
+import json
+import asyncio
+import logging
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from werkzeug.exceptions import HTTPException
+
+import app as flask_app_module
+
+logger = logging.getLogger(__name__)
+
+flask_app = flask_app_module.app
+
+# Endpoints that run (or queue for) the model; everything else is I/O-bound
+INFERENCE_ENDPOINTS = frozenset({'predict', 'stream_detect', 'analyze'})
+# Request bodies larger than this are spooled to a temp file instead of held in memory
+SPOOL_BYTES = 1024 * 1024
+WS_DETECT_PATH = '/stream/detect'
+# Retry-After for requests the loop sheds because every inference thread is taken
+BUSY_RETRY_AFTER_S = 1
+# Keys a JSON text message may carry; anything else (upload_id, video_path, preview) is refused
+WS_FRAME_KEYS = frozenset({'frame', 'profile'})
+WS_NOT_A_FRAME = json.dumps({'success': False, 'error': 'Send a JPEG binary message or {"frame": <base64>}'})
+
+_DONE = object()
+
+
+def _pool_sizes() -> Tuple[int, int]:
+    control = flask_app_module.admission_control
+    # Headroom past concurrent + queue: overflow requests run admission.acquire and are shed quickly
+    headroom = int(os.environ.get('ASGI_INFERENCE_HEADROOM', '16'))
+    inference = int(os.environ.get('ASGI_INFERENCE_THREADS', control.max_concurrent + control.max_queue + headroom))
+    io_threads = int(os.environ.get('ASGI_IO_THREADS', '64'))
+    return max(1, inference), max(1, io_threads)
+
+
+class ASGIBridge:
+    """
+    ASGI application that serves a WSGI app from bounded thread pools.
+
+    Args:
+        wsgi_app: The Flask application
+        inference_threads: Threads for INFERENCE_ENDPOINTS
+        io_threads: Threads for every other route
+    """
+
+    def __init__(self, wsgi_app, inference_threads: int, io_threads: int):
+        self.wsgi_app = wsgi_app
+        self.inference_threads = inference_threads
+        self.io_threads = io_threads
+        self._inference_pool: Optional[ThreadPoolExecutor] = None
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._inference_busy = 0  # Inference pool calls submitted and not yet finished
+        self.max_body = wsgi_app.config.get('MAX_CONTENT_LENGTH')
+
+    def _pools(self) -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+        # Created lazily in the serving process: threads don't survive a fork
+        if self._pid != os.getpid():
+            self._inference_pool = ThreadPoolExecutor(self.inference_threads, thread_name_prefix='asgi-infer')
+            self._io_pool = ThreadPoolExecutor(self.io_threads, thread_name_prefix='asgi-io')
+            self._pid = os.getpid()
+        return self._inference_pool, self._io_pool
+
+    def pool_for(self, path: str, method: str) -> ThreadPoolExecutor:
+        """The thread pool a request to path runs on"""
+        inference_pool, io_pool = self._pools()
+        try:
+            endpoint, _ = self.wsgi_app.url_map.bind('').match(path, method)
+        except HTTPException:
+            return io_pool  # 404/405 bodies are cheap
+        return inference_pool if endpoint in INFERENCE_ENDPOINTS else io_pool
+
+    def saturated(self, pool: ThreadPoolExecutor) -> bool:
+        """Whether a new call on pool would wait for a thread (only the inference pool is shed)"""
+        return pool is self._inference_pool and self._inference_busy >= self.inference_threads
+
+    async def _run(self, pool: ThreadPoolExecutor, fn, *args):
+        """run_in_executor that keeps count of busy inference threads"""
+        loop = asyncio.get_running_loop()
+        if pool is not self._inference_pool:
+            return await loop.run_in_executor(pool, fn, *args)
+        self._inference_busy += 1
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        finally:
+            self._inference_busy -= 1
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        elif scope['type'] == 'websocket':
+            await self._websocket(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+
+    # ------------------------------------------------------------------------
+    # Lifespan
+    # ------------------------------------------------------------------------
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._pools()
+                logger.info(f"⚡ ASGI mode: {self.inference_threads} inference threads, "
+                            f"{self.io_threads} I/O threads (pid {os.getpid()})")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._pid == os.getpid():
+                    self._inference_pool.shutdown(wait=False, cancel_futures=True)
+                    self._io_pool.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # ------------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------------
+
+    async def _read_body(self, receive):
+        """
+        The request body, spooled to disk above SPOOL_BYTES.
+
+        Returns:
+            (file object at offset 0, length), or None when the client went away
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        length = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            if chunk:
+                length += len(chunk)
+                if self.max_body is None or length <= self.max_body:
+                    body.write(chunk)
+                # Past the limit: keep draining, the route sees CONTENT_LENGTH and answers 413
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body, length
+
+    async def _http(self, scope, receive, send):
+        received = await self._read_body(receive)
+        if received is None:
+            return
+        body, length = received
+        environ = build_environ(scope, body, length)
+        pool = self.pool_for(environ['PATH_INFO'], environ['REQUEST_METHOD'])
+        if self.saturated(pool):
+            body.close()
+            logger.warning("🚦 Shed %s request: all %d inference threads busy", environ['PATH_INFO'],
+                           self.inference_threads)
+            await _send_busy(send)
+            return
+        _, io_pool = self._pools()
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+        watcher = asyncio.ensure_future(watch_disconnect())
+
+        # One context per request: Flask's request context and the tracing span live in
+        # contextvars, and a streamed body's chunks are produced on whichever thread is free
+        context = contextvars.copy_context()
+        result = None
+        try:
+            status, headers, result = await self._run(pool, context.run, _call_wsgi, self.wsgi_app, environ)
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            if getattr(result, 'supports_async', False):
+                await _send_async_body(result, send, disconnected)
+                if not disconnected.is_set():
+                    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                return
+
+            iterator = iter(result)
+            # Streamed responses (no Content-Length) may run the model for every chunk; buffered
+            # ones (jsonify, send_file) may read from disk, so neither runs on the loop
+            streamed = not any(name == b'content-length' for name, _ in headers)
+            chunk_pool = pool if streamed else io_pool
+            while not disconnected.is_set():
+                chunk = await self._run(chunk_pool, context.run, next, iterator, _DONE)
+                if chunk is _DONE:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not disconnected.is_set():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            watcher.cancel()
+            body.close()
+            if hasattr(result, 'close'):
+                # Releases admission tickets and runs Flask's teardown (end of the trace)
+                await self._run(pool, context.run, result.close)
+
+    # ------------------------------------------------------------------------
+    # WebSocket
+    # ------------------------------------------------------------------------
+
+    async def _websocket(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+        if scope['path'] != '/stream/ws':
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+        await send({'type': 'websocket.accept'})
+
+        pool = self.pool_for(WS_DETECT_PATH, 'POST')
+        # Negotiation and trace headers from the handshake apply to every frame
+        forwarded = [(name, value) for name, value in scope.get('headers', [])
+                     if name in (b'accept', b'traceparent', b'x-stream-id', b'authorization')]
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message.get('bytes') is not None:
+                payload, content_type = message['bytes'], b'image/jpeg'
+            elif _is_frame_message(message.get('text')):
+                payload, content_type = message['text'].encode(), b'application/json'
+            else:
+                # upload_id/video_path would buffer a whole NDJSON scan into one message
+                await send({'type': 'websocket.send', 'text': WS_NOT_A_FRAME})
+                continue
+
+            frame_scope = {
+                **scope, 'type': 'http', 'method': 'POST', 'path': WS_DETECT_PATH, 'raw_path': None,
+                'query_string': scope.get('query_string', b''),
+                'headers': forwarded + [(b'content-type', content_type)]
+            }
+            if self.saturated(pool):
+                await send({'type': 'websocket.send', 'text': json.dumps(_busy_body())})
+                continue
+            environ = build_environ(frame_scope, io.BytesIO(payload), len(payload))
+            context = contextvars.copy_context()
+            status, headers, reply = await self._run(pool, context.run, _collect_wsgi, self.wsgi_app, environ)
+
+            # JSON (row or columnar) goes out as text frames, MessagePack as binary
+            if b'json' in dict(headers).get(b'content-type', b''):
+                await send({'type': 'websocket.send', 'text': reply.decode()})
+            else:
+                await send({'type': 'websocket.send', 'bytes': reply})
+
+
+def _busy_body() -> Dict:
+    """Same body admission control sends with its 429s"""
+    return {
+        'success': False,
+        'error': f'Server busy (queue_full), retry after {BUSY_RETRY_AFTER_S}s',
+        'retry_after': BUSY_RETRY_AFTER_S
+    }
+
+
+async def _send_busy(send):
+    """429 + Retry-After answered on the loop, without a thread"""
+    body = json.dumps(_busy_body()).encode()
+    await send({'type': 'http.response.start', 'status': 429, 'headers': [
+        (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+        (b'retry-after', str(BUSY_RETRY_AFTER_S).encode()), (b'access-control-allow-origin', b'*')
+    ]})
+    await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+
+async def _send_async_body(result, send, disconnected: asyncio.Event):
+    """Send a LiveStream body from its async side until it ends or the client goes away"""
+    iterator = result.__aiter__()
+    gone = asyncio.ensure_future(disconnected.wait())
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait({step, gone}, return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                return  # Client left while the producer waits for a frame or event
+            try:
+                chunk = step.result()
+            except StopAsyncIteration:
+                return
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        gone.cancel()
+        if step is not None and not step.done():
+            step.cancel()  # Interrupts the wait; the producer's finally blocks run
+            await asyncio.wait({step})
+        await iterator.aclose()
+
+
+def _is_frame_message(text: Optional[str]) -> bool:
+    """Whether a WebSocket text message is a single base64 frame ({"frame": ...}, optional profile)"""
+    try:
+        data = json.loads(text or '')
+    except ValueError:
+        return False
+    return isinstance(data, dict) and 'frame' in data and not data.keys() - WS_FRAME_KEYS
+
+
+def build_environ(scope: Dict, body, length: int) -> Dict:
+    """PEP 3333 environ for an ASGI HTTP scope whose body has already been read"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': {'ws': 'http', 'wss': 'https'}.get(scope.get('scheme'), scope.get('scheme', 'http')),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'asgi.scope': scope
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = 'HTTP_' + name
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_wsgi(wsgi_app, environ: Dict) -> Tuple[int, List[Tuple[bytes, bytes]], Iterable[bytes]]:
+    """Run the WSGI app up to its first response: (status, ASGI headers, body iterable)"""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        if exc_info and started:
+            raise exc_info[1].with_traceback(exc_info[2])
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in headers]
+        return lambda data: None  # Flask never uses the legacy write()
+
+    result = wsgi_app(environ, start_response)
+    return started['status'], started['headers'], result
+
+
+def _collect_wsgi(wsgi_app, environ: Dict) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    """Run the WSGI app to completion: (status, ASGI headers, whole body)"""
+    status, headers, result = _call_wsgi(wsgi_app, environ)
+    try:
+        return status, headers, b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+
+
+app = ASGIBridge(flask_app, *_pool_sizes())
@@ -0,0 +1,600 @@
+"""
+Reproducible inference benchmarks with baseline comparison.
+
+    python benchmark.py run [--only yolo_predict_frame,fallback_classify] [--iterations 200] [--out bench.json]
+    python benchmark.py compare bench.json baseline.json [--threshold 0.10]
+    python benchmark.py serialize [--link-kbps 1000] [--out serialize.json]
+
+Configurations:
+    yolo_predict         YOLODetector.predict on a JPEG on disk
+    yolo_predict_frame   YOLODetector.predict_frame on decoded video frames
+    yolo_predict_frames  YOLODetector.predict_frames, --batch frames per call
+    fallback_classify    predict_fallback.classify_image (the mock classifier)
+    http_predict         POST /predict (multipart JPEG)
+    http_stream_detect   POST /stream/detect (base64 JSON frame)
+
+Frames come from tests/test_video.mp4, or from generate_test_video's
+synthetic clip when the file can't be read, resized to --size. Each
+configuration runs in a fresh interpreter, so its peak RSS is its own.
+Seeds and the torch thread count are fixed, and warm-up iterations are
+excluded from the statistics. HTTP configurations use the Flask test client
+in-process, or a running server with --url.
+
+--backend mock swaps the model for the registry's MockDetector (cost set
+with --mock-options), which benchmarks the serving layers on any machine.
+
+`compare` exits 1 when a gated metric is worse than the baseline by more
+than --threshold, so CI can run it as a regression gate.
+
+`serialize` measures encoder and compression choices on representative
+response bodies. It reports CPU time, bytes on the wire, and the transfer
+time at --link-kbps, so COMPRESS_ROUTES can be set per route (see
+serialization.py).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from dataclasses import asdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_VIDEO = os.path.join(BACKEND_DIR, '..', 'tests', 'test_video.mp4')
+SCHEMA_VERSION = 1
+SEED = 1234
+
+# name -> (metric is worse when it goes up?)
+METRICS = {
+    'p50_ms': True,
+    'p95_ms': True,
+    'p99_ms': True,
+    'throughput_per_s': False,
+    'peak_rss_mb': True,
+}
+DEFAULT_GATED = ['p50_ms', 'p95_ms', 'throughput_per_s', 'peak_rss_mb']
+
+
+class Skip(Exception):
+    """A configuration that can't run here (no weights, no torch, server unreachable)"""
+
+
+# ============================================================================
+# INPUTS
+# ============================================================================
+
+def load_frames(count: int, size: Tuple[int, int]) -> List:
+    """count BGR frames at size (w, h) from the test video, or the synthetic clip as a fallback"""
+    import cv2
+    from generate_test_video import synthetic_frame
+
+    frames = []
+    cap = cv2.VideoCapture(TEST_VIDEO)
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        frames = [synthetic_frame(i) for i in range(count)]
+    return [cv2.resize(frame, size) for frame in frames]
+
+
+def _jpeg(frame) -> bytes:
+    import cv2
+    ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise RuntimeError("JPEG encode failed")
+    return buf.tobytes()
+
+
+# ============================================================================
+# CONFIGURATIONS
+# Each setup returns (op, info): op(i) runs iteration i, info describes the setup.
+# ============================================================================
+
+def _detector(opts: Dict):
+    if opts['backend'] == 'mock':
+        from mock_detector import MockDetector, MockCost
+        cost = MockCost.from_options(opts['mock_options'])
+        return MockDetector(cost=cost), None, {'backend': 'mock', 'mock_cost': asdict(cost)}
+    try:
+        import torch
+        torch.set_num_threads(opts['threads'])
+        from yolo_detector import YOLODetector
+        detector = YOLODetector(model_path=opts.get('model'), device=opts.get('device'),
+                                prepare_in_background=False)
+    except Exception as e:
+        raise Skip(f"YOLO unavailable: {e}")
+    profile = None
+    if opts.get('profile'):
+        from model_registry import ModelRegistry
+        profile = ModelRegistry().get_profile(opts['profile'])
+        if profile is None:
+            raise Skip(f"Unknown profile: {opts['profile']}")
+    info = {'backend': 'yolo', 'model_path': detector.model_path, 'device': detector.device,
+            'profile': opts.get('profile')}
+    return detector, profile, info
+
+
+def setup_yolo_predict(opts: Dict, frames: List, workdir: str):
+    detector, profile, info = _detector(opts)
+    paths = []
+    for i, frame in enumerate(frames):
+        path = os.path.join(workdir, f'frame_{i}.jpg')
+        with open(path, 'wb') as f:
+            f.write(_jpeg(frame))
+        paths.append(path)
+    return lambda i: detector.predict(paths[i % len(paths)], profile=profile), info
+
+
+def setup_yolo_predict_frame(opts: Dict, frames: List, workdir: str):
+    detector, profile, info = _detector(opts)
+    return lambda i: detector.predict_frame(frames[i % len(frames)], profile=profile), info
+
+
+def setup_yolo_predict_frames(opts: Dict, frames: List, workdir: str):
+    detector, profile, info = _detector(opts)
+    batch = opts['batch']
+    info['batch'] = batch
+
+    def op(i):
+        start = (i * batch) % len(frames)
+        detector.predict_frames([frames[(start + k) % len(frames)] for k in range(batch)], profile=profile)
+    return op, info
+
+
+def setup_fallback_classify(opts: Dict, frames: List, workdir: str):
+    from predict_fallback import classify_image
+    path = os.path.join(workdir, 'frame.jpg')
+    with open(path, 'wb') as f:
+        f.write(_jpeg(frames[0]))
+    return lambda i: classify_image(path), {}
+
+
+def _http_client(opts: Dict) -> Callable:
+    """post(path, **kwargs) -> status code, against --url or the in-process Flask app"""
+    if opts.get('url'):
+        import requests
+        session = requests.Session()
+        base = opts['url'].rstrip('/')
+        try:
+            session.get(base + '/health', timeout=5)
+        except Exception as e:
+            raise Skip(f"Server unreachable at {base}: {e}")
+        return lambda path, **kwargs: session.post(base + path, timeout=60, **kwargs).status_code
+
+    import app as app_module
+    deadline = time.time() + opts['ready_timeout']
+    while app_module.model_status.get('status') not in ('ready', 'error') and time.time() < deadline:
+        time.sleep(0.2)
+    if app_module.model_status.get('status') != 'ready':
+        raise Skip(f"Model not ready in-process: {app_module.model_status.get('details')}")
+    client = app_module.app.test_client()
+
+    def post(path, files=None, json=None):
+        if files:
+            name, data, mimetype = files['file']
+            from io import BytesIO
+            return client.post(path, data={'file': (BytesIO(data), name, mimetype)},
+                               content_type='multipart/form-data').status_code
+        return client.post(path, json=json).status_code
+    return post
+
+
+def setup_http_predict(opts: Dict, frames: List, workdir: str):
+    post = _http_client(opts)
+    images = [_jpeg(frame) for frame in frames]
+
+    def op(i):
+        status = post('/predict', files={'file': ('frame.jpg', images[i % len(images)], 'image/jpeg')})
+        if status != 200:
+            raise RuntimeError(f"/predict returned {status}")
+    return op, {'url': opts.get('url') or 'in-process'}
+
+
+def setup_http_stream_detect(opts: Dict, frames: List, workdir: str):
+    import base64
+    post = _http_client(opts)
+    payloads = [base64.b64encode(_jpeg(frame)).decode('ascii') for frame in frames]
+
+    def op(i):
+        status = post('/stream/detect', json={'frame': payloads[i % len(payloads)]})
+        if status != 200:
+            raise RuntimeError(f"/stream/detect returned {status}")
+    return op, {'url': opts.get('url') or 'in-process'}
+
+
+CONFIGS: Dict[str, Callable] = {
+    'yolo_predict': setup_yolo_predict,
+    'yolo_predict_frame': setup_yolo_predict_frame,
+    'yolo_predict_frames': setup_yolo_predict_frames,
+    'fallback_classify': setup_fallback_classify,
+    'http_predict': setup_http_predict,
+    'http_stream_detect': setup_http_stream_detect,
+}
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def _percentile(sorted_ms: List[float], q: float) -> float:
+    if not sorted_ms:
+        return 0.0
+    # Linear interpolation between closest ranks (numpy's default)
+    pos = (len(sorted_ms) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_ms) - 1)
+    return round(sorted_ms[lo] + (sorted_ms[hi] - sorted_ms[lo]) * (pos - lo), 3)
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_config(name: str, opts: Dict) -> Dict:
+    """Run one configuration in this process and return its statistics"""
+    import numpy as np
+    if opts['backend'] == 'mock':
+        # Read by ModelRegistry / app.py when the HTTP configurations import the app
+        os.environ.update(ENABLE_MOCK_MODEL='1', ACTIVE_MODEL_ID='mock-detector',
+                          MOCK_DETECTOR_OPTIONS=json.dumps(opts['mock_options']))
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+    width, height = (int(v) for v in opts['size'].lower().split('x'))
+    frames = load_frames(opts['frames'], (width, height))
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            op, info = CONFIGS[name](opts, frames, workdir)
+        except Skip as e:
+            return {'name': name, 'skipped': str(e)}
+
+        for i in range(opts['warmup']):
+            op(i)
+
+        latencies = []
+        started = time.perf_counter()
+        for i in range(opts['iterations']):
+            t0 = time.perf_counter()
+            op(i)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        wall_s = time.perf_counter() - started
+
+    items_per_op = info.get('batch', 1)
+    latencies.sort()
+    return {
+        'name': name,
+        'iterations': len(latencies),
+        'items_per_op': items_per_op,
+        'throughput_per_s': round(len(latencies) * items_per_op / wall_s, 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p50_ms': _percentile(latencies, 0.50),
+        'p95_ms': _percentile(latencies, 0.95),
+        'p99_ms': _percentile(latencies, 0.99),
+        'max_ms': round(latencies[-1], 3),
+        'peak_rss_mb': _peak_rss_mb(),
+        'frame_size': [width, height],
+        **info
+    }
+
+
+def _run_isolated(name: str, opts: Dict) -> Dict:
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '_one', name, json.dumps(opts)],
+                         cwd=BACKEND_DIR, capture_output=True, text=True,
+                         env=dict(os.environ, OMP_NUM_THREADS=str(opts['threads']), MODEL_WARMUP='0'))
+    if out.returncode != 0:
+        return {'name': name, 'failed': out.stderr.strip().splitlines()[-1:] or ['exit %d' % out.returncode]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _package_version(name: str) -> Optional[str]:
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return None
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'git_commit': commit,
+        'packages': {pkg: _package_version(pkg) for pkg in
+                     ('numpy', 'opencv-python', 'opencv-python-headless', 'torch', 'ultralytics', 'flask')}
+    }
+
+
+def run(args) -> Dict:
+    names = args.only.split(',') if args.only else list(CONFIGS)
+    unknown = [n for n in names if n not in CONFIGS]
+    if unknown:
+        raise SystemExit(f"Unknown configuration(s): {', '.join(unknown)}. Choose from {', '.join(CONFIGS)}")
+
+    opts = {
+        'iterations': args.iterations, 'warmup': args.warmup, 'frames': args.frames, 'size': args.size,
+        'batch': args.batch, 'threads': args.threads, 'model': args.model, 'device': args.device,
+        'profile': args.profile, 'url': args.url, 'ready_timeout': args.ready_timeout,
+        'backend': args.backend, 'mock_options': json.loads(args.mock_options)
+    }
+    report = {'schema': SCHEMA_VERSION, 'created': datetime.now().isoformat(), 'environment': environment(),
+              'options': opts, 'results': {}}
+    for name in names:
+        print(f"⏱️  {name} ...", file=sys.stderr, flush=True)
+        result = run_config(name, opts) if args.in_process else _run_isolated(name, opts)
+        report['results'][name] = result
+        print('   ' + _summary(result), file=sys.stderr, flush=True)
+    return report
+
+
+def _summary(result: Dict) -> str:
+    if 'skipped' in result:
+        return f"skipped: {result['skipped']}"
+    if 'failed' in result:
+        return f"failed: {result['failed']}"
+    return (f"{result['throughput_per_s']}/s  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+            f"p99 {result['p99_ms']} ms  peak RSS {result['peak_rss_mb']} MB")
+
+
+# ============================================================================
+# SERIALIZATION
+# ============================================================================
+
+def serialization_payloads() -> Dict[str, object]:
+    """Seeded response bodies shaped like the real routes' output"""
+    from mock_detector import MOCK_CLASSES
+    rng = random.Random(SEED)
+
+    def box():
+        x1, y1 = round(rng.uniform(0, 0.7), 4), round(rng.uniform(0, 0.7), 4)
+        x2, y2 = round(x1 + rng.uniform(0.05, 0.3), 4), round(y1 + rng.uniform(0.05, 0.3), 4)
+        return {'class': rng.choice(MOCK_CLASSES), 'conf': round(rng.uniform(25, 95), 1),
+                'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+
+    live_boxes = [{**b, 'x': b['x1'], 'y': b['y1'], 'w': round(b['x2'] - b['x1'], 4),
+                   'h': round(b['y2'] - b['y1'], 4)} for b in (box() for _ in range(8))]
+    from detection_format import columns_from_boxes
+    return {
+        'predict': {
+            'success': True, 'source': 'yolo', 'disease': 'Blast', 'confidence': 91.2, 'profile': None,
+            'timestamp': datetime(2025, 1, 1).isoformat(),
+            'boxes': [{'class': b['class'], 'conf': b['conf'], 'x': b['x1'], 'y': b['y1'],
+                       'w': round(b['x2'] - b['x1'], 4), 'h': round(b['y2'] - b['y1'], 4),
+                       'percent': round(rng.uniform(1, 30), 2)} for b in (box() for _ in range(3))]
+        },
+        'analyze': {'success': True, 'analysis': {
+            'total_detections': 240, 'diseases_detected': len(MOCK_CLASSES),
+            'disease_summary': [{'disease': name, 'count': rng.randint(1, 60),
+                                 'avg_confidence': round(rng.uniform(30, 90), 1),
+                                 'max_confidence': round(rng.uniform(60, 99), 1),
+                                 'min_confidence': round(rng.uniform(20, 40), 1),
+                                 'severity': rng.choice(['High', 'Medium', 'Low'])} for name in MOCK_CLASSES],
+            'recommendations': ['⚠️  High confidence Blast detection. Immediate intervention recommended.',
+                                '📋 Apply appropriate fungicide/pesticide for Blast',
+                                '🔍 Monitor crop regularly for disease spread'],
+            'timestamp': datetime(2025, 1, 1).isoformat()}},
+        'models': {'success': True, 'models': [{
+            'id': f'model-{i}', 'name': f'Wheat disease detector v{i}', 'type': 'yolo', 'path': f'models/v{i}.pt',
+            'description': 'YOLO11 fine-tuned on field images of wheat leaf diseases', 'active': i == 0,
+            'profiles': {p: {'imgsz': imgsz, 'conf': 0.25, 'iou': 0.45, 'max_det': 100, 'half': False,
+                             'tile': p == 'survey', 'tile_size': 640, 'tile_overlap': 0.2, 'classes': None}
+                         for p, imgsz in (('fast-scan', 320), ('default', 640), ('survey', 1280))}
+        } for i in range(4)]},
+        'stream_detect_frame': {'success': True, 'detections': live_boxes, 'count': 8,
+                                'frame_size': [480, 640], 'profile': None},
+        'stream_detect_frame_columnar': {'success': True, 'format': 'columnar',
+                                         'detections': columns_from_boxes(live_boxes), 'count': 8,
+                                         'frame_size': [480, 640], 'profile': None},
+        # NDJSON video scan: one record per sampled frame
+        'ndjson_video': [{'frame': 2 * i, 'timestamp': round(2 * i / 30, 3), 'frame_size': [480, 640],
+                          'detections': [box() for _ in range(rng.randint(0, 5))]} for i in range(300)]
+    }
+
+
+def _median_us(fn: Callable, min_time_s: float = 0.2, max_reps: int = 2000) -> float:
+    times = []
+    deadline = time.perf_counter() + min_time_s
+    while len(times) < max_reps and (len(times) < 5 or time.perf_counter() < deadline):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1e6)
+    times.sort()
+    return round(times[len(times) // 2], 1)
+
+
+def serialization_bench(args) -> Dict:
+    """CPU vs bytes for each encoder and compression setting on each payload"""
+    import serialization
+    encoders = {'json': lambda obj: json.dumps(obj, separators=(',', ':')).encode()}
+    if serialization.orjson is not None:
+        encoders['orjson'] = serialization.dumps_bytes
+    codecs = [('identity', None)] + [('gzip', level) for level in (1, 5, 9)]
+    if serialization.brotli is not None:
+        codecs += [('br', quality) for quality in (1, 4, 9)]
+
+    results = {}
+    for name, payload in serialization_payloads().items():
+        streamed = isinstance(payload, list)
+        rows = []
+        for encoder_name, encode in encoders.items():
+            if streamed:
+                def encode_body(encode=encode):
+                    return [encode(record) + b'\n' for record in payload]
+            else:
+                def encode_body(encode=encode):
+                    return encode(payload)
+            encode_us = _median_us(encode_body)
+            body = encode_body()
+            raw = b''.join(body) if streamed else body
+            variants = [(f'{codec}-{level}' if level else codec,
+                         (lambda codec=codec, level=level: serialization.compress_bytes(raw, codec, level))
+                         if level else (lambda: raw)) for codec, level in codecs]
+            if streamed:
+                # What the server actually sends: every record flushed on its own
+                variants += [(f'{codec}-{level}-per-record',
+                              lambda codec=codec, level=level: b''.join(
+                                  serialization.CompressedStream(body, codec, level)))
+                             for codec, level in codecs if level]
+            for label, compress in variants:
+                compress_us = _median_us(compress) if label != 'identity' else 0.0
+                size = len(compress())
+                transfer_ms = size * 8 / args.link_kbps
+                rows.append({'encoder': encoder_name, 'compression': label, 'bytes': size,
+                             'encode_us': encode_us, 'compress_us': compress_us,
+                             'transfer_ms': round(transfer_ms, 2),
+                             'total_ms': round((encode_us + compress_us) / 1000 + transfer_ms, 2)})
+        results[name] = {'records': len(payload) if streamed else 1, 'rows': rows}
+    return {'schema': SCHEMA_VERSION, 'created': datetime.now().isoformat(), 'environment': environment(),
+            'link_kbps': args.link_kbps, 'results': results}
+
+
+def _print_serialization(report: Dict):
+    for name, result in report['results'].items():
+        print(f"\n{name} ({result['records']} record(s)), link {report['link_kbps']} kbit/s")
+        print(f"  {'encoder':<7} {'compression':<22} {'bytes':>8} {'encode µs':>10} {'compress µs':>12} "
+              f"{'transfer ms':>12} {'total ms':>9}")
+        best = min(result['rows'], key=lambda r: r['total_ms'])
+        for row in result['rows']:
+            print(f"  {row['encoder']:<7} {row['compression']:<22} {row['bytes']:>8} {row['encode_us']:>10} "
+                  f"{row['compress_us']:>12} {row['transfer_ms']:>12} {row['total_ms']:>9}"
+                  f"{'  ⭐' if row is best else ''}")
+
+
+# ============================================================================
+# COMPARE
+# ============================================================================
+
+def compare(current: Dict, baseline: Dict, threshold: float, gated: List[str]) -> List[Dict]:
+    """
+    Metric-by-metric changes of current against baseline.
+
+    Returns:
+        One row per (configuration, metric) measured in both; rows whose metric is
+        gated and worse by more than threshold have regression=True
+    """
+    rows = []
+    for name, cur in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base or 'p50_ms' not in cur or 'p50_ms' not in base:
+            continue
+        for metric, higher_is_worse in METRICS.items():
+            if not base.get(metric):
+                continue
+            change = (cur[metric] - base[metric]) / base[metric]
+            worse = change if higher_is_worse else -change
+            rows.append({
+                'config': name,
+                'metric': metric,
+                'baseline': base[metric],
+                'current': cur[metric],
+                'change_pct': round(change * 100, 1),
+                'regression': metric in gated and worse > threshold
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Inference benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_p = sub.add_parser('run', help='Run configurations and write JSON results')
+    run_p.add_argument('--only', help=f"Comma-separated subset of: {', '.join(CONFIGS)}")
+    run_p.add_argument('--iterations', type=int, default=100)
+    run_p.add_argument('--warmup', type=int, default=10)
+    run_p.add_argument('--frames', type=int, default=30, help='Distinct input frames cycled through')
+    run_p.add_argument('--size', default='640x480', help='Frame size WxH')
+    run_p.add_argument('--batch', type=int, default=4, help='Frames per call for yolo_predict_frames')
+    run_p.add_argument('--threads', type=int, default=1, help='torch / OpenMP threads')
+    run_p.add_argument('--model', help='Weights path (default: the detector\'s own lookup)')
+    run_p.add_argument('--device', help='cpu, 0, cuda ...')
+    run_p.add_argument('--profile', help='Inference profile for YOLO configurations')
+    run_p.add_argument('--backend', choices=['yolo', 'mock'], default='yolo')
+    run_p.add_argument('--mock-options', default='{}', help='MockCost settings as JSON for --backend mock')
+    run_p.add_argument('--url', help='Benchmark HTTP routes on a running server instead of in-process')
+    run_p.add_argument('--ready-timeout', type=float, default=120.0, help='Wait for the in-process model')
+    run_p.add_argument('--in-process', action='store_true', help='Skip per-configuration isolation')
+    run_p.add_argument('--out', help='Write JSON results here (default: stdout)')
+
+    cmp_p = sub.add_parser('compare', help='Compare results against a baseline; exit 1 on regression')
+    cmp_p.add_argument('current')
+    cmp_p.add_argument('baseline')
+    cmp_p.add_argument('--threshold', type=float, default=0.10, help='Allowed relative slowdown (0.10 = 10%%)')
+    cmp_p.add_argument('--metrics', default=','.join(DEFAULT_GATED),
+                       help=f"Gated metrics, from: {', '.join(METRICS)}")
+
+    ser_p = sub.add_parser('serialize', help='Encoder and compression CPU vs bytes per response payload')
+    ser_p.add_argument('--link-kbps', type=float, default=1000.0, help='Client link speed for transfer time')
+    ser_p.add_argument('--out', help='Also write JSON results here')
+
+    one_p = sub.add_parser('_one')  # Internal: one isolated configuration
+    one_p.add_argument('name')
+    one_p.add_argument('opts')
+
+    args = parser.parse_args(argv)
+
+    if args.command == '_one':
+        print(json.dumps(run_config(args.name, json.loads(args.opts))))
+        return 0
+
+    if args.command == 'serialize':
+        report = serialization_bench(args)
+        _print_serialization(report)
+        if args.out:
+            with open(args.out, 'w') as f:
+                f.write(json.dumps(report, indent=2) + '\n')
+            print(f"\n✅ Results written to {args.out}", file=sys.stderr)
+        return 0
+
+    if args.command == 'run':
+        report = run(args)
+        text = json.dumps(report, indent=2)
+        if args.out:
+            with open(args.out, 'w') as f:
+                f.write(text + '\n')
+            print(f"✅ Results written to {args.out}", file=sys.stderr)
+        else:
+            print(text)
+        return 0
+
+    with open(args.current) as f:
+        current = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    for key in ('machine', 'cpu_count'):
+        if current['environment'].get(key) != baseline['environment'].get(key):
+            print(f"⚠️  {key} differs from the baseline ({baseline['environment'].get(key)} -> "
+                  f"{current['environment'].get(key)}); numbers may not be comparable")
+
+    rows = compare(current, baseline, args.threshold, args.metrics.split(','))
+    print(f"{'configuration':<22} {'metric':<17} {'baseline':>10} {'current':>10} {'change':>8}")
+    for row in rows:
+        flag = '  ❌ REGRESSION' if row['regression'] else ''
+        print(f"{row['config']:<22} {row['metric']:<17} {row['baseline']:>10} {row['current']:>10} "
+              f"{row['change_pct']:>+7.1f}%{flag}")
+    regressions = [row for row in rows if row['regression']]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    print(f"✅ No regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+Capture supervisor for flaky live sources (drones over LTE, RTSP cameras).
+
+cv2.VideoCapture.read() either fails or blocks forever when a link drops.
+CaptureSupervisor reads on a background thread and detects stalls with a
+read timeout and a frozen-frame check (decoders often repeat the last frame
+after a link loss). It then reconnects with exponential backoff + jitter.
+Consumers just iterate frames(); the generator survives reconnects, so any
+state the consumer keeps (tracks, aggregates, counters) survives as well.
+File sources end normally at EOF and are never reconnected.
+"""
+import time
+import zlib
+import queue
+import random
+import logging
+import threading
+from typing import Callable, Dict, Generator, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def is_live_source(source) -> bool:
+    """Camera indices and network URLs are live; anything else is treated as a file"""
+    if isinstance(source, int):
+        return True
+    source = str(source)
+    return source.isdigit() or '://' in source
+
+
+class CaptureSupervisor:
+    """
+    Supervised frame reader with reconnect + health reporting.
+
+    Args:
+        source: Camera index, RTSP/HTTP URL or file path
+        read_timeout: Seconds without a frame before a live source counts as stalled
+        frozen_frames: Identical consecutive frames before a live source counts as frozen (0 disables)
+        backoff_initial / backoff_max: Reconnect delay bounds (seconds), doubled per failed attempt
+        max_reconnects: Give up after this many consecutive failed attempts (None = never)
+        initial_attempts: Give up after this many failed opens before the first frame, so a
+            wrong URL or absent camera fails fast instead of retrying forever (None = never)
+        capture_factory: Callable opening a capture (cv2.VideoCapture by default)
+    """
+
+    def __init__(self, source, read_timeout: float = 5.0, frozen_frames: int = 50,
+                 backoff_initial: float = 0.5, backoff_max: float = 30.0, max_reconnects: Optional[int] = None,
+                 initial_attempts: Optional[int] = 3, capture_factory: Callable = cv2.VideoCapture):
+        self.source = int(source) if isinstance(source, str) and source.isdigit() else source
+        self.live = is_live_source(self.source)
+        self.read_timeout = read_timeout
+        self.frozen_frames = frozen_frames
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_reconnects = max_reconnects
+        self.initial_attempts = initial_attempts
+        self.capture_factory = capture_factory
+
+        self.state = 'idle'  # 'idle' | 'connecting' | 'connected' | 'reconnecting' | 'ended' | 'failed'
+        self.fps = 0.0
+        self.frames_read = 0
+        self.frames_dropped = 0  # Overwritten in the hand-off slot before the consumer took them
+        self.reconnects = 0
+        self.stalls = 0
+        self.frozen_events = 0
+        self.last_frame_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.next_retry_in: Optional[float] = None
+
+        self._failures = 0  # Consecutive failed connects/stalls without a good frame in between
+        self._file_cap = None
+        self._generation = 0
+        self._slot: "queue.Queue" = queue.Queue(maxsize=1)
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Reader thread
+    # ------------------------------------------------------------------
+
+    def _open(self):
+        self.state = 'connecting' if self.reconnects == 0 else 'reconnecting'
+        cap = self.capture_factory(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or self.fps
+        return cap
+
+    def _reader(self, cap, generation: int):
+        """Pump frames into the single-slot hand-off; exits when its generation is superseded"""
+        try:
+            while not self._stop.is_set() and generation == self._generation:
+                ret, frame = cap.read()
+                if generation != self._generation:
+                    break  # Supervisor already gave up on this capture
+                if not ret:
+                    self.last_error = 'Read failed (link dropped or stream ended)'
+                    self._slot_put((None, generation))
+                    break
+                self._slot_put((frame, generation))
+        except Exception as e:
+            self.last_error = str(e)
+            self._slot_put((None, generation))
+        finally:
+            cap.release()
+
+    def _slot_put(self, item):
+        """Latest-frame-wins hand-off: a consumer that falls behind skips frames, never queues them"""
+        try:
+            self._slot.put_nowait(item)
+        except queue.Full:
+            try:
+                self._slot.get_nowait()
+                self.frames_dropped += 1
+            except queue.Empty:
+                pass
+            self._slot.put_nowait(item)
+
+    def _backoff_delay(self) -> float:
+        """Exponential backoff with full jitter so a fleet of cameras doesn't reconnect in lock-step"""
+        delay = min(self.backoff_initial * (2 ** (self._failures - 1)), self.backoff_max)
+        return round(random.uniform(delay / 2, delay), 2)
+
+    def _connect(self) -> bool:
+        """(Re)open the source, backing off exponentially while it keeps failing"""
+        while not self._stop.is_set():
+            if self._failures:
+                if self.max_reconnects is not None and self._failures > self.max_reconnects:
+                    self.state = 'failed'
+                    return False
+                if self.initial_attempts is not None and not self.frames_read \
+                        and self._failures >= self.initial_attempts:
+                    logger.error(f"❌ {self.last_error} (gave up after {self._failures} attempts)")
+                    self.state = 'failed'
+                    return False
+                self.next_retry_in = self._backoff_delay()
+                logger.warning(f"⚠️  {self.source} unavailable; retrying in {self.next_retry_in}s")
+                if self._stop.wait(self.next_retry_in):
+                    return False
+
+            cap = self._open()
+            if cap is not None:
+                self._generation += 1
+                if self.live:
+                    # Live sources are read ahead on a thread so a blocked read() can time out
+                    threading.Thread(target=self._reader, args=(cap, self._generation),
+                                     name=f"capture-reader-{self.source}", daemon=True).start()
+                else:
+                    self._file_cap = cap
+                self.state = 'connected'
+                self.next_retry_in = None
+                return True
+
+            self._failures += 1
+            self.last_error = f"Cannot open source: {self.source}"
+            if not self.live:
+                self.state = 'failed'
+                return False
+        return False
+
+    # ------------------------------------------------------------------
+    # Consumer API
+    # ------------------------------------------------------------------
+
+    def frames(self) -> Generator[Tuple[np.ndarray, Dict], None, None]:
+        """Yield (frame, health) until the source ends, fails permanently or stop() is called"""
+        self._failures = 0  # Each call starts a fresh attempt (the multiplexer re-calls after a failure)
+        if not self._connect():
+            return
+
+        last_signature = None
+        repeats = 0
+        try:
+            while not self._stop.is_set():
+                if not self.live:
+                    ret, frame = self._file_cap.read()
+                    if not ret:
+                        self.state = 'ended'
+                        return
+                else:
+                    try:
+                        frame, generation = self._slot.get(timeout=self.read_timeout)
+                    except queue.Empty:
+                        frame, generation = None, self._generation
+                        self.stalls += 1
+                        self.last_error = f"No frame for {self.read_timeout}s"
+                    if generation != self._generation:
+                        continue  # Late frame from an abandoned capture
+
+                    if frame is not None and self.frozen_frames:
+                        signature = zlib.crc32(np.ascontiguousarray(frame[::16, ::16]).data)
+                        repeats = repeats + 1 if signature == last_signature else 0
+                        last_signature = signature
+                        if repeats >= self.frozen_frames:
+                            self.frozen_events += 1
+                            self.last_error = f"Frozen stream ({repeats} identical frames)"
+                            frame = None
+
+                    if frame is None:
+                        logger.warning(f"⚠️  {self.source} stalled ({self.last_error}); reconnecting")
+                        self._generation += 1  # Orphan the current reader
+                        self._failures += 1
+                        self.reconnects += 1
+                        repeats, last_signature = 0, None
+                        self.state = 'reconnecting'
+                        if not self._connect():
+                            return
+                        continue
+
+                self._failures = 0
+                self.frames_read += 1
+                self.last_frame_at = time.time()
+                yield frame, self.health()
+        finally:
+            if self._file_cap is not None:
+                self._file_cap.release()
+                self._file_cap = None
+            self._generation += 1
+            if self.state not in ('ended', 'failed'):
+                self.state = 'idle'
+
+    def stop(self):
+        self._stop.set()
+        self._generation += 1
+        self.state = 'idle'
+
+    def health(self) -> Dict:
+        return {
+            'state': self.state,
+            'connected': self.state == 'connected',
+            'live': self.live,
+            'frames_read': self.frames_read,
+            'frames_dropped': self.frames_dropped,
+            'reconnects': self.reconnects,
+            'stalls': self.stalls,
+            'frozen_events': self.frozen_events,
+            'last_frame_age_s': round(time.time() - self.last_frame_at, 2) if self.last_frame_at else None,
+            'next_retry_in': self.next_retry_in,
+            'last_error': self.last_error
+        }
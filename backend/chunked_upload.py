@@ -0,0 +1,308 @@
+"""
+Resumable chunked uploads for large drone videos.
+
+Protocol (offset-addressed, one session per file):
+  1. POST   /upload/chunked              -> create session, returns upload_id
+  2. GET    /upload/chunked/<upload_id>  -> current offset (resume point)
+  3. PUT    /upload/chunked/<upload_id>?offset=N  (raw bytes, X-Chunk-SHA256 header)
+  4. The session completes automatically once offset == size and the file is handed to
+     the on_complete hook (the app moves it into the upload store, see upload_store.py,
+     and starts a background video job for auto_detect uploads). It is marked complete
+     only when the hook succeeds. If the hook fails (e.g. 507, storage full), the error
+     and its status go back to the client, the received bytes are kept, and an empty PUT
+     at offset == size retries this step.
+
+Chunks are streamed straight into a sparse .part file, so server memory use
+is bounded by the copy buffer and independent of the file size. Session state
+is persisted as JSON next to the part file so uploads survive restarts.
+"""
+import os
+import json
+import uuid
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Optional, BinaryIO
+
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 1024 * 1024  # 1 MiB
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # Suggested client chunk size
+MAX_CHUNK_SIZE = 32 * 1024 * 1024  # Must stay below Flask MAX_CONTENT_LENGTH
+
+
+class ChunkedUploadError(Exception):
+    """Upload protocol error carrying the HTTP status the route should return"""
+
+    def __init__(self, message: str, status: int = 400, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+@dataclass
+class UploadSession:
+    id: str
+    filename: str
+    size: int
+    offset: int = 0
+    status: str = 'uploading'  # 'uploading' | 'complete'
+    sha256: Optional[str] = None  # Optional whole-file checksum supplied by the client
+    auto_detect: bool = False
+    file_path: Optional[str] = None
+    job_id: Optional[str] = None  # Video job started for auto_detect uploads
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class ChunkedUploadManager:
+    """
+    Tracks resumable upload sessions and assembles chunks directly on disk.
+    Calls on_complete(session) once a file has been fully received and verified.
+    A hook that fails is called again when the client retries completion; if it
+    had already taken the file, session.file_path is None then, so it must be
+    idempotent.
+    """
+
+    SESSION_DIR = '.chunked'
+
+    def __init__(self, upload_folder: str, on_complete: Optional[Callable[[UploadSession], None]] = None,
+                 max_chunk_size: int = MAX_CHUNK_SIZE):
+        self.upload_folder = upload_folder
+        self.session_dir = os.path.join(upload_folder, self.SESSION_DIR)
+        self.on_complete = on_complete
+        self.max_chunk_size = max_chunk_size
+        self._sessions: Dict[str, UploadSession] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.session_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Session bookkeeping
+    # ------------------------------------------------------------------
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.session_dir, f"{upload_id}.json")
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.session_dir, f"{upload_id}.part")
+
+    def _save(self, session: UploadSession):
+        """Persist session state atomically (write temp file, then rename)"""
+        session.updated_at = time.time()
+        tmp_path = self._meta_path(session.id) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(session.to_dict(), f)
+        os.replace(tmp_path, self._meta_path(session.id))
+
+    def _session_lock(self, upload_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def create(self, filename: str, size: int, sha256: Optional[str] = None,
+               auto_detect: bool = False) -> UploadSession:
+        """Start a new upload session and reserve its part file"""
+        safe_name = secure_filename(filename or '')
+        if not safe_name:
+            raise ChunkedUploadError('Invalid filename')
+        if not isinstance(size, int) or size <= 0:
+            raise ChunkedUploadError('size must be a positive integer (bytes)')
+
+        now = time.time()
+        session = UploadSession(
+            id=uuid.uuid4().hex,
+            filename=safe_name,
+            size=size,
+            sha256=sha256.lower() if sha256 else None,
+            auto_detect=bool(auto_detect),
+            created_at=now,
+            updated_at=now
+        )
+
+        # Sparse file: no bytes are allocated until chunks arrive
+        with open(self._part_path(session.id), 'wb'):
+            pass
+
+        with self._lock:
+            self._sessions[session.id] = session
+        self._save(session)
+        logger.info(f"📦 Chunked upload started: {safe_name} ({size} bytes) -> {session.id}")
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        """Return a session from memory, or reload it from disk after a restart"""
+        with self._lock:
+            session = self._sessions.get(upload_id)
+        if session:
+            return session
+
+        meta_path = self._meta_path(upload_id)
+        if not upload_id.isalnum() or not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r') as f:
+                session = UploadSession(**json.load(f))
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to load upload session {upload_id}: {e}")
+            return None
+
+        # The part file on disk is the source of truth for the resume offset
+        part_path = self._part_path(upload_id)
+        if session.status == 'uploading' and os.path.exists(part_path):
+            session.offset = min(session.offset, os.path.getsize(part_path))
+
+        with self._lock:
+            self._sessions[upload_id] = session
+        return session
+
+    def abort(self, upload_id: str) -> bool:
+        """Discard an unfinished session and its partial data"""
+        session = self.get(upload_id)
+        if not session:
+            return False
+        with self._session_lock(upload_id):
+            for path in (self._part_path(upload_id), self._meta_path(upload_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+            with self._lock:
+                self._sessions.pop(upload_id, None)
+                self._locks.pop(upload_id, None)
+        logger.info(f"🗑️ Chunked upload aborted: {upload_id}")
+        return True
+
+    def expire(self, max_age_s: float) -> int:
+        """Drop session state (and partial data) not updated for max_age_s; returns the count removed"""
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.session_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-5]
+            session = self.get(upload_id)
+            if session and now - session.updated_at > max_age_s and self.abort(upload_id):
+                removed += 1
+        return removed
+
+    # ------------------------------------------------------------------
+    # Chunk handling
+    # ------------------------------------------------------------------
+
+    def write_chunk(self, upload_id: str, offset: int, stream: BinaryIO, length: Optional[int],
+                    checksum: Optional[str] = None) -> UploadSession:
+        """
+        Append one chunk at `offset`, streaming from `stream` to disk.
+
+        The offset must equal the number of bytes already received, which lets
+        clients resume after a dropped connection by asking for the offset first.
+        A chunk whose SHA-256 does not match `checksum` is rolled back.
+        """
+        session = self.get(upload_id)
+        if not session:
+            raise ChunkedUploadError('Upload session not found', status=404)
+
+        lock = self._session_lock(upload_id)
+        if not lock.acquire(blocking=False):
+            raise ChunkedUploadError('Another chunk is being written for this upload', status=409,
+                                     offset=session.offset)
+        try:
+            if session.status == 'complete':
+                raise ChunkedUploadError('Upload already complete', status=409, offset=session.offset)
+            if offset != session.offset:
+                raise ChunkedUploadError(f'Offset mismatch: expected {session.offset}', status=409,
+                                         offset=session.offset)
+            if offset == session.size and not length:
+                # Everything arrived but completion failed earlier: retry it
+                self._finalize(session)
+                return session
+            if length is None:
+                raise ChunkedUploadError('Content-Length is required', status=411, offset=session.offset)
+            if length <= 0 or length > self.max_chunk_size:
+                raise ChunkedUploadError(f'Chunk size must be between 1 and {self.max_chunk_size} bytes',
+                                         status=413, offset=session.offset)
+            if offset + length > session.size:
+                raise ChunkedUploadError('Chunk exceeds declared file size', status=416, offset=session.offset)
+
+            hasher = hashlib.sha256()
+            written = 0
+            part_path = self._part_path(upload_id)
+
+            with open(part_path, 'r+b') as f:
+                f.seek(offset)
+                while written < length:
+                    block = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    f.write(block)
+                    written += len(block)
+
+                if written != length or (checksum and hasher.hexdigest() != checksum.lower()):
+                    # Roll back the partial/corrupt chunk so the client can retry at the same offset
+                    f.truncate(offset)
+                    if written != length:
+                        raise ChunkedUploadError(f'Incomplete chunk: received {written} of {length} bytes',
+                                                 status=400, offset=offset)
+                    raise ChunkedUploadError('Chunk checksum mismatch', status=422, offset=offset)
+
+                f.flush()
+                os.fsync(f.fileno())
+
+            session.offset = offset + written
+            self._save(session)
+
+            if session.offset == session.size:
+                self._finalize(session)
+
+            return session
+        finally:
+            lock.release()
+
+    def _finalize(self, session: UploadSession):
+        """Verify the assembled file and move it into the upload folder"""
+        part_path = self._part_path(session.id)
+
+        if os.path.exists(part_path):
+            if session.sha256:
+                hasher = hashlib.sha256()
+                with open(part_path, 'rb') as f:
+                    for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+                        hasher.update(block)
+                if hasher.hexdigest() != session.sha256:
+                    # Whole-file mismatch: restart from zero rather than keep corrupt data
+                    with open(part_path, 'wb'):
+                        pass
+                    session.offset = 0
+                    self._save(session)
+                    raise ChunkedUploadError('File checksum mismatch; upload restarted', status=422, offset=0)
+
+            final_path = os.path.join(self.upload_folder, f"{session.id}_{session.filename}")
+            os.replace(part_path, final_path)
+            session.file_path = os.path.abspath(final_path)
+        else:
+            # A retry after on_complete took the file and then failed: the hook picks up from there
+            final_path = None
+
+        if self.on_complete:
+            try:
+                self.on_complete(session)
+            except Exception as e:
+                logger.error(f"❌ Upload completion hook failed for {session.id}: {e}")
+                # Keep the received bytes so the client can retry completion with an empty PUT
+                if final_path and os.path.exists(final_path):
+                    os.replace(final_path, part_path)
+                session.file_path = None
+                session.job_id = None
+                self._save(session)
+                raise ChunkedUploadError(f'Upload received but not stored: {e}', status=getattr(e, 'status', 500),
+                                         offset=session.offset)
+
+        session.status = 'complete'
+        self._save(session)
+        logger.info(f"✅ Chunked upload complete: {session.file_path}")
@@ -0,0 +1,124 @@
+"""
+Compact columnar encoding of detections, negotiated through the Accept header.
+
+The default /stream/detect body lists every box as an object that repeats
+its key strings and carries both x1/y1/x2/y2 and x/y/w/h. Clients that send
+
+    Accept: application/vnd.agrovision.columnar+json      (or ...+msgpack)
+
+get detections as parallel arrays plus a class-name table instead:
+
+    "detections": {"classes": ["Blast", "Aphid"],
+                   "cls": [0, 1, 0], "conf": [91.2, 64.0, 40.5],
+                   "x1": [...], "y1": [...], "x2": [...], "y2": [...]}
+
+Coordinates are normalized to 0-1 (4 decimals) and conf is a percentage,
+as in the row format. w/h and the x/y aliases follow from x1..y2. The
+MessagePack variant needs the optional msgpack package. Without it, clients
+get the default JSON. Video streams use the same columns per record: NDJSON
+lines for +json, and back-to-back MessagePack maps for +msgpack.
+"""
+import logging
+from typing import Dict, Iterable, List
+
+from serialization import dumps_bytes
+
+try:
+    import msgpack  # Optional: enables the +msgpack variant
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+JSON = 'application/json'
+COLUMNAR_JSON = 'application/vnd.agrovision.columnar+json'
+COLUMNAR_MSGPACK = 'application/vnd.agrovision.columnar+msgpack'
+# Generic MessagePack types are answered with the columnar layout too
+MSGPACK_ALIASES = ('application/msgpack', 'application/x-msgpack')
+
+
+def negotiate(accept) -> str:
+    """
+    Pick the response format for an Accept header.
+
+    Args:
+        accept: werkzeug MIMEAccept (request.accept_mimetypes)
+
+    Returns:
+        JSON (the default, also for */*), COLUMNAR_JSON or COLUMNAR_MSGPACK
+    """
+    offers = [JSON, COLUMNAR_JSON]
+    if msgpack is not None:
+        offers += [COLUMNAR_MSGPACK, *MSGPACK_ALIASES]
+    best = accept.best_match(offers, default=JSON)
+    return COLUMNAR_MSGPACK if best in MSGPACK_ALIASES else best
+
+
+def columns_from_detections(detections: Iterable[Dict], width: int, height: int) -> Dict[str, List]:
+    """
+    Columnar detections straight from detector output (pixel coordinates).
+
+    Args:
+        detections: predict_frame() detections (class_name, confidence 0-1, x1..y2 in pixels)
+        width: Frame width used for normalization
+        height: Frame height used for normalization
+    """
+    classes: Dict[str, int] = {}
+    cls, conf, x1, y1, x2, y2 = [], [], [], [], [], []
+    for det in detections:
+        cls.append(classes.setdefault(det['class_name'], len(classes)))
+        conf.append(round(det['confidence'] * 100, 1))
+        x1.append(round(det['x1'] / width, 4))
+        y1.append(round(det['y1'] / height, 4))
+        x2.append(round(det['x2'] / width, 4))
+        y2.append(round(det['y2'] / height, 4))
+    return {'classes': list(classes), 'cls': cls, 'conf': conf, 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+
+
+def columns_from_boxes(boxes: Iterable[Dict]) -> Dict[str, List]:
+    """Columnar detections from row-format boxes (class, conf, normalized x1..y2)"""
+    classes: Dict[str, int] = {}
+    cls, conf, x1, y1, x2, y2 = [], [], [], [], [], []
+    for box in boxes:
+        cls.append(classes.setdefault(box['class'], len(classes)))
+        conf.append(box['conf'])
+        x1.append(box['x1'])
+        y1.append(box['y1'])
+        x2.append(box['x2'])
+        y2.append(box['y2'])
+    return {'classes': list(classes), 'cls': cls, 'conf': conf, 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+
+
+def boxes_from_columns(columns: Dict[str, List]) -> List[Dict]:
+    """Row-format boxes back from columns (tests, Python clients)"""
+    names = columns['classes']
+    return [{'class': names[c], 'conf': conf, 'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2}
+            for c, conf, x1, y1, x2, y2 in zip(columns['cls'], columns['conf'], columns['x1'],
+                                               columns['y1'], columns['x2'], columns['y2'])]
+
+
+def dumps(body: Dict, media_type: str) -> bytes:
+    """Serialize a response body in a negotiated columnar format"""
+    if media_type == COLUMNAR_MSGPACK:
+        return msgpack.packb(body, use_single_float=True)
+    return dumps_bytes(body)
+
+
+def stream_record(record: Dict, media_type: str) -> bytes:
+    """
+    One video-stream record (iter_video_detections output) in a negotiated format.
+
+    Row format stays as NDJSON for JSON. The columnar formats swap the
+    detections list for columns.
+    """
+    if media_type == JSON:
+        return dumps_bytes(record) + b'\n'
+    record = {**record, 'detections': columns_from_boxes(record['detections'])}
+    if media_type == COLUMNAR_MSGPACK:
+        return dumps(record, media_type)
+    return dumps(record, media_type) + b'\n'
+
+
+def stream_mimetype(media_type: str) -> str:
+    """Content type of a video stream: NDJSON lines, or concatenated MessagePack maps"""
+    return COLUMNAR_MSGPACK if media_type == COLUMNAR_MSGPACK else 'application/x-ndjson'
@@ -0,0 +1,102 @@
+"""
+Adaptive frame-stride controller for video detection.
+
+Instead of a fixed "every Nth frame", the stride is chosen per sample from:
+  - detection activity: dense sampling while diseases are visible,
+    sparse sampling on empty field (stride ramps up gradually)
+  - recent inference latency: the stride never drops below what is needed
+    to keep processing at `min_speed` x real time, so long videos finish in
+    bounded time (about duration / min_speed, plus decode cost)
+"""
+import math
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveFrameSampler:
+    """
+    Decides which frames of a video/stream to run detection on.
+
+    Usage:
+        sampler = AdaptiveFrameSampler(source_fps=30)
+        for frame_index, frame in enumerate(frames, start=1):
+            if sampler.should_process(frame_index):
+                result = detector.predict_frame(frame)
+                sampler.update(latency_s, len(result['detections']), timestamp, frame_index)
+
+    Args:
+        source_fps: Frame rate of the source (frames per second of video time)
+        target_fps: Frames analysed per second of video while detections are active
+        idle_fps: Frames analysed per second of video on empty field
+        min_speed: Minimum processing speed relative to real time (1.0 = keep up with live)
+        hold_seconds: Video time to stay dense after the last detection
+        latency_alpha: EMA smoothing factor for inference latency
+    """
+
+    IDLE_RAMP = 1.5  # Stride growth factor per empty sample
+
+    def __init__(self, source_fps: float, target_fps: float = 10.0, idle_fps: float = 2.0,
+                 min_speed: float = 1.0, hold_seconds: float = 2.0, latency_alpha: float = 0.3):
+        self.source_fps = source_fps if source_fps and source_fps > 0 else 30.0
+        self.target_fps = max(target_fps, 0.1)
+        self.idle_fps = max(min(idle_fps, self.target_fps), 0.1)
+        self.min_speed = max(min_speed, 0.0)
+        self.hold_seconds = hold_seconds
+        self.latency_alpha = latency_alpha
+
+        self.active_stride = max(1, round(self.source_fps / self.target_fps))
+        self.idle_stride = max(self.active_stride, round(self.source_fps / self.idle_fps))
+
+        self.stride = self.active_stride
+        self.latency_ema: Optional[float] = None
+        self.last_active_ts: Optional[float] = None
+        self.last_ts = 0.0
+        self.next_frame = 1
+        self.samples = 0
+
+    @property
+    def latency_stride(self) -> int:
+        """Smallest stride that keeps inference at min_speed x real time"""
+        if self.latency_ema is None or self.min_speed <= 0:
+            return 1
+        return max(1, math.ceil(self.source_fps * self.latency_ema * self.min_speed))
+
+    @property
+    def active(self) -> bool:
+        return self.last_active_ts is not None and self.last_ts - self.last_active_ts <= self.hold_seconds
+
+    def should_process(self, frame_index: int) -> bool:
+        """True if detection should run on this (1-based) frame"""
+        return frame_index >= self.next_frame
+
+    def update(self, latency_s: float, detection_count: int, timestamp: float, frame_index: int):
+        """Feed back the outcome of one processed frame and schedule the next one"""
+        self.samples += 1
+        self.last_ts = timestamp
+
+        if self.latency_ema is None:
+            self.latency_ema = latency_s
+        else:
+            self.latency_ema = self.latency_alpha * latency_s + (1 - self.latency_alpha) * self.latency_ema
+
+        if detection_count > 0:
+            self.last_active_ts = timestamp
+
+        if self.active:
+            activity_stride = self.active_stride
+        else:
+            # Ease out towards sparse sampling so a brief gap doesn't skip a whole patch
+            activity_stride = min(self.idle_stride, max(self.stride + 1, math.ceil(self.stride * self.IDLE_RAMP)))
+
+        self.stride = max(activity_stride, self.latency_stride)
+        self.next_frame = frame_index + self.stride
+
+    def stats(self) -> Dict:
+        return {
+            'stride': self.stride,
+            'mode': 'dense' if self.active else 'sparse',
+            'latency_ms': round(self.latency_ema * 1000, 1) if self.latency_ema is not None else None,
+            'samples': self.samples
+        }
@@ -0,0 +1,60 @@
+"""
+Gunicorn configuration for multi-worker inference.
+
+    cd backend && gunicorn -c gunicorn.conf.py app:app
+    cd backend && GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn -c gunicorn.conf.py asgi:app
+
+With preload (default) the master imports app.py once and loads the model
+weights on the CPU before forking, so every worker maps the same weight
+pages copy-on-write instead of holding its own copy. gc.freeze() moves the
+objects that exist at fork time out of the collector's reach, so garbage
+collection in the workers doesn't write to (and un-share) those pages.
+Each worker then sizes its torch thread pool, optionally moves to the GPU,
+warms up and - in exactly one worker - runs the video job queue.
+
+See docs/MULTI_WORKER_DEPLOYMENT.md for memory sizing.
+"""
+import gc
+import os
+import multiprocessing
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', max(1, multiprocessing.cpu_count() // 2)))
+# Threads per worker: requests wait on I/O (uploads, LLM calls, streaming) as much as on the model.
+# GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker with asgi:app serves connections from an
+# event loop instead (see asgi.py); threads is then unused.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+# Model warm-up and long NDJSON/MJPEG streams outlive the default 30 s
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+# Recycle workers now and then to cap slow leaks (jittered so they don't all restart together)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max(1, max_requests // 10) if max_requests else 0
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+if preload_app:
+    # Read by app.py at import: load synchronously in the master, start threads after fork
+    os.environ['APP_PREFORK'] = '1'
+
+# One torch intra-op thread per worker by default: N workers x M threads should not exceed the cores
+os.environ.setdefault('TORCH_THREADS_PER_WORKER', '1')
+
+# Per-request access lines are written synchronously; GUNICORN_ACCESS_LOG= (empty) turns them off
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def when_ready(server):
+    if preload_app:
+        # Everything allocated so far (app, registries, model) is shared; keep GC off those pages
+        gc.freeze()
+        server.log.info(f"Model preloaded in master; {gc.get_freeze_count()} objects frozen before fork")
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    import app as app_module
+    app_module.init_worker()
+    server.log.info(f"Worker {worker.pid} initialised")
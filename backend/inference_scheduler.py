@@ -0,0 +1,255 @@
+"""
+Priority scheduling of model inference between live frames, uploads and batch jobs.
+
+All callers share one model. Before each forward pass they take a slot from
+the InferenceScheduler. When the model is busy, waiters are served by class
+rank (live, then upload, then batch) and then by arrival order, with two
+exceptions:
+
+- Deadlines: a live frame that waited past its deadline is dropped with
+  FrameExpired instead of being processed late. The camera has already sent
+  a newer frame.
+- Aging: every aging_ms a waiter spends in the queue raises it one rank, so
+  batch work is delayed under sustained live load but never starved.
+
+Batch video jobs take a slot per frame batch. They therefore soak up idle
+capacity, and a live frame waits at most one batch inference behind them.
+
+The caller's class is carried in a context variable:
+
+    with inference_class(LIVE, since=request_started):
+        detector.predict_frame(frame)   # YOLODetector takes the slot itself
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+LIVE = 'live'
+UPLOAD = 'upload'
+BATCH = 'batch'
+DEFAULT_CLASS = UPLOAD  # Callers that never declared a class (scripts, tests)
+
+
+@dataclass
+class PriorityClass:
+    """
+    Scheduling settings for one class of inference work.
+
+    Args:
+        name: live | upload | batch
+        rank: Queue order (lower runs first)
+        slo_ms: Latency objective (queue wait + inference) reported in metrics
+        deadline_ms: Drop the request if it is still waiting this long after `since` (None = never)
+        aging_ms: Promote a waiter by one rank per this much waiting (None = no aging)
+    """
+    name: str
+    rank: int
+    slo_ms: float
+    deadline_ms: Optional[float] = None
+    aging_ms: Optional[float] = None
+
+
+class FrameExpired(Exception):
+    """A request missed its deadline while waiting for the model and was dropped"""
+
+    def __init__(self, class_name: str, waited_ms: float):
+        super().__init__(f"{class_name} request dropped after waiting {waited_ms:.0f} ms")
+        self.class_name = class_name
+        self.waited_ms = waited_ms
+
+
+# (class name, time the work became due as a perf_counter timestamp or None for "at slot request")
+_current_class = contextvars.ContextVar('inference_class', default=(DEFAULT_CLASS, None))
+
+
+@contextmanager
+def inference_class(name: str, since: Optional[float] = None):
+    """
+    Run the enclosed inference as class `name`.
+
+    Args:
+        name: LIVE, UPLOAD or BATCH
+        since: perf_counter() timestamp the deadline counts from (e.g. request arrival);
+               None counts from each slot request
+    """
+    token = _current_class.set((name, since))
+    try:
+        yield
+    finally:
+        _current_class.reset(token)
+
+
+class _Waiter:
+    __slots__ = ('cls', 'seq', 'enqueued', 'deadline', 'granted')
+
+    def __init__(self, cls: PriorityClass, seq: int, enqueued: float, deadline: Optional[float]):
+        self.cls = cls
+        self.seq = seq
+        self.enqueued = enqueued
+        self.deadline = deadline
+        self.granted = False
+
+    def effective_rank(self, now: float) -> float:
+        if not self.cls.aging_ms:
+            return self.cls.rank
+        return self.cls.rank - int((now - self.enqueued) * 1000 / self.cls.aging_ms)
+
+
+class _ClassStats:
+    def __init__(self):
+        self.completed = 0
+        self.dropped = 0
+        self.promoted = 0  # Granted ahead of a better-ranked, still-valid waiter thanks to aging
+        self.waits_ms = deque(maxlen=2048)
+        self.latencies_ms = deque(maxlen=2048)
+
+
+class InferenceScheduler:
+    """
+    Args:
+        classes: Priority classes keyed by name
+        concurrency: Forward passes allowed at once (1 for a single CPU/GPU model)
+    """
+
+    def __init__(self, classes: Dict[str, PriorityClass], concurrency: int = 1):
+        self.classes = classes
+        self.concurrency = max(1, concurrency)
+        self._running = 0
+        self._seq = 0
+        self._waiters: List[_Waiter] = []
+        self._cond = threading.Condition()
+        self._stats = {name: _ClassStats() for name in classes}
+
+    @contextmanager
+    def slot(self):
+        """Hold the model for one forward pass on behalf of the current inference_class"""
+        name, since = _current_class.get()
+        cls = self.classes.get(name) or self.classes[DEFAULT_CLASS]
+        requested = time.perf_counter()
+        origin = since if since is not None else requested
+        deadline = origin + cls.deadline_ms / 1000 if cls.deadline_ms else None
+
+        with tracing.span('scheduler.wait', **{'scheduler.class': cls.name}):
+            self._acquire(cls, requested, deadline)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            with self._cond:
+                self._running -= 1
+                stats = self._stats[cls.name]
+                stats.completed += 1
+                stats.waits_ms.append((started - requested) * 1000)
+                stats.latencies_ms.append((finished - origin) * 1000)
+                self._dispatch()
+
+    def _acquire(self, cls: PriorityClass, requested: float, deadline: Optional[float]):
+        with self._cond:
+            self._seq += 1
+            waiter = _Waiter(cls, self._seq, requested, deadline)
+            self._waiters.append(waiter)
+            self._dispatch()
+            while not waiter.granted:
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        self._waiters.remove(waiter)
+                        self._stats[cls.name].dropped += 1
+                        raise FrameExpired(cls.name, (time.perf_counter() - requested) * 1000)
+                self._cond.wait(timeout)
+
+    def _dispatch(self):
+        """Grant free slots: drop expired waiters, then best effective rank, then arrival order"""
+        now = time.perf_counter()
+        # Expired waiters wake on their own timeout and raise; just don't hand them a slot
+        live = [w for w in self._waiters if w.deadline is None or w.deadline > now]
+        live.sort(key=lambda w: (w.effective_rank(now), w.seq))
+        for i, waiter in enumerate(live):
+            if self._running >= self.concurrency:
+                break
+            self._waiters.remove(waiter)
+            # Passing an expired waiter is not a promotion; it is counted in dropped when it raises
+            if any(other.cls.rank < waiter.cls.rank for other in live[i + 1:]):
+                self._stats[waiter.cls.name].promoted += 1
+            waiter.granted = True
+            self._running += 1
+        self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """Per-class queue depth, drops, wait and end-to-end latency percentiles against the SLO"""
+        with self._cond:
+            queued: Dict[str, int] = {}
+            for waiter in self._waiters:
+                queued[waiter.cls.name] = queued.get(waiter.cls.name, 0) + 1
+            classes = {}
+            for name, cls in self.classes.items():
+                stats = self._stats[name]
+                latencies = sorted(stats.latencies_ms)
+                waits = sorted(stats.waits_ms)
+                within_slo = sum(1 for v in latencies if v <= cls.slo_ms)
+                classes[name] = {
+                    'rank': cls.rank,
+                    'queued': queued.get(name, 0),
+                    'completed': stats.completed,
+                    'dropped_deadline': stats.dropped,
+                    'promoted_by_aging': stats.promoted,
+                    'wait_p50_ms': _percentile(waits, 0.50),
+                    'wait_p99_ms': _percentile(waits, 0.99),
+                    'latency_p50_ms': _percentile(latencies, 0.50),
+                    'latency_p95_ms': _percentile(latencies, 0.95),
+                    'latency_p99_ms': _percentile(latencies, 0.99),
+                    'slo_ms': cls.slo_ms,
+                    'slo_attainment': round(within_slo / len(latencies), 4) if latencies else None,
+                    'deadline_ms': cls.deadline_ms,
+                    'aging_ms': cls.aging_ms
+                }
+            return {'concurrency': self.concurrency, 'running': self._running, 'classes': classes}
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 1)
+
+
+# Class defaults: (rank, slo_ms, deadline_ms, aging_ms)
+DEFAULT_CLASSES = {
+    LIVE: (0, 250.0, 500.0, None),
+    UPLOAD: (1, 2000.0, None, 5000.0),
+    BATCH: (2, 10000.0, None, 2000.0),
+}
+
+
+def from_env() -> InferenceScheduler:
+    """
+    Scheduler configured from the environment.
+
+    INFERENCE_CONCURRENCY sets the concurrent forward passes (default 1);
+    SCHED_<CLASS>_SLO_MS, _DEADLINE_MS and _AGING_MS override a class
+    (0 disables a deadline or aging).
+    """
+    classes = {}
+    for name, (rank, slo_ms, deadline_ms, aging_ms) in DEFAULT_CLASSES.items():
+        prefix = f'SCHED_{name.upper()}_'
+        deadline_ms = float(os.environ.get(prefix + 'DEADLINE_MS', deadline_ms or 0))
+        aging_ms = float(os.environ.get(prefix + 'AGING_MS', aging_ms or 0))
+        classes[name] = PriorityClass(
+            name=name,
+            rank=rank,
+            slo_ms=float(os.environ.get(prefix + 'SLO_MS', slo_ms)),
+            deadline_ms=deadline_ms or None,
+            aging_ms=aging_ms or None
+        )
+    return InferenceScheduler(classes, concurrency=int(os.environ.get('INFERENCE_CONCURRENCY', '1')))
@@ -0,0 +1,173 @@
+"""
+Letterbox + normalize preprocessing into reusable input buffers.
+
+Ultralytics letterboxes, transposes and converts every ndarray it is given,
+allocating fresh arrays per call. LetterboxPreprocessor does the same work
+into buffers that are allocated once per (batch, imgsz) and reused, so a
+long-running camera loop settles at (near) zero allocations per frame:
+
+  frame (BGR, any size) -> single resize into a view of the staging buffer
+                        -> copy into the padded uint8 canvas (B, S, S, 3)
+                        -> BGR->RGB, HWC->CHW, /255 into float32 (B, 3, S, S)
+
+The float buffer is handed to the model as a tensor; LetterboxMeta maps the
+resulting boxes back to source-frame pixels. Each prepared() call checks a
+buffer set out for itself, so concurrent callers never share one and no
+lock is held while the model runs.
+"""
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+PAD_VALUE = 114  # Same grey Ultralytics pads with
+IDLE_SETS_PER_SHAPE = 2  # Returned buffer sets kept per (batch, imgsz); extras are freed
+
+
+@dataclass(frozen=True)
+class LetterboxMeta:
+    """Geometry of one letterboxed frame: scale and padding applied to the source"""
+    scale: float
+    pad_x: int
+    pad_y: int
+    width: int   # Source frame width
+    height: int  # Source frame height
+
+    def to_source(self, boxes: np.ndarray) -> np.ndarray:
+        """Map (N, 4) xyxy boxes from letterbox space back to clipped source pixels"""
+        boxes = boxes.astype(np.float32, copy=True)
+        xs, ys = boxes[:, 0::2], boxes[:, 1::2]  # Views, so clip(out=) writes through
+        xs -= self.pad_x
+        ys -= self.pad_y
+        boxes /= self.scale
+        np.clip(xs, 0, self.width, out=xs)
+        np.clip(ys, 0, self.height, out=ys)
+        return boxes
+
+
+def tile_windows(height: int, width: int, tile: int, overlap: float = 0.2) -> List[Tuple[int, int, int, int]]:
+    """
+    Overlapping square windows (x0, y0, x1, y1) covering a height x width frame.
+
+    Windows are spread evenly so the last one ends on the frame edge; a frame
+    smaller than tile yields a single window over the whole frame.
+    """
+    def starts(length: int) -> List[int]:
+        if length <= tile:
+            return [0]
+        step = max(1, int(tile * (1 - overlap)))
+        count = -(-(length - tile) // step) + 1
+        return [round(i * (length - tile) / (count - 1)) for i in range(count)]
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+class _BufferSet:
+    """Canvas + float input for one (batch, imgsz), the geometry last drawn per slot and a resize staging area"""
+
+    def __init__(self, batch: int, imgsz: int):
+        self.canvas = np.full((batch, imgsz, imgsz, 3), PAD_VALUE, dtype=np.uint8)
+        self.input = np.empty((batch, 3, imgsz, imgsz), dtype=np.float32)
+        self.slot_meta: List = [None] * batch
+        # A resized frame never exceeds imgsz x imgsz, so one flat buffer serves every size
+        self._staging = np.empty(imgsz * imgsz * 3, dtype=np.uint8)
+
+    def staging(self, height: int, width: int) -> np.ndarray:
+        """Contiguous (height, width, 3) view of the staging buffer"""
+        return self._staging[:height * width * 3].reshape(height, width, 3)
+
+    @property
+    def nbytes(self) -> int:
+        return self.canvas.nbytes + self.input.nbytes + self._staging.nbytes
+
+
+class LetterboxPreprocessor:
+    """
+    Owns the input buffers of one detector.
+
+    Args:
+        imgsz: Default square model input size (multiple of the model stride)
+
+    Buffer sets are pooled per (batch, imgsz). A set belongs to one prepared()
+    call until its block exits, so the model can read it without a lock.
+    """
+
+    def __init__(self, imgsz: int = 640):
+        self.imgsz = imgsz
+        self._lock = threading.Lock()  # Guards the pool only
+        self._idle: Dict[Tuple[int, int], List[_BufferSet]] = {}
+        self._in_use = 0
+
+    def _checkout(self, batch: int, imgsz: int) -> _BufferSet:
+        with self._lock:
+            self._in_use += 1
+            idle = self._idle.get((batch, imgsz))
+            if idle:
+                return idle.pop()
+        return _BufferSet(batch, imgsz)
+
+    def _checkin(self, batch: int, imgsz: int, buffers: _BufferSet):
+        with self._lock:
+            self._in_use -= 1
+            idle = self._idle.setdefault((batch, imgsz), [])
+            if len(idle) < IDLE_SETS_PER_SHAPE:
+                idle.append(buffers)
+
+    def _letterbox_into(self, frame: np.ndarray, buffers: _BufferSet, slot: int, imgsz: int) -> LetterboxMeta:
+        h, w = frame.shape[:2]
+        scale = min(imgsz / h, imgsz / w)
+        new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+        pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+        meta = LetterboxMeta(scale, pad_x, pad_y, w, h)
+
+        canvas = buffers.canvas[slot]
+        if buffers.slot_meta[slot] != meta:
+            # Geometry changed (first frame / new source size): repaint the padding once
+            canvas[:] = PAD_VALUE
+            buffers.slot_meta[slot] = meta
+
+        region = canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w]
+        if (new_w, new_h) == (w, h):
+            region[:] = frame
+        else:
+            # cv2 only writes into contiguous dst arrays, so resize into the staging view
+            staging = buffers.staging(new_h, new_w)
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+            cv2.resize(frame, (new_w, new_h), dst=staging, interpolation=interpolation)
+            region[:] = staging
+        return meta
+
+    @contextmanager
+    def prepared(self, frames: Sequence[np.ndarray], imgsz: int = 0) -> Iterator[Tuple[np.ndarray, List[LetterboxMeta]]]:
+        """
+        Letterbox and normalize frames into a checked-out float buffer.
+
+        Yields:
+            (float32 array (B, 3, imgsz, imgsz) in RGB 0-1, per-frame LetterboxMeta),
+            valid until the block exits
+        """
+        imgsz = imgsz or self.imgsz
+        buffers = self._checkout(len(frames), imgsz)
+        try:
+            metas = [self._letterbox_into(frame, buffers, i, imgsz) for i, frame in enumerate(frames)]
+            # BGR->RGB and HWC->CHW are views; the multiply writes straight into the float buffer
+            np.multiply(buffers.canvas[..., ::-1].transpose(0, 3, 1, 2), np.float32(1 / 255),
+                        out=buffers.input, casting='unsafe')
+            yield buffers.input, metas
+        finally:
+            self._checkin(len(frames), imgsz, buffers)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            idle = {key: list(sets) for key, sets in self._idle.items()}
+            in_use = self._in_use
+        return {
+            'imgsz': self.imgsz,
+            'buffer_sets': [list(key) for key, sets in idle.items() if sets],
+            'buffer_sets_in_use': in_use,
+            'buffer_bytes': sum(b.nbytes for sets in idle.values() for b in sets)
+        }
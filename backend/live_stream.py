@@ -0,0 +1,69 @@
+"""
+Long-lived streamed responses that don't hold a thread while they wait.
+
+An MJPEG viewer, the /streams/events feed and a followed job's results spend
+almost all of their time waiting for the next frame, result or line. Under a
+WSGI server the body is an ordinary blocking generator. Under asgi.py a
+LiveResponse hands the bridge the async variant of the same stream instead.
+That variant waits on the event loop, so N idle viewers cost N sockets, not
+N pool threads.
+"""
+from typing import AsyncIterator, Callable, Iterator
+
+from flask import Response
+
+
+class LiveStream:
+    """
+    A response body with a blocking and an async variant of the same stream.
+
+    Neither variant starts (subscribes, counts a viewer) until it is iterated.
+
+    Args:
+        sync_factory: Returns the generator a WSGI server iterates
+        async_factory: Returns the async generator the ASGI bridge iterates on its event loop
+    """
+    supports_async = True
+
+    def __init__(self, sync_factory: Callable[[], Iterator], async_factory: Callable[[], AsyncIterator]):
+        self._sync_factory = sync_factory
+        self._async_factory = async_factory
+        self._iterator = None
+
+    def __iter__(self) -> Iterator:
+        self._iterator = self._sync_factory()
+        return self._iterator
+
+    def __aiter__(self) -> AsyncIterator:
+        return self._async_factory()
+
+    def close(self):
+        if hasattr(self._iterator, 'close'):
+            self._iterator.close()
+
+
+class _AsyncBody:
+    """WSGI app_iter that lets asgi.ASGIBridge reach the async side of a LiveStream"""
+    supports_async = True
+
+    def __init__(self, response: Response):
+        self._response = response
+
+    def __iter__(self):
+        return iter(self._response.response)
+
+    def __aiter__(self) -> AsyncIterator:
+        return self._response.response.__aiter__()
+
+    def close(self):
+        self._response.close()  # Also runs call_on_close callbacks
+
+
+class LiveResponse(Response):
+    """Response whose LiveStream body (possibly wrapped by compression) is served async under asgi.py"""
+
+    def get_app_iter(self, environ):
+        if ('asgi.scope' in environ and environ['REQUEST_METHOD'] != 'HEAD'
+                and getattr(self.response, 'supports_async', False)):
+            return _AsyncBody(self)
+        return super().get_app_iter(environ)
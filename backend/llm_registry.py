@@ -1,12 +1,18 @@
 import os
 import json
 import logging
-import requests
 from typing import Dict, Optional, Any
 from dataclasses import dataclass, asdict
 
+import tracing
+
 logger = logging.getLogger(__name__)
 
+def _http():
+    """requests, imported on the first LLM call rather than at startup"""
+    import requests
+    return requests
+
 @dataclass
 class LLMInfo:
     id: str
@@ -115,17 +121,19 @@ Respond ONLY with a valid JSON object matching this structure exactly:
 Do not include any other text or markdown formatting before or after the JSON.
 """
 
-        if model.type == 'local':
-            return self._call_ollama(model, system_prompt, prompt)
-        elif model.type == 'online':
-            if model.id.startswith('groq'):
-                return self._call_groq(model, system_prompt, prompt)
-            elif model.id.startswith('gemini'):
-                return self._call_gemini(model, system_prompt, prompt)
+        with tracing.span('llm.generate_report', **{'llm.id': model.id, 'llm.model': model.model,
+                                                     'llm.prompt_chars': len(prompt)}):
+            if model.type == 'local':
+                return self._call_ollama(model, system_prompt, prompt)
+            elif model.type == 'online':
+                if model.id.startswith('groq'):
+                    return self._call_groq(model, system_prompt, prompt)
+                elif model.id.startswith('gemini'):
+                    return self._call_gemini(model, system_prompt, prompt)
+                else:
+                    raise ValueError(f"Unsupported online model: {model.id}")
             else:
-                raise ValueError(f"Unsupported online model: {model.id}")
-        else:
-            raise ValueError(f"Unsupported model type: {model.type}")
+                raise ValueError(f"Unsupported model type: {model.type}")
 
     def _build_prompt(self, analysis_data: dict) -> str:
         # extract data to build prompt
@@ -139,6 +147,14 @@ Do not include any other text or markdown formatting before or after the JSON.
             
         return f"Detection Summary:\n{summary_text}\nBased on this data, please provide recommended treatments and risk analysis."
 
+    @staticmethod
+    def _post(provider: str, url: str, payload: dict, timeout: float, headers: Optional[dict] = None):
+        """POST to an LLM API inside a client span, with the trace context in traceparent"""
+        with tracing.span('llm.http', kind=tracing.KIND_CLIENT, **{'llm.provider': provider}) as span:
+            response = _http().post(url, headers=tracing.inject(headers), json=payload, timeout=timeout)
+            span.set(**{'http.status_code': response.status_code, 'http.response_bytes': len(response.content)})
+            return response
+
     def _call_ollama(self, model: LLMInfo, system_prompt: str, prompt: str) -> Dict[str, Any]:
         url = f"{model.base_url}/api/chat"
         payload = {
@@ -152,7 +168,7 @@ Do not include any other text or markdown formatting before or after the JSON.
         }
         try:
             # Increased timeout to 120 seconds to accommodate slower local hardware or larger prompts
-            response = requests.post(url, json=payload, timeout=120)
+            response = self._post('ollama', url, payload, timeout=120)
             response.raise_for_status()
             result = response.json()
             content = result.get('message', {}).get('content', '{}')
@@ -180,7 +196,7 @@ Do not include any other text or markdown formatting before or after the JSON.
             "response_format": {"type": "json_object"}
         }
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self._post('groq', url, payload, timeout=30, headers=headers)
             response.raise_for_status()
             result = response.json()
             content = result.get('choices', [{}])[0].get('message', {}).get('content', '{}')
@@ -211,7 +227,7 @@ Do not include any other text or markdown formatting before or after the JSON.
             }
         }
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = self._post('gemini', url, payload, timeout=30, headers=headers)
             response.raise_for_status()
             result = response.json()
             content = result.get('candidates', [{}])[0].get('content', {}).get('parts', [{}])[0].get('text', '{}')
@@ -0,0 +1,357 @@
+"""
+Load generator: N concurrent camera clients against /stream/detect.
+
+    python loadgen.py --local --clients 1,2,4,8,16 --fps 10 --duration 20
+    python loadgen.py --url http://10.0.0.5:5000 --clients 8 --mode binary --out load.json
+
+Each client behaves like the frontend's LiveCameraPredictor. It grabs a
+frame from the video every 1/fps seconds and keeps at most one request in
+flight. Frames that come due while a request is in flight are skipped, so a
+slow server shows up as lower achieved fps and not as an unbounded backlog.
+
+Modes:
+    base64   JSON {"frame": <base64 JPEG>}, as the browser sends it
+    binary   raw JPEG body, Content-Type image/jpeg
+    ws       JPEG binary messages over a WebSocket (--ws-path, default
+             /stream/ws); the server answers each with the JSON body
+             /stream/detect would return. Needs the websocket-client package.
+
+While the clients run, /metrics is polled for the server's admission queue
+depth and in-flight count. With --clients as a list, each step runs in turn
+and the report names the largest client count that sustained the target:
+achieved fps within 95% of it, and under 1% of requests rejected or failed.
+
+--local starts a server on a free port whose active model is the registry's
+deterministic mock detector (--mock-latency-ms, --mock-options), so the tool
+runs without model weights.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import socket
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_VIDEO = os.path.join(BACKEND_DIR, '..', 'tests', 'test_video.mp4')
+SUSTAINED_FPS_RATIO = 0.95
+SUSTAINED_MAX_FAILURE_RATE = 0.01
+# --accept choices: the /stream/detect response formats (see detection_format.py)
+ACCEPT_TYPES = {
+    'json': None,
+    'columnar': 'application/vnd.agrovision.columnar+json',
+    'msgpack': 'application/vnd.agrovision.columnar+msgpack'
+}
+
+
+# ============================================================================
+# CLIENTS
+# ============================================================================
+
+class CameraClient(threading.Thread):
+    """One simulated camera: paced frames, one request in flight, per-request records"""
+
+    def __init__(self, index: int, base_url: str, mode: str, frames: List[bytes], fps: float,
+                 stop_at: float, ws_path: str, accept: Optional[str] = None):
+        super().__init__(daemon=True)
+        self.index = index
+        self.base_url = base_url.rstrip('/')
+        self.mode = mode
+        self.frames = frames
+        self.interval = 1.0 / fps
+        self.stop_at = stop_at
+        self.ws_path = ws_path
+        self.accept = accept
+        self.records: List[Dict] = []  # {'latency_ms', 'status', 'bytes'}
+        self.skipped_frames = 0
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    def run(self):
+        send = self._ws_sender() if self.mode == 'ws' else self._http_sender()
+        self.started_at = time.perf_counter()
+        next_due = self.started_at + (self.index % 10) * self.interval / 10  # Stagger client phases
+        i = 0
+        while True:
+            now = time.perf_counter()
+            if now >= self.stop_at:
+                break
+            if now < next_due:
+                time.sleep(next_due - now)
+                continue
+            frame = self.frames[i % len(self.frames)]
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                status, size = send(frame)
+            except Exception as e:
+                status, size = f'error: {type(e).__name__}', 0
+            self.records.append({'latency_ms': (time.perf_counter() - t0) * 1000, 'status': status, 'bytes': size})
+            # Camera frames that came due while this request was in flight are gone
+            after = time.perf_counter()
+            missed = int((after - next_due) / self.interval)
+            self.skipped_frames += missed
+            next_due += (missed + 1) * self.interval
+        self.finished_at = time.perf_counter()
+
+    def _http_sender(self):
+        import requests
+        session = requests.Session()
+        url = self.base_url + '/stream/detect'
+        if self.accept:
+            session.headers['Accept'] = self.accept
+        if self.mode == 'binary':
+            headers = {'Content-Type': 'image/jpeg'}
+            return lambda frame: _status(session.post(url, data=frame, headers=headers, timeout=30))
+        encoded = {id(f): base64.b64encode(f).decode('ascii') for f in self.frames}
+        return lambda frame: _status(session.post(url, json={'frame': encoded[id(frame)]}, timeout=30))
+
+    def _ws_sender(self):
+        try:
+            import websocket  # websocket-client
+        except ImportError:
+            raise SystemExit("ws mode needs the websocket-client package (pip install websocket-client)")
+        ws = websocket.create_connection(self.base_url.replace('http', 'ws', 1) + self.ws_path, timeout=30)
+
+        def send(frame):
+            ws.send_binary(frame)
+            raw = ws.recv()
+            reply = json.loads(raw)
+            if reply.get('success'):
+                return 200, len(raw)
+            return (429 if reply.get('retry_after') else 'dropped' if reply.get('dropped') else 'error'), len(raw)
+        return send
+
+
+def _status(response) -> Tuple[Union[int, str], int]:
+    if response.status_code == 503:
+        try:
+            if response.json().get('dropped'):
+                return 'dropped', len(response.content)
+        except ValueError:
+            pass
+    return response.status_code, len(response.content)
+
+
+class MetricsPoller(threading.Thread):
+    """Samples the server's admission state from /metrics"""
+
+    def __init__(self, base_url: str, interval: float):
+        super().__init__(daemon=True)
+        self.url = base_url.rstrip('/') + '/metrics'
+        self.interval = interval
+        self.samples: List[Dict] = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        import requests
+        while not self.stopped.is_set():
+            try:
+                admission = requests.get(self.url, timeout=5).json()['admission']
+                self.samples.append({'queue_depth': admission['queue_depth'], 'in_flight': admission['in_flight']})
+            except Exception:
+                pass
+            self.stopped.wait(self.interval)
+
+
+# ============================================================================
+# RUN
+# ============================================================================
+
+def load_frames(path: str, count: int, width: int, quality: int) -> List[bytes]:
+    """JPEG-encoded frames from the video, scaled to width like the browser does"""
+    import cv2
+    from generate_test_video import synthetic_frame
+
+    raw = []
+    cap = cv2.VideoCapture(path)
+    while len(raw) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        raw.append(frame)
+    cap.release()
+    if not raw:
+        raw = [synthetic_frame(i) for i in range(count)]
+
+    encoded = []
+    for frame in raw:
+        h, w = frame.shape[:2]
+        frame = cv2.resize(frame, (width, int(h * width / w)))
+        encoded.append(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    return encoded
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 1)
+
+
+def run_step(base_url: str, clients: int, args, frames: List[bytes]) -> Dict:
+    poller = MetricsPoller(base_url, args.metrics_interval)
+    poller.start()
+    stop_at = time.perf_counter() + args.duration
+    workers = [CameraClient(i, base_url, args.mode, frames, args.fps, stop_at, args.ws_path,
+                            ACCEPT_TYPES[args.accept]) for i in range(clients)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    poller.stopped.set()
+
+    records = [r for w in workers for r in w.records]
+    ok = sorted(r['latency_ms'] for r in records if r['status'] == 200)
+    statuses: Dict[str, int] = {}
+    for r in records:
+        statuses[str(r['status'])] = statuses.get(str(r['status']), 0) + 1
+    total = len(records) or 1
+    per_client_fps = [sum(1 for r in w.records if r['status'] == 200) / max(1e-9, w.finished_at - w.started_at)
+                      for w in workers]
+    depths = [s['queue_depth'] for s in poller.samples]
+    rejected = statuses.get('429', 0)
+    failed = total - len(ok) - rejected
+
+    step = {
+        'clients': clients,
+        'requests': len(records),
+        'achieved_fps_per_client': {
+            'mean': round(sum(per_client_fps) / len(per_client_fps), 2),
+            'min': round(min(per_client_fps), 2)
+        },
+        'achieved_fps_total': round(sum(per_client_fps), 2),
+        'skipped_frames': sum(w.skipped_frames for w in workers),
+        'latency_ms': {
+            'p50': _percentile(ok, 0.50),
+            'p90': _percentile(ok, 0.90),
+            'p95': _percentile(ok, 0.95),
+            'p99': _percentile(ok, 0.99),
+            'max': round(ok[-1], 1) if ok else 0.0
+        },
+        'response_bytes_mean': round(sum(r['bytes'] for r in records if r['status'] == 200) / max(1, len(ok))),
+        'status_counts': statuses,
+        'rate_429': round(rejected / total, 4),
+        'error_rate': round(failed / total, 4),
+        'server_queue_depth': {
+            'max': max(depths) if depths else None,
+            'mean': round(sum(depths) / len(depths), 2) if depths else None,
+            'samples': len(depths)
+        }
+    }
+    step['sustained'] = (step['achieved_fps_per_client']['mean'] >= SUSTAINED_FPS_RATIO * args.fps
+                         and (rejected + failed) / total < SUSTAINED_MAX_FAILURE_RATE)
+    return step
+
+
+# ============================================================================
+# LOCAL MOCK SERVER
+# ============================================================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(port: int):
+    """Run app.py on port (internal: loadgen.py _serve; the model comes from the environment)"""
+    import app as app_module
+    app_module.app.run(host='127.0.0.1', port=port, debug=False, use_reloader=False, threaded=True)
+
+
+def start_local_server(mock_options: Dict) -> Tuple[subprocess.Popen, str]:
+    """The API in a subprocess with the registry's mock detector as the active model"""
+    import requests
+    port = _free_port()
+    env = dict(os.environ, ENABLE_MOCK_MODEL='1', ACTIVE_MODEL_ID='mock-detector',
+               MOCK_DETECTOR_OPTIONS=json.dumps(mock_options))
+    proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '_serve', str(port)],
+                            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit("Local mock server exited during startup")
+        try:
+            if requests.get(base_url + '/health', timeout=1).json().get('model_status') == 'ready':
+                return proc, base_url
+        except Exception:
+            pass
+        time.sleep(0.3)
+    proc.terminate()
+    raise SystemExit("Local mock server did not become ready")
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ['_serve']:
+        serve(int(argv[1]))
+        return 0
+
+    parser = argparse.ArgumentParser(description='Concurrent camera-client load generator for /stream/detect')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--local', action='store_true', help='Start a local server with the mock detector')
+    parser.add_argument('--mock-latency-ms', type=float, default=20.0, help='Mock detector time per call')
+    parser.add_argument('--mock-options', default='{}',
+                        help='More MockCost settings as JSON, e.g. \'{"jitter": "lognormal", "cpu_fraction": 0.5}\'')
+    parser.add_argument('--clients', default='4', help='Client count, or a comma-separated sweep (1,2,4,8)')
+    parser.add_argument('--fps', type=float, default=10.0, help='Target frames per second per client')
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds per step')
+    parser.add_argument('--mode', choices=['base64', 'binary', 'ws'], default='base64')
+    parser.add_argument('--ws-path', default='/stream/ws')
+    parser.add_argument('--accept', choices=sorted(ACCEPT_TYPES), default='json',
+                        help='Detection response format requested via Accept (HTTP modes)')
+    parser.add_argument('--video', default=TEST_VIDEO)
+    parser.add_argument('--width', type=int, default=640, help='Frame width sent (height keeps aspect)')
+    parser.add_argument('--quality', type=int, default=70, help='JPEG quality')
+    parser.add_argument('--frames', type=int, default=60, help='Distinct frames cycled through')
+    parser.add_argument('--metrics-interval', type=float, default=0.5)
+    parser.add_argument('--out', help='Write the JSON report here')
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.video, args.frames, args.width, args.quality)
+    server = None
+    mock_options = None
+    base_url = args.url
+    if args.local:
+        mock_options = {'latency_ms': args.mock_latency_ms, 'per_frame_ms': 0.0, **json.loads(args.mock_options)}
+        server, base_url = start_local_server(mock_options)
+        print(f"🧪 Local mock server at {base_url}")
+
+    report = {'created': datetime.now().isoformat(), 'url': base_url, 'mode': args.mode, 'accept': args.accept,
+              'target_fps': args.fps,
+              'duration_s': args.duration, 'frame_bytes_mean': sum(map(len, frames)) // len(frames),
+              'mock_options': mock_options if args.local else None, 'steps': []}
+    try:
+        for clients in [int(c) for c in args.clients.split(',')]:
+            step = run_step(base_url, clients, args, frames)
+            report['steps'].append(step)
+            print(f"{'✅' if step['sustained'] else '❌'} {clients:>4} clients: "
+                  f"{step['achieved_fps_per_client']['mean']:>6} fps/client  "
+                  f"p50 {step['latency_ms']['p50']} ms  p99 {step['latency_ms']['p99']} ms  "
+                  f"429 {step['rate_429']:.1%}  errors {step['error_rate']:.1%}  "
+                  f"{step['response_bytes_mean']} B/resp  "
+                  f"queue max {step['server_queue_depth']['max']}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    sustained = [s['clients'] for s in report['steps'] if s['sustained']]
+    report['max_sustained_clients'] = max(sustained) if sustained else 0
+    print(f"📈 Max sustained clients at {args.fps} fps: {report['max_sustained_clients']}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Report written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
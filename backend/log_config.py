@@ -0,0 +1,202 @@
+"""
+Logging setup: text or JSON lines, a non-blocking queue handler, levels per
+subsystem, and sampling of high-frequency events.
+
+At 100+ frames/s the logging itself shows up in profiles: f-strings are built
+for disabled levels, and every record is formatted and written to stderr on
+the request thread. With this setup:
+
+- Call sites pass %-style arguments (logger.info("... %s", x)). A disabled
+  level then costs one cached level check.
+- Records go onto a bounded queue. A listener thread formats and writes
+  them, so a slow stderr/pipe never stalls a request. When the queue is full,
+  records below ERROR are dropped and counted.
+- LOG_LEVELS turns a subsystem up or down on its own
+  ("app.stream=WARNING,yolo_detector=DEBUG").
+- LOG_SAMPLE keeps 1 in N records below ERROR from a logger, counted per
+  call site ("app.stream=100"). JSON lines carry "sampled": N so counts can
+  be scaled back.
+
+LOG_FORMAT=json writes one object per line, with the request's trace id
+(see tracing.py) and any `extra=` fields.
+"""
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+import tracing
+
+TEXT_FORMAT = '%(asctime)s | %(levelname)s | %(message)s'
+
+# Attributes every LogRecord has; anything else on a record came from extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'trace_id'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, trace_id, extras, exc"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName
+        }
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id:
+            entry['trace_id'] = trace_id
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TraceIdFilter(logging.Filter):
+    """Stamp the current trace id on the record while still on the request's thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = tracing.current_trace_id()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Let through 1 of every `every` records below ERROR, counted per call site.
+
+    Args:
+        every: Sampling ratio (1 passes everything)
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counts: Dict[tuple, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.ERROR or self.every == 1:
+            return True
+        key = (record.pathname, record.lineno)
+        seen = self._counts.get(key, 0)
+        self._counts[key] = seen + 1  # A lost increment under a race only shifts the sample
+        if seen % self.every:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class AsyncHandler(QueueHandler):
+    """
+    QueueHandler whose listener thread does the formatting and writing.
+
+    Unlike the stock QueueHandler it does not format the message on the
+    caller's thread. Arguments are merged when the listener writes the
+    record, so only the traceback (which refers to live frames) is rendered
+    up front. The listener is restarted in a forked child (gunicorn preload),
+    because threads don't survive fork.
+
+    Args:
+        handlers: Handlers the listener writes to
+        max_queue: Records buffered before lower-severity records are dropped
+    """
+
+    def __init__(self, handlers: List[logging.Handler], max_queue: int = 10000):
+        super().__init__(queue.Queue(max_queue))
+        self.handlers = handlers
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._listener: Optional[QueueListener] = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        # A fresh queue: the child must not inherit the parent's backlog or a lock held at fork time
+        self.queue = queue.Queue(self.max_queue)
+        self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self._listener.start()
+        self._pid = os.getpid()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+        try:
+            # Errors wait briefly for room; everything else is dropped rather than blocking the request
+            self.queue.put(record, block=record.levelno >= logging.ERROR, timeout=1.0)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """Flush pending records and stop the listener"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    """'a=1,b=2' -> {'a': '1', 'b': '2'}"""
+    return {k.strip(): v.strip() for k, v in
+            (pair.split('=', 1) for pair in spec.split(',') if '=' in pair)}
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> logging.Handler:
+    """
+    Configure the root logger from the environment.
+
+    LOG_LEVEL sets the default level (INFO). LOG_FORMAT is text or json.
+    LOG_ASYNC=0 writes on the calling thread. LOG_LEVELS and LOG_SAMPLE take
+    "logger=value" pairs, separated by commas.
+
+    Args:
+        level: Overrides LOG_LEVEL
+        fmt: Overrides LOG_FORMAT
+
+    Returns:
+        The handler installed on the root logger
+    """
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    fmt = (fmt or os.environ.get('LOG_FORMAT', 'text')).lower()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JSONFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    if os.environ.get('LOG_ASYNC', '1') not in ('0', 'false', 'False'):
+        handler = AsyncHandler([stream_handler], int(os.environ.get('LOG_QUEUE_SIZE', '10000')))
+        atexit.register(handler.stop)
+    else:
+        handler = stream_handler
+    handler.addFilter(TraceIdFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    for name, value in _parse_pairs(os.environ.get('LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(value.upper())
+    for name, value in _parse_pairs(os.environ.get('LOG_SAMPLE', '')).items():
+        logging.getLogger(name).addFilter(SamplingFilter(int(value)))
+    return handler
@@ -0,0 +1,372 @@
+"""
+MJPEG live preview with server-side detection overlay.
+
+One SourcePipeline per source decodes it through a CaptureSupervisor, runs
+the shared detector and draws the overlay, once per frame. Each requested
+(width, quality) rendition is an MJPEGBroadcaster that resizes and
+JPEG-encodes a new frame once, on behalf of all of its viewers. N viewers
+therefore cost one decode and one inference per frame, plus one encode per
+rendition in use, plus N socket writes. Slow viewers skip frames instead of
+queueing them.
+
+A reaper thread stops a source IDLE_SHUTDOWN_S after its last viewer leaves.
+This includes a live source that never delivers a frame.
+
+Under asgi.py viewers use astream(), which waits for frames on the event
+loop, so a viewer holds a thread only while a new frame is being encoded.
+"""
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import AsyncGenerator, Callable, Dict, Generator, List, Optional, Set, Tuple
+
+import cv2
+
+from capture_supervisor import CaptureSupervisor, is_live_source
+from inference_scheduler import inference_class, FrameExpired, LIVE
+from video_renderer import draw_normalized_detections
+
+logger = logging.getLogger(__name__)
+
+BOUNDARY = 'frame'
+IDLE_SHUTDOWN_S = 10.0  # Stop decoding a source this long after its last viewer leaves
+REAP_INTERVAL_S = 2.0
+# Renditions are snapped to these steps so arbitrary query values can't multiply the encoders
+WIDTH_RANGE = (160, 1920)
+WIDTH_STEP = 32
+QUALITY_RANGE = (10, 95)
+QUALITY_STEP = 5
+
+
+def clamp_rendition(width: int, quality: int) -> Tuple[int, int]:
+    """Snap a requested width (0 keeps the source size) and JPEG quality to the supported set"""
+    if width:
+        width = min(max(int(round(width / WIDTH_STEP)) * WIDTH_STEP, WIDTH_RANGE[0]), WIDTH_RANGE[1])
+    quality = min(max(int(round(quality / QUALITY_STEP)) * QUALITY_STEP, QUALITY_RANGE[0]), QUALITY_RANGE[1])
+    return width, quality
+
+
+class SourcePipeline:
+    """
+    Decode -> detect -> overlay for one source, shared by all renditions.
+
+    Args:
+        source: RTSP/HTTP URL, video file path or camera index
+        detector_provider: Returns the current detector (YOLODetector or MockDetector), or None
+        realtime: Pace file sources to their native fps instead of running flat out
+    """
+
+    def __init__(self, source, detector_provider: Callable[[], object], realtime: bool = True):
+        self.source = source
+        self.detector_provider = detector_provider
+        self.realtime = realtime
+        self.supervisor = CaptureSupervisor(source)
+
+        self.viewers = 0
+        self.frames_processed = 0
+        self.error: Optional[str] = None
+        self.health: Optional[Dict] = None
+        self.running = False
+        self.last_activity = time.time()  # Last viewer join/leave; the reaper measures idleness from here
+
+        self._frame = None  # Latest annotated frame (BGR)
+        self._seq = 0
+        self._detections: List[Dict] = []
+        self._cond = threading.Condition()
+        self._loop_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name=f"mjpeg-{self.source}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Ask the pipeline to end; also interrupts a reconnect backoff"""
+        self._stop.set()
+        self.supervisor.stop()
+
+    def _detect(self, frame) -> List[Dict]:
+        """Detections as normalized boxes; a frame the scheduler expired keeps the previous overlay"""
+        detector = self.detector_provider()
+        if detector is None:
+            return []
+        try:
+            with inference_class(LIVE):
+                result = detector.predict_frame(frame)
+        except FrameExpired:
+            return self._detections
+        h, w = frame.shape[:2]
+        self._detections = [{
+            'class': det['class_name'],
+            'conf': round(det['confidence'] * 100, 1),
+            'x1': det['x1'] / w, 'y1': det['y1'] / h, 'x2': det['x2'] / w, 'y2': det['y2'] / h
+        } for det in result.get('detections', [])]
+        return self._detections
+
+    def _run(self):
+        logger.info(f"📡 MJPEG source started: {self.source}")
+        frame_interval = 0.0
+        try:
+            if self.realtime and not is_live_source(self.source):
+                cap = cv2.VideoCapture(self.source)
+                fps = cap.get(cv2.CAP_PROP_FPS) or 0
+                cap.release()
+                frame_interval = 1.0 / fps if fps > 0 else 0.0
+
+            next_due = time.perf_counter()
+            for frame, health in self.supervisor.frames():
+                if self._stop.is_set():
+                    break
+                self.health = health
+                annotated = draw_normalized_detections(frame, self._detect(frame))
+
+                with self._cond:
+                    self._frame = annotated
+                    self._seq += 1
+                    self.frames_processed += 1
+                    self._notify()
+
+                if frame_interval:
+                    next_due += frame_interval
+                    delay = next_due - time.perf_counter()
+                    if delay > 0:
+                        self._stop.wait(delay)
+                    else:
+                        next_due = time.perf_counter()
+            if self.supervisor.state == 'failed':
+                self.error = self.supervisor.last_error
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"❌ MJPEG source failed for {self.source}: {e}")
+        finally:
+            with self._cond:
+                self.running = False
+                self._notify()
+            logger.info(f"📴 MJPEG source stopped: {self.source} ({self.frames_processed} frames)")
+
+    def _notify(self):
+        """Wake thread and event-loop waiters (called with _cond held)"""
+        self._cond.notify_all()
+        for loop, event in self._loop_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+    def add_viewer(self):
+        with self._cond:
+            self.viewers += 1
+            self.last_activity = time.time()
+
+    def remove_viewer(self):
+        with self._cond:
+            self.viewers -= 1
+            self.last_activity = time.time()
+
+    def wait_frame(self, last_seq: int, timeout: float):
+        """
+        The next annotated frame after last_seq.
+
+        Returns:
+            (frame, seq), or None when the source stalled for timeout or stopped
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq != last_seq or not self.running, timeout):
+                return None
+            if self._seq == last_seq:
+                return None
+            return self._frame, self._seq
+
+    async def next_frame(self, last_seq: int, timeout: float):
+        """wait_frame() for event-loop callers: waits on the loop instead of blocking a thread"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        deadline = loop.time() + timeout
+        with self._cond:
+            self._loop_waiters.add((loop, event))
+        try:
+            while True:
+                event.clear()  # Before the check: a frame published after it sets the event again
+                with self._cond:
+                    if self._seq != last_seq:
+                        return self._frame, self._seq
+                    if not self.running:
+                        return None
+                try:
+                    await asyncio.wait_for(event.wait(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    return None
+        finally:
+            with self._cond:
+                self._loop_waiters.discard((loop, event))
+
+    def idle_for(self) -> float:
+        """Seconds without viewers (0 while anyone is watching)"""
+        return 0.0 if self.viewers else time.time() - self.last_activity
+
+    def stats(self) -> Dict:
+        return {
+            'source': str(self.source),
+            'viewers': self.viewers,
+            'frames_processed': self.frames_processed,
+            'running': self.running,
+            'health': self.health,
+            'error': self.error
+        }
+
+
+class MJPEGBroadcaster:
+    """
+    One (width, quality) rendition of a SourcePipeline.
+
+    The first viewer to ask for a new frame encodes it; the others reuse those bytes.
+
+    Args:
+        pipeline: Shared SourcePipeline
+        width: Output width in pixels (height keeps the aspect ratio); 0 keeps the source size
+        quality: JPEG quality
+    """
+
+    def __init__(self, pipeline: SourcePipeline, width: int = 640, quality: int = 70):
+        self.pipeline = pipeline
+        self.width = width
+        self.quality = quality
+        self.viewers = 0
+        self.frames_encoded = 0
+        self._jpeg: Optional[bytes] = None
+        self._jpeg_seq = 0
+        self._lock = threading.Lock()
+
+    def _encode(self, frame) -> bytes:
+        if self.width and frame.shape[1] != self.width:
+            height = int(frame.shape[0] * self.width / frame.shape[1])
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise RuntimeError('JPEG encoding failed')
+        return buf.tobytes()
+
+    def encoded(self, frame, seq: int) -> bytes:
+        """JPEG bytes of pipeline frame `seq`, encoded at most once"""
+        with self._lock:
+            if self._jpeg_seq != seq:
+                self._jpeg = self._encode(frame)
+                self._jpeg_seq = seq
+                self.frames_encoded += 1
+            return self._jpeg
+
+    @staticmethod
+    def part(jpeg: bytes) -> bytes:
+        """One multipart/x-mixed-replace part"""
+        return (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode('ascii')
+                + jpeg + b"\r\n")
+
+    def stream(self, timeout: float = 10.0) -> Generator[bytes, None, None]:
+        """Viewer generator yielding multipart parts (latest frame only)"""
+        self.pipeline.add_viewer()
+        self.viewers += 1
+        last_seq = 0
+        try:
+            while True:
+                latest = self.pipeline.wait_frame(last_seq, timeout)
+                if latest is None:
+                    break  # Source stalled or stopped
+                frame, last_seq = latest
+                yield self.part(self.encoded(frame, last_seq))
+        finally:
+            self.viewers -= 1
+            self.pipeline.remove_viewer()
+
+    async def astream(self, timeout: float = 10.0) -> AsyncGenerator[bytes, None]:
+        """stream() for the ASGI event loop; only the JPEG encode runs on a thread"""
+        loop = asyncio.get_running_loop()
+        self.pipeline.add_viewer()
+        self.viewers += 1
+        last_seq = 0
+        try:
+            while True:
+                latest = await self.pipeline.next_frame(last_seq, timeout)
+                if latest is None:
+                    break
+                frame, last_seq = latest
+                if self._jpeg_seq == last_seq:
+                    jpeg = self._jpeg  # Another viewer already encoded it
+                else:
+                    jpeg = await loop.run_in_executor(None, self.encoded, frame, last_seq)
+                yield self.part(jpeg)
+        finally:
+            self.viewers -= 1
+            self.pipeline.remove_viewer()
+
+    def stats(self) -> Dict:
+        return {'width': self.width, 'quality': self.quality, 'viewers': self.viewers,
+                'frames_encoded': self.frames_encoded}
+
+
+class MJPEGHub:
+    """
+    Keeps one SourcePipeline per source and one MJPEGBroadcaster per rendition.
+
+    Args:
+        detector_provider: Returns the current detector, or None while it loads
+    """
+
+    def __init__(self, detector_provider: Callable[[], object]):
+        self.detector_provider = detector_provider
+        self._pipelines: Dict[str, SourcePipeline] = {}
+        self._renditions: Dict[Tuple, MJPEGBroadcaster] = {}
+        self._lock = threading.Lock()
+        self._reaper_pid = None
+
+    def get(self, source, width: int = 640, quality: int = 70) -> MJPEGBroadcaster:
+        width, quality = clamp_rendition(width, quality)
+        key = str(source)
+        with self._lock:
+            self._ensure_reaper()
+            pipeline = self._pipelines.get(key)
+            if pipeline is None or not pipeline.running:
+                pipeline = SourcePipeline(source, self.detector_provider)
+                pipeline.start()
+                self._pipelines[key] = pipeline
+                self._renditions = {k: r for k, r in self._renditions.items() if k[0] != key}
+            # Counts as activity, so the reaper can't stop it before the viewer registers
+            pipeline.last_activity = time.time()
+            rendition = self._renditions.get((key, width, quality))
+            if rendition is None:
+                rendition = self._renditions[(key, width, quality)] = MJPEGBroadcaster(pipeline, width, quality)
+            return rendition
+
+    def _ensure_reaper(self):
+        # Threads don't survive a fork; start one per serving process
+        if self._reaper_pid != os.getpid():
+            threading.Thread(target=self._reap_loop, name='mjpeg-reaper', daemon=True).start()
+            self._reaper_pid = os.getpid()
+
+    def reap(self) -> int:
+        """Stop and forget sources idle for IDLE_SHUTDOWN_S (or already ended); returns how many"""
+        with self._lock:
+            idle = [key for key, p in self._pipelines.items()
+                    if p.idle_for() > IDLE_SHUTDOWN_S or (not p.running and not p.viewers)]
+            for key in idle:
+                self._pipelines.pop(key).stop()
+            self._renditions = {k: r for k, r in self._renditions.items() if k[0] in self._pipelines}
+        for key in idle:
+            logger.info(f"💤 MJPEG source idle, stopping: {key}")
+        return len(idle)
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(REAP_INTERVAL_S)
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"❌ MJPEG reaper failed: {e}")
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [{**p.stats(), 'renditions': [r.stats() for k, r in self._renditions.items() if k[0] == key]}
+                    for key, p in self._pipelines.items()]
@@ -0,0 +1,194 @@
+"""
+Deterministic, cost-configurable stand-in for YOLODetector.
+
+Registered in ModelRegistry as type 'mock' (model id 'mock-detector', enabled
+with ENABLE_MOCK_MODEL=1), so load tests and CI exercise the real routes,
+admission control, scheduling and streaming on machines without weights or
+torch.
+
+Boxes are derived from the image content (a CRC of a subsampled copy seeds
+the generator), so the same frame always yields the same detections, in the
+same formats that predict() and predict_frame() return. MockCost models
+how long a call takes: a per-call base plus a per-frame increment,
+multiplied by seeded jitter. A configurable share of that time burns CPU in
+256x256 BLAS matmuls. numpy drops the GIL inside each matmul, and each one
+is long enough (~1 ms) that the Python loop between them holds it only
+briefly, so other threads keep running much as they do beside torch
+kernels. The rest of the time sleeps like a GPU wait. Batches larger than max_batch are split, as a real
+model with a fixed batch limit would.
+"""
+import time
+import zlib
+import random
+import logging
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass, asdict, fields
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+MOCK_CLASSES = ['Aphid', 'Black Rust', 'Blast', 'Brown Rust', 'Leaf Blight', 'Mildew', 'Septoria', 'Yellow Rust']
+# Big enough that time inside BLAS (GIL released) dwarfs the loop overhead (GIL held)
+_BURN = np.ones((256, 256), dtype=np.float32)
+
+
+@dataclass
+class MockCost:
+    """
+    Time a mock forward pass takes.
+
+    Args:
+        latency_ms: Per-call base time (median with jitter)
+        per_frame_ms: Added per frame in the call, so batching amortises latency_ms
+        jitter: 'none', 'normal' (sd = jitter_sigma x time) or 'lognormal' (sigma of log time)
+        jitter_sigma: Spread of the jitter
+        cpu_fraction: Share of the time spent burning CPU (0 = pure sleep, 1 = all compute)
+        max_batch: Larger batches run as several calls
+        max_boxes: Upper bound of detections per frame
+        seed: Seed of the jitter sequence (boxes are always seeded from the frame)
+    """
+    latency_ms: float = 20.0
+    per_frame_ms: float = 5.0
+    jitter: str = 'none'
+    jitter_sigma: float = 0.2
+    cpu_fraction: float = 0.0
+    max_batch: int = 16
+    max_boxes: int = 3
+    seed: int = 0
+
+    @classmethod
+    def from_options(cls, options: Optional[Dict]) -> "MockCost":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in (options or {}).items() if k in known})
+
+    def duration_s(self, frames: int, rng: random.Random) -> float:
+        base = (self.latency_ms + self.per_frame_ms * frames) / 1000
+        if self.jitter == 'normal':
+            return max(0.0, rng.gauss(base, base * self.jitter_sigma))
+        if self.jitter == 'lognormal':
+            return base * rng.lognormvariate(0.0, self.jitter_sigma)
+        return base
+
+
+def _burn_cpu(seconds: float):
+    out = np.empty_like(_BURN)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        np.matmul(_BURN, _BURN, out=out)
+
+
+class MockDetector:
+    """
+    Args:
+        conf_threshold: Boxes below this confidence are dropped, as with the real model
+        cost: Timing model (MockCost() defaults when None)
+        scheduler: Optional InferenceScheduler, as for YOLODetector
+    """
+
+    def __init__(self, conf_threshold: float = 0.25, cost: Optional[MockCost] = None, scheduler=None):
+        self.conf_threshold = conf_threshold
+        self.cost = cost or MockCost()
+        self.scheduler = scheduler
+        self.model = None
+        self.model_path = 'mock'
+        self.device = 'cpu'
+        self.cache_status = 'disabled'
+        self.timings: Dict[str, float] = {}
+        self.calls = 0
+        self.frames_processed = 0
+        self._rng = random.Random(self.cost.seed)
+        self._rng_lock = threading.Lock()
+        logger.info(f"🧪 Mock detector ready ({self.cost.latency_ms} ms + {self.cost.per_frame_ms} ms/frame, "
+                    f"jitter {self.cost.jitter}, cpu {self.cost.cpu_fraction:.0%})")
+
+    @staticmethod
+    def _seed(frame: np.ndarray) -> int:
+        return zlib.crc32(np.ascontiguousarray(frame[::8, ::8]).tobytes())
+
+    def _detect(self, frame: np.ndarray, conf: float) -> List[Dict]:
+        h, w = frame.shape[:2]
+        rng = np.random.default_rng(self._seed(frame))
+        detections = []
+        for _ in range(int(rng.integers(0, self.cost.max_boxes + 1))):
+            class_id = int(rng.integers(0, len(MOCK_CLASSES)))
+            confidence = round(float(rng.uniform(0.2, 0.95)), 3)
+            bw, bh = int(w * rng.uniform(0.1, 0.4)), int(h * rng.uniform(0.1, 0.4))
+            x1, y1 = int(rng.integers(0, max(1, w - bw))), int(rng.integers(0, max(1, h - bh)))
+            if confidence < conf:
+                continue
+            detections.append({
+                'class_id': class_id,
+                'class_name': MOCK_CLASSES[class_id],
+                'confidence': confidence,
+                'x1': x1,
+                'y1': y1,
+                'x2': x1 + bw,
+                'y2': y1 + bh,
+                'width': bw,
+                'height': bh,
+                'center_x': x1 + bw // 2,
+                'center_y': y1 + bh // 2
+            })
+        detections.sort(key=lambda d: d['confidence'], reverse=True)
+        return detections
+
+    def _infer(self, frames: List[np.ndarray], conf: float) -> List[List[Dict]]:
+        results = []
+        for start in range(0, len(frames), max(1, self.cost.max_batch)):
+            chunk = frames[start:start + max(1, self.cost.max_batch)]
+            with self._rng_lock:
+                duration = self.cost.duration_s(len(chunk), self._rng)
+                self.calls += 1
+                self.frames_processed += len(chunk)
+            with self.scheduler.slot() if self.scheduler is not None else nullcontext():
+                with tracing.span('mock.forward', frames=len(chunk)):
+                    _burn_cpu(duration * self.cost.cpu_fraction)
+                    time.sleep(duration * (1 - self.cost.cpu_fraction))
+                    results.extend(self._detect(frame, conf) for frame in chunk)
+        return results
+
+    def predict(self, image_path: str, conf_threshold: Optional[float] = None, profile=None) -> Dict:
+        """Same result format as YOLODetector.predict"""
+        from yolo_detector import YOLODetector
+        img = cv2.imread(image_path)
+        if img is None:
+            raise ValueError(f"Cannot read image: {image_path}")
+        h, w = img.shape[:2]
+        conf = conf_threshold or (profile and profile.conf) or self.conf_threshold
+        detections = YOLODetector._to_image_detections(self._infer([img], conf)[0], h, w)
+        return {
+            'image_path': str(image_path),
+            'image_shape': [h, w],
+            'detections': detections,
+            'detection_count': len(detections)
+        }
+
+    def predict_frame(self, frame: np.ndarray, conf_threshold: Optional[float] = None, profile=None) -> Dict:
+        conf = conf_threshold or (profile and profile.conf) or self.conf_threshold
+        return {'frame_shape': list(frame.shape[:2]), 'detections': self._infer([frame], conf)[0]}
+
+    def predict_frames(self, frames: List[np.ndarray], conf_threshold: Optional[float] = None,
+                       profile=None) -> List[Dict]:
+        if not frames:
+            return []
+        conf = conf_threshold or (profile and profile.conf) or self.conf_threshold
+        return [{'frame_shape': list(frame.shape[:2]), 'detections': detections}
+                for frame, detections in zip(frames, self._infer(list(frames), conf))]
+
+    def warmup(self):
+        pass
+
+    def set_device(self, device: str):
+        pass
+
+    def get_model_info(self) -> Dict:
+        return {'model_path': 'mock', 'device': 'cpu', 'model_name': 'MockDetector',
+                'num_classes': len(MOCK_CLASSES), 'class_names': list(MOCK_CLASSES),
+                'task': 'detect', 'cost': asdict(self.cost),
+                'calls': self.calls, 'frames_processed': self.frames_processed}
@@ -0,0 +1,200 @@
+"""
+Prepared-model cache for fast warm starts.
+
+The first start after a model changes pays for loading the training
+checkpoint, fusing Conv+BN and (optionally) exporting; later starts load the
+prepared artifact directly. Artifacts are keyed by the SHA-256 of the source
+weights, the device and the artifact format, so swapping the .pt file or
+moving to another GPU/CPU never serves a stale graph.
+
+Formats (MODEL_CACHE_FORMAT):
+    fused        Ultralytics checkpoint holding the already-fused model with
+                 training state (optimizer, EMA) stripped. Any imgsz works.
+    torchscript  Exported graphs (also onnx, openvino, engine). They load
+                 without the model's Python code, but are pinned to the
+                 export imgsz, so they only suit single-profile deployments.
+
+Source hashes are memoised by (path, size, mtime) so a warm start does not
+re-read hundreds of MB of weights.
+"""
+import os
+import copy
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = 'model_cache'
+EXPORT_FORMATS = {'torchscript': '.torchscript', 'onnx': '.onnx', 'openvino': '_openvino_model', 'engine': '.engine'}
+INDEX_FILE = 'index.json'
+
+
+class ModelCache:
+    """
+    Args:
+        cache_dir: Directory holding prepared artifacts and the hash index
+        artifact_format: 'fused' or an Ultralytics export format (see module docstring)
+        keep: Artifacts kept per source model; older ones are pruned on store
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, artifact_format: Optional[str] = None, keep: int = 2):
+        self.cache_dir = cache_dir or os.environ.get('MODEL_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.format = (artifact_format or os.environ.get('MODEL_CACHE_FORMAT', 'fused')).lower()
+        if self.format != 'fused' and self.format not in EXPORT_FORMATS:
+            logger.warning(f"⚠️  Unknown MODEL_CACHE_FORMAT '{self.format}', using 'fused'")
+            self.format = 'fused'
+        self.keep = keep
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    def _load_index(self) -> Dict:
+        try:
+            with open(os.path.join(self.cache_dir, INDEX_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index: Dict):
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, path)
+
+    def source_hash(self, model_path: str) -> str:
+        """SHA-256 of the weights file, memoised by (path, size, mtime)"""
+        st = os.stat(model_path)
+        memo_key = f"{os.path.abspath(model_path)}|{st.st_size}|{st.st_mtime_ns}"
+        with self._lock:
+            index = self._load_index()
+            digest = index.get('hashes', {}).get(memo_key)
+            if digest:
+                return digest
+
+            sha = hashlib.sha256()
+            with open(model_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            # Drop memo entries for older versions of the same file
+            prefix = os.path.abspath(model_path) + '|'
+            hashes = {k: v for k, v in index.get('hashes', {}).items() if not k.startswith(prefix)}
+            hashes[memo_key] = digest
+            index['hashes'] = hashes
+            self._save_index(index)
+            return digest
+
+    def artifact_key(self, model_path: str, device: str, imgsz: int = 640) -> str:
+        device = 'cpu' if str(device) == 'cpu' else f"cuda{str(device).replace('cuda', '').strip(':') or '0'}"
+        key = f"{self.source_hash(model_path)[:16]}-{device}-{self.format}"
+        return key if self.format == 'fused' else f"{key}-{imgsz}"
+
+    def artifact_path(self, key: str) -> str:
+        suffix = '.pt' if self.format == 'fused' else EXPORT_FORMATS[self.format]
+        return os.path.join(self.cache_dir, key + suffix)
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def lookup(self, model_path: str, device: str, imgsz: int = 640) -> Optional[str]:
+        """Path of a prepared artifact for this model/device, or None on a miss"""
+        if not os.path.isfile(model_path):
+            return None  # Auto-download names (e.g. yolo11n.pt) are not cached
+        path = self.artifact_path(self.artifact_key(model_path, device, imgsz))
+        if os.path.exists(path):
+            os.utime(path)  # Keeps recently used artifacts out of prune()
+            return path
+        return None
+
+    def store(self, yolo, model_path: str, device: str, imgsz: int = 640) -> Optional[str]:
+        """
+        Prepare and save an artifact from a loaded (and warmed-up) Ultralytics model.
+
+        Returns:
+            Artifact path, or None if preparation failed. The live model is never modified,
+            so this may run while it serves requests.
+        """
+        if not os.path.isfile(model_path):
+            return None
+        key = self.artifact_key(model_path, device, imgsz)
+        path = self.artifact_path(key)
+        started = time.perf_counter()
+        try:
+            if self.format == 'fused':
+                self._store_fused(yolo, path)
+            else:
+                exported = yolo.export(format=self.format, imgsz=imgsz, device=device, verbose=False)
+                if os.path.exists(path):
+                    shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+                shutil.move(str(exported), path)
+
+            with open(os.path.join(self.cache_dir, key + '.json'), 'w') as f:
+                json.dump({
+                    'source': os.path.abspath(model_path),
+                    'device': str(device),
+                    'format': self.format,
+                    'imgsz': imgsz,
+                    'created_at': time.time(),
+                    'prepare_s': round(time.perf_counter() - started, 2)
+                }, f, indent=2)
+            logger.info(f"💾 Prepared model cached: {path} ({time.perf_counter() - started:.1f}s)")
+            self.prune(model_path)
+            return path
+        except Exception as e:
+            logger.warning(f"⚠️  Could not cache prepared model ({self.format}): {e}")
+            return None
+
+    @staticmethod
+    def _store_fused(yolo, path: str):
+        import torch
+
+        # A copy, as Ultralytics' exporter does: fuse() replaces modules and forward() in place,
+        # and request threads may already be predicting with the live model
+        model = copy.deepcopy(yolo.model)
+        if hasattr(model, 'is_fused') and not model.is_fused():
+            model.fuse(verbose=False)
+        # Same layout Ultralytics writes, minus optimizer/EMA, so YOLO(path) loads it as-is
+        ckpt = {
+            'model': model,
+            'train_args': (getattr(yolo, 'ckpt', None) or {}).get('train_args', {}),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'prepared': True
+        }
+        tmp = path + '.tmp'
+        torch.save(ckpt, tmp)
+        os.replace(tmp, path)
+
+    def prune(self, model_path: str):
+        """Keep only the newest `keep` artifacts built from this source file"""
+        source = os.path.abspath(model_path)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json') or name == INDEX_FILE:
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, name), 'r') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if meta.get('source') == source:
+                key = name[:-len('.json')]
+                artifact = next((os.path.join(self.cache_dir, n) for n in os.listdir(self.cache_dir)
+                                 if n.startswith(key) and not n.endswith('.json')), None)
+                mtime = os.path.getmtime(artifact) if artifact else 0
+                entries.append((mtime, key, artifact))
+
+        for _, key, artifact in sorted(entries, reverse=True)[self.keep:]:
+            if artifact:
+                shutil.rmtree(artifact, ignore_errors=True) if os.path.isdir(artifact) else os.remove(artifact)
+            os.remove(os.path.join(self.cache_dir, key + '.json'))
+            logger.info(f"🧹 Pruned prepared model: {key}")
@@ -1,25 +1,88 @@
 import os
 import json
 import logging
-from typing import Dict, List, Optional
-from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+from dataclasses import dataclass, asdict, field, fields, replace
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class InferenceProfile:
+    """
+    Named inference settings (resolution, NMS and precision) for a model.
+    
+    With tile=True the frame is scanned at imgsz effective resolution as
+    overlapping tile_size windows, each run at tile_size, and the boxes merged.
+    """
+    name: str
+    imgsz: int = 640
+    iou: float = 0.7
+    max_det: int = 300
+    half: bool = False
+    conf: Optional[float] = None  # None keeps the detector's threshold
+    classes: Optional[List[int]] = None  # Class ids to keep (None = all)
+    tile: bool = False
+    tile_size: int = 640
+    tile_overlap: float = 0.2
+    description: str = ""
+
+    def __post_init__(self):
+        # Model inputs must be multiples of the YOLO stride
+        self.imgsz = max(32, int(self.imgsz) // 32 * 32)
+        self.tile_size = max(32, int(self.tile_size) // 32 * 32)
+
+
+def default_profiles() -> Dict[str, InferenceProfile]:
+    return {p.name: p for p in [
+        InferenceProfile(
+            name="fast-scan",
+            imgsz=320,
+            max_det=100,
+            half=True,
+            description="Low-res live scouting: cheapest per frame, misses small lesions"
+        ),
+        InferenceProfile(
+            name="default",
+            imgsz=640,
+            description="Model's native resolution"
+        ),
+        InferenceProfile(
+            name="survey",
+            imgsz=1280,
+            tile=True,
+            tile_size=640,
+            description="Full-resolution lab uploads: 640px tiles over a 1280px scan"
+        )
+    ]}
+
+
 @dataclass
 class ModelInfo:
     id: str
     name: str
     version: str
-    type: str  # 'yolo' or 'fallback' (keras/tflite)
+    type: str  # 'yolo', 'fallback' (keras/tflite) or 'mock' (load testing)
     path: str
     description: str
     enabled: bool = True
+    profiles: Dict[str, InferenceProfile] = field(default_factory=default_profiles)
+    default_profile: str = "default"
+    options: Dict[str, Any] = field(default_factory=dict)  # Backend settings (mock: MockCost fields)
+
+MOCK_MODEL_ID = "mock-detector"
 
 class ModelRegistry:
     """
     Manages available AI models and their configuration.
     Persists active model selection to 'models.json'.
+    
+    Inference profiles can be overridden or added per model in the same file:
+        {"profiles": {"auraa-fs-2.1": {"fast-scan": {"imgsz": 416}}}}
+    and backend options likewise:
+        {"options": {"mock-detector": {"latency_ms": 40, "jitter": "lognormal"}}}
+    
+    The mock detector is hidden unless ENABLE_MOCK_MODEL=1. ACTIVE_MODEL_ID
+    selects the active model for this process without touching models.json.
     """
     
     CONFIG_FILE = 'models.json'
@@ -41,12 +104,36 @@ class ModelRegistry:
             type="fallback",
             path=os.path.join("backend", "model", "model_new.tflite"),
             description="Legacy TensorFlow Lite model. Lower accuracy but works as a stable backup."
+        ),
+        ModelInfo(
+            id=MOCK_MODEL_ID,
+            name="Mock Detector (load testing)",
+            version="1.0",
+            type="mock",
+            path="",
+            description="Deterministic boxes with configurable latency and CPU cost. No weights needed.",
+            enabled=False
         )
     ]
 
     def __init__(self):
-        self.models: Dict[str, ModelInfo] = {m.id: m for m in self.DEFAULT_MODELS}
+        # Per-instance profile dicts so config overrides never leak into DEFAULT_MODELS
+        self.models: Dict[str, ModelInfo] = {
+            m.id: replace(m, profiles=dict(m.profiles), options=dict(m.options)) for m in self.DEFAULT_MODELS
+        }
+        if os.environ.get('ENABLE_MOCK_MODEL') == '1':
+            self.models[MOCK_MODEL_ID].enabled = True
         self.active_model_id = self._load_config()
+        override = os.environ.get('ACTIVE_MODEL_ID')
+        if override:
+            if self._is_available(override):
+                logger.info(f"👉 Active model from ACTIVE_MODEL_ID: {override}")
+                self.active_model_id = override
+            else:
+                logger.warning(f"⚠️ ACTIVE_MODEL_ID={override} is unknown or disabled; keeping {self.active_model_id}")
+
+    def _is_available(self, model_id: str) -> bool:
+        return model_id in self.models and self.models[model_id].enabled
 
     def _load_config(self) -> str:
         """Load active model ID from config file, or default to best model"""
@@ -54,8 +141,10 @@ class ModelRegistry:
             if os.path.exists(self.CONFIG_FILE):
                 with open(self.CONFIG_FILE, 'r') as f:
                     config = json.load(f)
+                    self._apply_profile_overrides(config.get('profiles', {}))
+                    self._apply_option_overrides(config.get('options', {}))
                     saved_id = config.get('active_model_id')
-                    if saved_id in self.models:
+                    if self._is_available(saved_id):
                         logger.info(f"📖 Loaded active model from config: {saved_id}")
                         return saved_id
         except Exception as e:
@@ -66,11 +155,40 @@ class ModelRegistry:
         logger.info(f"👉 Using default model: {default_id}")
         return default_id
 
+    def _apply_profile_overrides(self, overrides: Dict):
+        """Merge per-model profile settings from models.json over the built-in profiles"""
+        self._profile_overrides = overrides
+        known = {f.name for f in fields(InferenceProfile)}
+        for model_id, profiles in overrides.items():
+            model = self.models.get(model_id)
+            if not model:
+                logger.warning(f"⚠️ Profile overrides for unknown model: {model_id}")
+                continue
+            for name, settings in profiles.items():
+                base = asdict(model.profiles[name]) if name in model.profiles else {}
+                base.update({k: v for k, v in settings.items() if k in known})
+                base['name'] = name
+                model.profiles[name] = InferenceProfile(**base)
+
+    def _apply_option_overrides(self, overrides: Dict):
+        """Merge per-model backend options from models.json over the built-in ones"""
+        self._option_overrides = overrides
+        for model_id, options in overrides.items():
+            if model_id in self.models:
+                self.models[model_id].options.update(options)
+            else:
+                logger.warning(f"⚠️ Options for unknown model: {model_id}")
+
     def _save_config(self):
         """Save active model ID to config file"""
         try:
+            config = {'active_model_id': self.active_model_id}
+            if getattr(self, '_profile_overrides', None):
+                config['profiles'] = self._profile_overrides
+            if getattr(self, '_option_overrides', None):
+                config['options'] = self._option_overrides
             with open(self.CONFIG_FILE, 'w') as f:
-                json.dump({'active_model_id': self.active_model_id}, f, indent=4)
+                json.dump(config, f, indent=4)
             logger.info(f"💾 Saved active model config: {self.active_model_id}")
         except Exception as e:
             logger.error(f"❌ Failed to save model config: {e}")
@@ -79,7 +197,7 @@ class ModelRegistry:
         """Return list of all models with 'active' flag"""
         return [
             {**asdict(m), "active": m.id == self.active_model_id}
-            for m in self.models.values()
+            for m in self.models.values() if m.enabled
         ]
 
     def get_active_model(self) -> Optional[ModelInfo]:
@@ -88,7 +206,7 @@ class ModelRegistry:
 
     def set_active_model(self, model_id: str) -> bool:
         """Set the active model by ID"""
-        if model_id not in self.models:
+        if not self._is_available(model_id):
             logger.error(f"❌ Model ID not found: {model_id}")
             return False
         
@@ -98,3 +216,16 @@ class ModelRegistry:
 
     def get_model(self, model_id: str) -> Optional[ModelInfo]:
         return self.models.get(model_id)
+
+    def get_profile(self, name: Optional[str] = None, model_id: Optional[str] = None) -> Optional[InferenceProfile]:
+        """
+        Resolve an inference profile of a model (the active one by default).
+        
+        Returns:
+            The named profile, the model's default profile when name is empty,
+            or None if the model or profile does not exist
+        """
+        model = self.models.get(model_id or self.active_model_id)
+        if not model:
+            return None
+        return model.profiles.get(name or model.default_profile)
@@ -0,0 +1,82 @@
+"""
+Per-process memory accounting for multi-worker deployments.
+
+RSS counts every page a process maps, so N pre-forked workers sharing one
+copy of the weights each report the full model size. PSS divides shared
+pages by the number of processes sharing them, so summing PSS over the
+master and its workers gives the real footprint of the deployment.
+
+Usage (Linux):
+    python process_memory.py <gunicorn master pid>
+"""
+import os
+import sys
+import resource
+from typing import Dict, List, Optional
+
+SMAPS_FIELDS = {
+    'Rss': 'rss_mb',
+    'Pss': 'pss_mb',
+    'Shared_Clean': 'shared_clean_mb',
+    'Shared_Dirty': 'shared_dirty_mb',
+    'Private_Clean': 'private_clean_mb',
+    'Private_Dirty': 'private_dirty_mb'
+}
+
+
+def process_memory(pid: Optional[int] = None) -> Dict:
+    """
+    Memory of one process in MB from /proc/<pid>/smaps_rollup.
+
+    Falls back to peak RSS from getrusage (own process only) where smaps_rollup
+    is unavailable (non-Linux, old kernels).
+    """
+    pid = pid or os.getpid()
+    stats: Dict = {'pid': pid}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in SMAPS_FIELDS:
+                    stats[SMAPS_FIELDS[key]] = round(int(rest.split()[0]) / 1024, 1)
+    except OSError:
+        if pid == os.getpid():
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is KB on Linux, bytes on macOS
+            stats['peak_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return stats
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of pid (gunicorn workers of a master)"""
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children', 'r') as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def deployment_memory(master_pid: int) -> Dict:
+    """Master + per-worker memory and the summed PSS of the whole deployment"""
+    master = process_memory(master_pid)
+    workers = [process_memory(pid) for pid in child_pids(master_pid)]
+    return {
+        'master': master,
+        'workers': workers,
+        'total_pss_mb': round(sum(p.get('pss_mb', 0) for p in [master, *workers]), 1)
+    }
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+
+    report = deployment_memory(int(sys.argv[1]))
+    print(f"{'role':<8} {'pid':>7} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11}")
+    for role, proc in [('master', report['master'])] + [('worker', w) for w in report['workers']]:
+        shared = proc.get('shared_clean_mb', 0) + proc.get('shared_dirty_mb', 0)
+        private = proc.get('private_clean_mb', 0) + proc.get('private_dirty_mb', 0)
+        print(f"{role:<8} {proc['pid']:>7} {proc.get('rss_mb', 0):>9} {proc.get('pss_mb', 0):>9} "
+              f"{round(shared, 1):>10} {round(private, 1):>11}")
+    print(f"Total PSS: {report['total_pss_mb']} MB across {len(report['workers'])} workers")
@@ -0,0 +1,232 @@
+"""
+On-demand profiling of a running process (admin endpoints in app.py).
+
+Three tools, all off until an operator asks for them:
+
+- Sampling: every interval, the profiler records the stack of each thread
+  for N seconds. The output is in collapsed-stack format ("a;b;c count"), which
+  flamegraph.pl, speedscope and inferno read.
+- cProfile of the next K requests (optionally one endpoint only). The
+  results come as pstats text, or as a pstats dump for snakeviz or flameprof.
+- tracemalloc: snapshots diffed against the previous one, plus memory still
+  held after each request, per endpoint, to find where allocations grow.
+
+Everything requires PROFILING_TOKEN. Without it the endpoints don't exist.
+When no tool is armed, the only cost per request is one attribute check
+(Profiler.active).
+"""
+import io
+import os
+import sys
+import time
+import hmac
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_SAMPLE_SECONDS = 60
+MIN_SAMPLE_INTERVAL_S = 0.001
+
+
+class RequestProfile:
+    """Per-request handle returned by request_started()"""
+    __slots__ = ('endpoint', 'profile', 'traced_before')
+
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.profile: Optional[cProfile.Profile] = None
+        self.traced_before: Optional[int] = None
+
+
+class Profiler:
+    """
+    Args:
+        token: Shared secret for the admin endpoints (None/empty disables profiling)
+    """
+
+    def __init__(self, token: Optional[str] = None):
+        self._token = token or ''
+        self._lock = threading.Lock()
+        self.active = False  # Checked on every request; True only while something is armed
+
+        # cProfile of the next K requests
+        self._remaining = 0
+        self._endpoint_filter: Optional[str] = None
+        self._stats: Optional[pstats.Stats] = None
+        self._profiled: List[str] = []
+        self._profiling_now = False  # One request at a time: cProfile hooks are process-wide
+
+        # tracemalloc
+        self._memory_on = False
+        self._started_tracing = False  # Tracing begun outside the profiler (PYTHONTRACEMALLOC) is left running
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._growth: Dict[str, Dict] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._token)
+
+    def authorized(self, supplied: Optional[str]) -> bool:
+        return self.enabled and hmac.compare_digest(self._token.encode(), (supplied or '').encode())
+
+    def _update_active(self):
+        self.active = self._remaining > 0 or self._memory_on
+
+    # ------------------------------------------------------------------
+    # Sampling
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def sample(seconds: float, interval_s: float = 0.01) -> Dict[str, int]:
+        """
+        Sample every thread's stack for `seconds`.
+
+        Returns:
+            Collapsed stacks ("thread;file:function;...") mapped to sample counts
+        """
+        seconds = min(max(seconds, 0.1), MAX_SAMPLE_SECONDS)
+        interval_s = max(interval_s, MIN_SAMPLE_INTERVAL_S)
+        me = threading.get_ident()
+        counts: Dict[str, int] = {}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, f'thread-{ident}').replace(';', '_').replace(' ', '_'))
+                key = ';'.join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+            time.sleep(interval_s)
+        return counts
+
+    @staticmethod
+    def collapsed(counts: Dict[str, int]) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+    # ------------------------------------------------------------------
+    # cProfile of the next K requests
+    # ------------------------------------------------------------------
+
+    def arm_requests(self, count: int, endpoint: Optional[str] = None):
+        with self._lock:
+            self._remaining = max(0, count)
+            self._endpoint_filter = endpoint
+            self._stats = None
+            self._profiled = []
+            self._update_active()
+        logger.info("🔬 Profiling the next %d request(s)%s", count, ' to ' + endpoint if endpoint else '')
+
+    def request_started(self, endpoint: Optional[str]) -> RequestProfile:
+        handle = RequestProfile(endpoint or 'unknown')
+        with self._lock:
+            wanted = (self._remaining > 0 and not self._profiling_now
+                      and (self._endpoint_filter is None or self._endpoint_filter == endpoint))
+            if wanted:
+                self._remaining -= 1
+                self._profiling_now = True
+        if wanted:
+            handle.profile = cProfile.Profile()
+            handle.profile.enable()
+        if self._memory_on:
+            handle.traced_before = tracemalloc.get_traced_memory()[0]
+        return handle
+
+    def request_finished(self, handle: RequestProfile):
+        if handle.profile is not None:
+            handle.profile.disable()
+            with self._lock:
+                if self._stats is None:
+                    self._stats = pstats.Stats(handle.profile)
+                else:
+                    self._stats.add(handle.profile)
+                self._profiled.append(handle.endpoint)
+                self._profiling_now = False
+                self._update_active()
+        if handle.traced_before is not None and self._memory_on:
+            retained = tracemalloc.get_traced_memory()[0] - handle.traced_before
+            with self._lock:
+                entry = self._growth.setdefault(handle.endpoint, {'requests': 0, 'retained_bytes': 0})
+                entry['requests'] += 1
+                entry['retained_bytes'] += retained
+
+    def request_status(self) -> Dict:
+        with self._lock:
+            return {'remaining': self._remaining, 'profiled': len(self._profiled),
+                    'endpoints': sorted(set(self._profiled)), 'endpoint_filter': self._endpoint_filter}
+
+    def request_report(self, fmt: str = 'text', sort: str = 'cumulative', limit: int = 50) -> Optional[bytes]:
+        """Aggregated stats of the profiled requests: pstats text, or a binary pstats dump"""
+        with self._lock:
+            stats = self._stats
+            if stats is None:
+                return None
+            if fmt == 'pstats':
+                import marshal
+                return marshal.dumps(stats.stats)
+            out = io.StringIO()
+            stats.stream = out
+            stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue().encode()
+
+    # ------------------------------------------------------------------
+    # tracemalloc
+    # ------------------------------------------------------------------
+
+    def start_memory(self, frames: int = 10):
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+                self._started_tracing = True
+            self._memory_on = True
+            self._last_snapshot = tracemalloc.take_snapshot()
+            self._growth = {}
+            self._update_active()
+        logger.info("🔬 tracemalloc started (%d frames)", frames)
+
+    def stop_memory(self):
+        with self._lock:
+            self._memory_on = False
+            self._last_snapshot = None
+            self._update_active()
+            started, self._started_tracing = self._started_tracing, False
+        if started:
+            tracemalloc.stop()
+        logger.info("🔬 tracemalloc stopped" if started else "🔬 Memory profiling stopped (tracemalloc left running)")
+
+    def memory_report(self, top: int = 20, group_by: str = 'lineno') -> Optional[Dict]:
+        """Allocation growth since the previous report (or start), and retained memory per endpoint"""
+        if not self._memory_on:
+            return None
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')
+        ])
+        with self._lock:
+            previous, self._last_snapshot = self._last_snapshot, snapshot
+            growth = {name: {**entry, 'retained_per_request_kb': round(entry['retained_bytes'] / 1024 /
+                                                                       max(1, entry['requests']), 1)}
+                      for name, entry in self._growth.items()}
+        diff = snapshot.compare_to(previous, group_by) if previous else snapshot.statistics(group_by)
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'traced_kb': round(current / 1024, 1),
+            'peak_kb': round(peak / 1024, 1),
+            'top_growth': [{
+                'location': str(stat.traceback[0]) if stat.traceback else '?',
+                'size_kb': round(stat.size / 1024, 1),
+                'size_diff_kb': round(getattr(stat, 'size_diff', stat.size) / 1024, 1),
+                'count_diff': getattr(stat, 'count_diff', stat.count)
+            } for stat in diff[:top]],
+            'per_endpoint': growth
+        }
@@ -7,12 +7,18 @@ import numpy as np
 from typing import Optional, Dict, List, Union, Generator
 import time
 import logging
+from contextlib import nullcontext
 from pathlib import Path
 
+from video_renderer import glyph_cache
+from capture_supervisor import CaptureSupervisor
+from inference_scheduler import inference_class, FrameExpired, LIVE
+
 logger = logging.getLogger(__name__)
 
 class RealtimeYOLO:
-    def __init__(self, model_path: str = None, conf_threshold: float = 0.5, iou_threshold: float = 0.4):
+    def __init__(self, model_path: str = None, conf_threshold: float = 0.5, iou_threshold: float = 0.4,
+                 model=None, profile=None, scheduler=None):
         """
         Initialize YOLO detector.
         
@@ -20,10 +26,16 @@ class RealtimeYOLO:
             model_path: Path to YOLO model (.pt file). If None, uses default YOLOv8n.
             conf_threshold: Confidence threshold for detections (0-1)
             iou_threshold: IoU threshold for NMS (0-1)
+            model: Already-loaded Ultralytics model to share (skips loading model_path)
+            profile: Optional InferenceProfile; its imgsz/iou/max_det/half/classes override the defaults
+            scheduler: Optional InferenceScheduler shared with the other model users; frames
+                run in the live class and are skipped if they miss its deadline
         """
         self.conf_threshold = conf_threshold
-        self.iou_threshold = iou_threshold
-        self.model = self._load_model(model_path)
+        self.iou_threshold = profile.iou if profile else iou_threshold
+        self.profile = profile
+        self.scheduler = scheduler
+        self.model = model if model is not None else self._load_model(model_path)
         self.class_names = self._get_class_names()
         
     def _load_model(self, model_path: str = None):
@@ -72,13 +84,24 @@ class RealtimeYOLO:
         start_time = time.time()
         
         # Run inference
-        results = self.model(
-            frame,
-            conf=self.conf_threshold,
-            iou=self.iou_threshold,
-            verbose=False,
-            stream=False  # Disable streaming for single frame
-        )
+        profile_kwargs = {}
+        if self.profile:
+            profile_kwargs = {'imgsz': self.profile.imgsz, 'max_det': self.profile.max_det,
+                              'half': self.profile.half, 'classes': self.profile.classes}
+        try:
+            with inference_class(LIVE), (self.scheduler.slot() if self.scheduler else nullcontext()):
+                results = self.model(
+                    frame,
+                    conf=self.conf_threshold,
+                    iou=self.iou_threshold,
+                    verbose=False,
+                    stream=False,  # Disable streaming for single frame
+                    **profile_kwargs
+                )
+        except FrameExpired:
+            # The model was busy past the live deadline; a newer frame is already waiting
+            return {'detections': [], 'fps': 0, 'inference_time': 0, 'frame_shape': frame.shape[:2],
+                    'timestamp': time.time(), 'dropped': True}
         
         inference_time = time.time() - start_time
         fps = 1.0 / (inference_time + 1e-9)  # Avoid division by zero
@@ -123,53 +146,56 @@ class RealtimeYOLO:
             'timestamp': time.time()
         }
     
-    def process_video(self, source: Union[int, str, int], max_frames: int = 0) -> Generator[Dict, None, None]:
+    def process_video(self, source: Union[int, str, int], max_frames: int = 0,
+                      supervisor: Optional[CaptureSupervisor] = None) -> Generator[Dict, None, None]:
         """
         Process video stream frame by frame.
         
+        Live sources (camera, RTSP) are read through a CaptureSupervisor, so a
+        dropped link triggers a backoff reconnect instead of ending the generator.
+        
         Args:
             source: Camera index (0 for default), video file path, or RTSP URL
             max_frames: Maximum number of frames to process (0 for unlimited)
+            supervisor: Optional pre-configured supervisor (e.g. to read its health elsewhere)
             
         Yields:
-            Dictionary with detection results for each frame
+            Dictionary with detection results for each frame, including capture 'health'
         """
-        if isinstance(source, str) and source.isdigit():
-            source = int(source)
-            
-        cap = cv2.VideoCapture(source)
+        supervisor = supervisor or CaptureSupervisor(source)
+        frames = supervisor.frames()
         
-        if not cap.isOpened():
-            logger.error(f"Failed to open video source: {source}")
-            raise ValueError(f"Could not open video source: {source}")
-            
+        frame_count = 0
+        start_time = time.time()
         try:
-            frame_count = 0
-            start_time = time.time()
+            # Surface "cannot open" as an error rather than an empty generator
+            first = next(frames, None)
+            if first is None and supervisor.state == 'failed':
+                logger.error(f"Failed to open video source: {source}")
+                raise ValueError(f"Could not open video source: {source}")
+            frames = _prepend(first, frames) if first is not None else frames
             
-            while True:
+            for frame, health in frames:
                 if 0 < max_frames <= frame_count:
                     logger.info(f"Reached maximum frame count: {max_frames}")
                     break
                     
-                ret, frame = cap.read()
-                if not ret:
-                    logger.info("End of video stream")
-                    break
-                    
                 # Process frame
                 result = self.process_frame(frame)
                 result['frame_number'] = frame_count
                 result['elapsed_time'] = time.time() - start_time
+                result['health'] = health
                 
                 # Add frame for visualization
                 result['frame'] = frame
                 
                 yield result
                 frame_count += 1
+            else:
+                logger.info("End of video stream")
                 
         finally:
-            cap.release()
+            supervisor.stop()
             logger.info(f"Video processing complete. Processed {frame_count} frames in {time.time() - start_time:.2f} seconds")
     
     def draw_detections(self, frame: np.ndarray, detections: List[Dict]) -> np.ndarray:
@@ -204,20 +230,19 @@ class RealtimeYOLO:
                 continue  # Skip invalid boxes
                 
             # Draw rectangle
-            color = (0, 255, 0)  # Green
+            color = glyph_cache.color_for(det['class'])
             thickness = 2
             cv2.rectangle(output, (x1, y1), (x2, y2), color, thickness)
             
-            # Add label with confidence
-            label = f"{det['class']} {det['confidence']:.2f}"
-            (label_w, label_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 1)
-            
-            # Draw background for label
-            cv2.rectangle(output, (x1, y1 - 20), (x1 + label_w, y1), color, -1)
-            cv2.putText(output, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1)
+            # Add label with confidence (cached per-class glyphs, no per-frame getTextSize)
+            glyph_cache.draw_label(output, x1, y1, det['class'], det['confidence'], color)
             
         return output
 
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
 # Example usage
 if __name__ == "__main__":
     import argparse
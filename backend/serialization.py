@@ -0,0 +1,231 @@
+"""
+Response serialization: a fast JSON encoder and negotiated compression.
+
+- JSON: with orjson installed, Flask's jsonify and the NDJSON streams encode
+  through it, several times faster than the stdlib. The output keeps
+  Flask's semantics: sorted keys, and HTTP dates for datetimes.
+  JSON_ENCODER=std forces the stdlib encoder.
+- Compression: when a response is at least COMPRESS_MIN_BYTES, it is
+  compressed with brotli (if the brotli package is installed) or gzip,
+  whichever the client's Accept-Encoding prefers. Streamed bodies (NDJSON
+  video scans, SSE) are compressed per chunk with a sync flush, so every
+  record can still be decoded the moment it arrives. Images, video, MJPEG
+  and send_file downloads are left alone.
+
+COMPRESS_ROUTES overrides the choice per endpoint, e.g.
+"stream_detect=off,predict=gzip". `python benchmark.py serialize` measures
+the CPU cost against the bytes saved for each route's payload.
+"""
+import os
+import json
+import zlib
+import logging
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterable, Iterator, Optional
+
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+
+def _optional(name: str):
+    """An optional dependency's module, or None when it isn't installed"""
+    try:
+        return __import__(name)
+    except ImportError:
+        return None
+
+
+orjson = _optional('orjson') if os.environ.get('JSON_ENCODER', 'auto') != 'std' else None
+brotli = _optional('brotli')
+
+if orjson is not None:
+    # Datetimes go through Flask's default() (HTTP date) so responses don't change with the encoder
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps_bytes(obj, sort_keys: bool = False) -> bytes:
+    """Compact JSON as bytes, through orjson when available"""
+    if orjson is not None:
+        options = ORJSON_OPTIONS | orjson.OPT_SORT_KEYS if sort_keys else ORJSON_OPTIONS
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=options)
+    return json.dumps(obj, separators=(',', ':'), sort_keys=sort_keys, default=DefaultJSONProvider.default).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that encodes with orjson (debug mode keeps pretty-printed stdlib output)"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj, sort_keys=self.sort_keys).decode()
+
+    def response(self, *args, **kwargs):
+        if self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, sort_keys=self.sort_keys), mimetype=self.mimetype)
+
+
+def install_json_provider(app):
+    """Use FastJSONProvider for jsonify when orjson is installed"""
+    if orjson is not None:
+        app.json = FastJSONProvider(app)
+        logger.info("⚡ JSON responses encoded with orjson")
+
+
+# ============================================================================
+# Compression
+# ============================================================================
+
+# Already compressed, or streamed in a form the client must not wait on (MJPEG)
+UNCOMPRESSED_PREFIXES = ('image/', 'video/', 'audio/', 'multipart/', 'application/zip', 'application/gzip',
+                         'application/octet-stream')
+
+
+def _compressor(encoding: str, level: int):
+    if encoding == 'br':
+        return brotli.Compressor(quality=level)
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+
+
+def compress_bytes(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    compressor = _compressor(encoding, level)
+    return compressor.compress(data) + compressor.flush()
+
+
+class CompressedStream:
+    """
+    Compress a streamed body chunk by chunk.
+
+    Each chunk is flushed, so the client can decode every record on arrival.
+    close() reaches the wrapped iterable, so TicketedStream still releases
+    its admission slot. A LiveStream body is compressed the same way when
+    the ASGI bridge iterates its async side.
+    """
+
+    def __init__(self, iterable: Iterable, encoding: str, level: int):
+        self._iterable = iterable
+        self.encoding = encoding
+        self.level = level
+
+    @property
+    def supports_async(self) -> bool:
+        """Whether the wrapped body also streams asynchronously (live_stream.LiveStream)"""
+        return getattr(self._iterable, 'supports_async', False)
+
+    def _compress(self, compressor, chunk) -> bytes:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if self.encoding == 'br':
+            return compressor.process(chunk) + compressor.flush()
+        return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def _finish(self, compressor) -> bytes:
+        return compressor.finish() if self.encoding == 'br' else compressor.flush()
+
+    def __iter__(self) -> Iterator[bytes]:
+        compressor = _compressor(self.encoding, self.level)
+        for chunk in self._iterable:
+            out = self._compress(compressor, chunk)
+            if out:
+                yield out
+        yield self._finish(compressor)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        compressor = _compressor(self.encoding, self.level)
+        iterator = self._iterable.__aiter__()
+        try:
+            async for chunk in iterator:
+                out = self._compress(compressor, chunk)
+                if out:
+                    yield out
+        finally:
+            await iterator.aclose()  # Runs the producer's cleanup (unsubscribe, viewer count) now
+        yield self._finish(compressor)
+
+    def close(self):
+        if hasattr(self._iterable, 'close'):
+            self._iterable.close()
+
+
+@dataclass
+class CompressionPolicy:
+    """
+    Which responses get compressed, and how hard.
+
+    Args:
+        enabled: Master switch
+        min_bytes: Smaller bodies are sent as is (header and CPU cost outweigh the savings)
+        gzip_level: zlib level 1-9
+        brotli_quality: brotli quality 0-11
+        routes: Endpoint overrides: 'off', 'gzip' or 'br'
+    """
+    enabled: bool = True
+    min_bytes: int = 1024
+    gzip_level: int = 5
+    brotli_quality: int = 4
+    routes: Dict[str, str] = field(default_factory=dict)
+
+    def choose(self, endpoint: Optional[str], accept_encodings) -> Optional[str]:
+        """Encoding for a response to this endpoint, or None"""
+        forced = self.routes.get(endpoint or '')
+        if not self.enabled or forced == 'off':
+            return None
+        offers = ['br', 'gzip'] if brotli is not None else ['gzip']
+        if forced in offers:
+            offers = [forced]
+        return accept_encodings.best_match(offers)
+
+    def level(self, encoding: str) -> int:
+        return self.brotli_quality if encoding == 'br' else self.gzip_level
+
+    def apply(self, response, endpoint: Optional[str], accept_encodings):
+        """after_request hook body: compress the response in place when it qualifies"""
+        if (response.direct_passthrough or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or (response.mimetype or '').startswith(UNCOMPRESSED_PREFIXES)):
+            return response
+        encoding = self.choose(endpoint, accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = CompressedStream(response.response, encoding, self.level(encoding))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_bytes:
+                return response
+            compressed = compress_bytes(data, encoding, self.level(encoding))
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+def from_env() -> CompressionPolicy:
+    """
+    CompressionPolicy from the environment.
+
+    COMPRESSION=0 disables it. COMPRESS_MIN_BYTES (1024),
+    COMPRESS_GZIP_LEVEL (5) and COMPRESS_BROTLI_QUALITY (4) tune it.
+    COMPRESS_ROUTES takes "endpoint=off|gzip|br" pairs, separated by commas.
+    """
+    routes = {k.strip(): v.strip().lower() for k, v in
+              (pair.split('=', 1) for pair in os.environ.get('COMPRESS_ROUTES', '').split(',') if '=' in pair)}
+    policy = CompressionPolicy(
+        enabled=os.environ.get('COMPRESSION', '1') not in ('0', 'false', 'False'),
+        min_bytes=int(os.environ.get('COMPRESS_MIN_BYTES', '1024')),
+        gzip_level=int(os.environ.get('COMPRESS_GZIP_LEVEL', '5')),
+        brotli_quality=int(os.environ.get('COMPRESS_BROTLI_QUALITY', '4')),
+        routes=routes
+    )
+    if policy.enabled:
+        logger.info(f"🗜️  Response compression: {'br, ' if brotli is not None else ''}gzip above "
+                    f"{policy.min_bytes} B{f', overrides {routes}' if routes else ''}")
+    return policy
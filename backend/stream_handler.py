@@ -3,10 +3,14 @@ Stream handler for live video and RTSP processing with YOLO detection.
 Supports: USB camera, file video, RTSP drone streams.
 """
 import cv2
+import time
 import logging
 from typing import List, Dict, Optional, Tuple
 import numpy as np
 
+from frame_sampler import AdaptiveFrameSampler
+from capture_supervisor import CaptureSupervisor
+
 logger = logging.getLogger(__name__)
 
 class StreamDetector:
@@ -27,13 +31,14 @@ class StreamDetector:
                 logger.error(f"Failed to load YOLO: {e}")
                 self.use_yolo = False
     
-    def process_frame(self, frame: np.ndarray, conf_thresh: float = 0.25) -> Dict:
+    def process_frame(self, frame: np.ndarray, conf_thresh: float = 0.25, profile=None) -> Dict:
         """
         Process a single frame and return detections.
         
         Args:
             frame: BGR image from cv2
             conf_thresh: confidence threshold for detections
+            profile: Optional InferenceProfile (e.g. fast-scan for live scouting)
             
         Returns:
             {
@@ -56,41 +61,31 @@ class StreamDetector:
             return result
         
         try:
-            # Run YOLO inference on frame
-            predictions = self.yolo_model(frame, conf=conf_thresh, verbose=False)
+            # YOLODetector letterboxes once into its own buffers and returns source-pixel boxes
+            prediction = self.yolo_model.predict_frame(frame, conf_threshold=conf_thresh, profile=profile)
             
-            if predictions and len(predictions) > 0:
-                pred = predictions[0]
-                if pred.boxes is not None:
-                    for box in pred.boxes:
-                        # Extract normalized coordinates (0-1 range)
-                        x1, y1, x2, y2 = box.xyxyn[0].tolist()
-                        conf = float(box.conf[0])
-                        cls = int(box.cls[0])
-                        
-                        # Convert to center + width/height format (normalized)
-                        box_w = x2 - x1
-                        box_h = y2 - y1
-                        box_x = x1 + box_w / 2
-                        box_y = y1 + box_h / 2
-                        
-                        class_name = pred.names.get(cls, f"class_{cls}")
-                        
-                        # compute percent area of bbox in frame
-                        percent_area = round((box_w * box_h) * 100.0, 2)
+            for det in prediction.get('detections', []):
+                # Convert to normalized center + width/height format (0-1 range)
+                box_w = (det['x2'] - det['x1']) / w
+                box_h = (det['y2'] - det['y1']) / h
+                box_x = det['x1'] / w + box_w / 2
+                box_y = det['y1'] / h + box_h / 2
+                
+                # compute percent area of bbox in frame
+                percent_area = round((box_w * box_h) * 100.0, 2)
 
-                        result['boxes'].append({
-                            'class': class_name,
-                            'conf': round(conf, 3),
-                            'x': round(box_x, 3),
-                            'y': round(box_y, 3),
-                            'w': round(box_w, 3),
-                            'h': round(box_h, 3),
-                            'percent': percent_area
-                        })
-                    
-                    result['detections_count'] = len(result['boxes'])
-                    logger.debug(f"Detected {result['detections_count']} objects in frame")
+                result['boxes'].append({
+                    'class': det['class_name'],
+                    'conf': round(det['confidence'], 3),
+                    'x': round(box_x, 3),
+                    'y': round(box_y, 3),
+                    'w': round(box_w, 3),
+                    'h': round(box_h, 3),
+                    'percent': percent_area
+                })
+            
+            result['detections_count'] = len(result['boxes'])
+            logger.debug(f"Detected {result['detections_count']} objects in frame")
         
         except Exception as e:
             logger.error(f"Error in frame processing: {e}")
@@ -136,7 +131,100 @@ class StreamDetector:
             logger.error(f"Error getting video properties: {e}")
             return None
     
-    def process_stream(self, source: str, max_frames: int = 30, conf_thresh: float = 0.25):
+    def sample_preview(self, source: str, num_samples: int = 16, conf_thresh: float = 0.25,
+                       detector=None, batch_size: int = 8, profile=None) -> Dict:
+        """
+        Quick "is this video worth full analysis" preview.
+        
+        Seeks to num_samples evenly spaced positions instead of decoding every
+        frame (the decoder only works forward from the nearest keyframe), then
+        batch-infers the samples and summarises the disease distribution.
+        
+        Args:
+            source: Video file path
+            num_samples: Number of evenly spaced frames to analyse
+            conf_thresh: Confidence threshold
+            detector: YOLODetector to use (defaults to this instance's model)
+            batch_size: Frames per inference batch
+            profile: Optional InferenceProfile
+            
+        Returns:
+            {'samples': [...], 'distribution': [...], 'video': {...}, ...} or {'error': str}
+        """
+        started = time.perf_counter()
+        detector = detector or self.yolo_model
+        if detector is None:
+            return {'error': 'No detector available'}
+        
+        props = self.get_video_properties(source)
+        if not props:
+            return {'error': f'Cannot open source: {source}'}
+        frame_count, fps = props['frame_count'], props['fps']
+        if frame_count <= 0:
+            return {'error': 'Frame count unavailable (live source?); preview needs a seekable file'}
+        
+        num_samples = max(1, min(num_samples, frame_count))
+        # Centre each sample in its segment so the first/last frames (often black) are skipped
+        positions = [int((i + 0.5) * frame_count / num_samples) for i in range(num_samples)]
+        
+        cap = cv2.VideoCapture(source)
+        frames, indices = [], []
+        try:
+            for pos in positions:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, pos)
+                ret, frame = cap.read()
+                if ret and frame is not None:
+                    frames.append(frame)
+                    indices.append(pos)
+        finally:
+            cap.release()
+        
+        results = []
+        for i in range(0, len(frames), batch_size):
+            results.extend(detector.predict_frames(frames[i:i + batch_size], conf_threshold=conf_thresh,
+                                                   profile=profile))
+        
+        samples = []
+        per_class: Dict[str, List[float]] = {}
+        for pos, result in zip(indices, results):
+            best: Dict[str, float] = {}
+            for det in result.get('detections', []):
+                name = det['class_name']
+                best[name] = max(best.get(name, 0.0), det['confidence'])
+            for name, conf in best.items():
+                per_class.setdefault(name, []).append(conf)
+            samples.append({
+                'frame': pos + 1,
+                'timestamp': round(pos / fps, 3) if fps else 0.0,
+                'classes': {name: round(conf * 100, 1) for name, conf in best.items()}
+            })
+        
+        analysed = len(samples)
+        distribution = sorted((
+            {
+                'class': name,
+                'frames': len(confs),
+                'frame_ratio': round(len(confs) / analysed, 3),
+                'avg_conf': round(sum(confs) / len(confs) * 100, 1),
+                'max_conf': round(max(confs) * 100, 1)
+            }
+            for name, confs in per_class.items()
+        ), key=lambda d: d['frames'], reverse=True)
+        empty = sum(1 for sample in samples if not sample['classes'])
+        
+        return {
+            'video': props,
+            'samples_requested': num_samples,
+            'samples_analysed': analysed,
+            'empty_ratio': round(empty / analysed, 3) if analysed else 1.0,
+            'distribution': distribution,
+            'samples': samples,
+            'recommend_full_analysis': bool(distribution),
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    def process_stream(self, source: str, max_frames: int = 30, conf_thresh: float = 0.25,
+                       adaptive: bool = False, target_fps: float = 10.0, profile=None):
         """
         Generator: process video stream frame-by-frame.
         
@@ -144,47 +232,68 @@ class StreamDetector:
             source: Camera index (0), file path, or RTSP URL
             max_frames: Maximum frames to process (0 = all)
             conf_thresh: Confidence threshold
+            adaptive: Pick frames with AdaptiveFrameSampler instead of processing every frame
+            target_fps: Frames analysed per source second while detections are active (adaptive only)
+            profile: Optional InferenceProfile (e.g. fast-scan for live scouting)
             
         Yields:
-            {'frame_num': int, 'detections': {...}} for each frame
+            {'frame_num': int, 'timestamp': float, 'detections': {...}, 'health': {...}}
+            for each processed frame. Live sources reconnect with backoff when the link
+            drops; the generator (and its frame counters) carries on across reconnects.
         """
+        supervisor = CaptureSupervisor(source)
         try:
-            # Convert string camera index to int
-            if isinstance(source, str) and source.isdigit():
-                source = int(source)
-            
-            cap = cv2.VideoCapture(source)
-            
-            if not cap.isOpened():
+            frames = supervisor.frames()
+            first = next(frames, None)
+            if first is None:
                 logger.error(f"Failed to open source: {source}")
                 yield {'error': f'Cannot open source: {source}'}
                 return
             
+            source_fps = supervisor.fps or 30
+            # Dense while diseases are visible, sparse on empty field, bounded by latency
+            sampler = AdaptiveFrameSampler(source_fps, target_fps=target_fps) if adaptive else None
+            
             frame_num = 0
+            frame_index = 0
+            pending = first
             while frame_num < (max_frames if max_frames > 0 else float('inf')):
-                ret, frame = cap.read()
+                if pending is not None:
+                    (frame, health), pending = pending, None
+                else:
+                    item = next(frames, None)
+                    if item is None:
+                        logger.info(f"Stream ended or error at frame {frame_num}")
+                        break
+                    frame, health = item
                 
-                if not ret or frame is None:
-                    logger.info(f"Stream ended or error at frame {frame_num}")
-                    break
+                frame_index += 1
+                if sampler and not sampler.should_process(frame_index):
+                    continue
                 
-                # Resize for faster processing if too large
-                if frame.shape[1] > 640:
-                    scale = 640 / frame.shape[1]
-                    frame = cv2.resize(frame, None, fx=scale, fy=scale)
+                # Source time (frame index / fps); for live feeds this assumes the nominal fps, not wall-clock
+                timestamp = round((frame_index - 1) / source_fps, 3)
                 
-                detections = self.process_frame(frame, conf_thresh)
+                started = time.perf_counter()
+                detections = self.process_frame(frame, conf_thresh, profile=profile)
+                if sampler:
+                    sampler.update(time.perf_counter() - started, detections['detections_count'],
+                                   timestamp, frame_index)
                 
                 yield {
                     'frame_num': frame_num,
-                    'detections': detections
+                    'timestamp': timestamp,
+                    'detections': detections,
+                    'health': health
                 }
                 
                 frame_num += 1
             
-            cap.release()
             logger.info(f"Stream processing complete: {frame_num} frames processed")
         
         except Exception as e:
             logger.error(f"Error processing stream: {e}")
             yield {'error': str(e)}
+        
+        finally:
+            supervisor.stop()
@@ -0,0 +1,362 @@
+"""
+Multi-source stream multiplexer with shared inference.
+
+Each source (fixed camera, RTSP feed, file) gets its own capture thread that
+keeps only the latest frame. A single inference thread visits the sources
+round-robin and batches at most one fresh frame per source through the shared
+detector, so one busy stream can never starve the others, and N cameras
+share one copy of the model. Results are published to subscribers per source,
+with per-source capture fps, inference fps, lag and dropped-frame counters.
+Live sources are read through a CaptureSupervisor, so a dropped link is
+reconnected with backoff while the source (and its aggregates) lives on.
+"""
+import time
+import queue
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from capture_supervisor import CaptureSupervisor
+from inference_scheduler import inference_class, FrameExpired, LIVE
+
+logger = logging.getLogger(__name__)
+
+REPLAY_DELAY_S = 2.0  # Pause before a file source loops back to its start
+IDLE_WAIT_S = 0.005  # Inference thread poll interval when no source has a fresh frame
+
+
+class StreamSourceError(Exception):
+    """Source management error carrying the HTTP status the route should return"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _offer(q, result: Dict):
+    """Put without blocking; a slow subscriber's full queue drops its oldest result rather than block inference"""
+    try:
+        q.put_nowait(result)
+    except (queue.Full, asyncio.QueueFull):
+        try:
+            q.get_nowait()
+        except (queue.Empty, asyncio.QueueEmpty):
+            pass
+        q.put_nowait(result)
+
+
+class StreamSource:
+    """Capture thread for one source; holds only the most recent frame"""
+
+    def __init__(self, source_id: str, uri, max_fps: float = 0.0):
+        self.id = source_id
+        self.uri = int(uri) if isinstance(uri, str) and uri.isdigit() else uri
+        self.max_fps = max_fps  # Inference cap for this source (0 = as fast as its fair share)
+
+        self.frame = None
+        self.frame_seq = 0
+        self.frame_time = 0.0
+        self.processed_seq = 0
+        self.last_inference_at = 0.0
+
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0  # Captured frames overwritten before inference picked them up
+        self.last_lag_ms = 0.0
+        self.latest_result: Optional[Dict] = None
+        self.class_counts: Dict[str, int] = {}  # Detections per class since the source was added
+
+        self.supervisor = CaptureSupervisor(self.uri)
+
+        self._capture_fps = _RateMeter()
+        self._infer_fps = _RateMeter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._capture_loop, name=f"capture-{source_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.supervisor.stop()
+
+    def _capture_loop(self):
+        # Live sources never leave frames() except on stop(); files end at EOF and are replayed
+        while not self._stop.is_set():
+            frames = self.supervisor.frames()
+            next_due = time.perf_counter()
+            for frame, _health in frames:
+                if self._stop.is_set():
+                    break
+                # Files are replayed at their native rate so they behave like a camera
+                if not self.supervisor.live and self.supervisor.fps > 0:
+                    next_due += 1.0 / self.supervisor.fps
+                    self._stop.wait(max(0.0, next_due - time.perf_counter()))
+                now = time.time()
+                with self._lock:
+                    if self.frame_seq > self.processed_seq:
+                        self.frames_dropped += 1
+                    self.frame = frame
+                    self.frame_seq += 1
+                    self.frame_time = now
+                self.frames_captured += 1
+                self._capture_fps.tick(now)
+            frames.close()
+
+            if not self._stop.is_set():
+                if self.supervisor.state == 'failed':
+                    logger.warning(f"⚠️  Cannot open source {self.id}; retrying in {REPLAY_DELAY_S}s")
+                self._stop.wait(REPLAY_DELAY_S)
+
+    def take_fresh_frame(self, now: float):
+        """Return (frame, seq, frame_time) if a frame newer than the last processed one is due"""
+        if self.max_fps and now - self.last_inference_at < 1.0 / self.max_fps:
+            return None
+        with self._lock:
+            if self.frame is None or self.frame_seq <= self.processed_seq:
+                return None
+            self.processed_seq = self.frame_seq
+            return self.frame, self.frame_seq, self.frame_time
+
+    def record(self, detections: List[Dict]):
+        for det in detections:
+            self.class_counts[det['class']] = self.class_counts.get(det['class'], 0) + 1
+
+    def stats(self) -> Dict:
+        health = self.supervisor.health()
+        return {
+            'id': self.id,
+            'source': str(self.uri),
+            'state': health['state'],
+            'connected': health['connected'],
+            'reconnects': health['reconnects'],
+            'stalls': health['stalls'],
+            'last_frame_age_s': health['last_frame_age_s'],
+            'last_error': health['last_error'],
+            'capture_fps': self._capture_fps.rate(),
+            'inference_fps': self._infer_fps.rate(),
+            'lag_ms': round(self.last_lag_ms, 1),
+            'frames_captured': self.frames_captured,
+            'frames_processed': self.frames_processed,
+            'frames_dropped': self.frames_dropped,
+            'max_fps': self.max_fps,
+            'class_counts': dict(self.class_counts)
+        }
+
+
+class _RateMeter:
+    """Events per second over a sliding window"""
+
+    def __init__(self, window_s: float = 5.0):
+        self.window_s = window_s
+        self._times: List[float] = []
+
+    def tick(self, now: float):
+        self._times.append(now)
+        cutoff = now - self.window_s
+        if self._times[0] < cutoff:
+            self._times = [t for t in self._times if t >= cutoff]
+
+    def rate(self) -> float:
+        if len(self._times) < 2:
+            return 0.0
+        span = self._times[-1] - self._times[0]
+        return round((len(self._times) - 1) / span, 2) if span > 0 else 0.0
+
+
+class StreamMultiplexer:
+    """
+    Manages N sources and runs their frames through one shared detector.
+
+    Args:
+        detector_provider: Callable returning the current detector (or None while loading)
+        batch_size: Max frames (one per source) per inference call
+        subscriber_queue_size: Results buffered per subscriber before the oldest are dropped
+        max_sources: Sources (each a capture thread) that may run at once
+    """
+
+    def __init__(self, detector_provider: Callable, batch_size: int = 4, subscriber_queue_size: int = 64,
+                 max_sources: int = 16):
+        self.detector_provider = detector_provider
+        self.batch_size = max(1, batch_size)
+        self.max_sources = max_sources
+        self.subscriber_queue_size = subscriber_queue_size
+        self.sources: Dict[str, StreamSource] = {}
+        self._subscribers: List[tuple] = []  # (source_id or None, queue, event loop or None)
+        self._rr_index = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Source management
+    # ------------------------------------------------------------------
+
+    def add_source(self, source_id: str, uri, max_fps: float = 0.0) -> StreamSource:
+        """
+        Start capturing a new source.
+
+        Raises:
+            StreamSourceError: 409 if the id is taken, 429 when max_sources are already running
+        """
+        with self._lock:
+            if source_id in self.sources:
+                raise StreamSourceError(f"Source already exists: {source_id}", status=409)
+            if len(self.sources) >= self.max_sources:
+                raise StreamSourceError(f"Too many sources ({self.max_sources}); remove one first", status=429)
+            source = StreamSource(source_id, uri, max_fps=max_fps)
+            self.sources[source_id] = source
+        source.start()
+        self._ensure_running()
+        self._wakeup.set()
+        logger.info(f"➕ Stream source added: {source_id} ({uri})")
+        return source
+
+    def remove_source(self, source_id: str) -> bool:
+        with self._lock:
+            source = self.sources.pop(source_id, None)
+        if not source:
+            return False
+        source.stop()
+        logger.info(f"➖ Stream source removed: {source_id}")
+        return True
+
+    def _ensure_running(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._inference_loop, name='stream-mux', daemon=True)
+            self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Subscribers
+    # ------------------------------------------------------------------
+
+    def subscribe(self, source_id: Optional[str] = None) -> "queue.Queue":
+        """Subscribe to results of one source (or all sources when source_id is None)"""
+        q: "queue.Queue" = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.append((source_id, q, None))
+        return q
+
+    def subscribe_async(self, source_id: Optional[str] = None) -> "asyncio.Queue":
+        """subscribe() for an event-loop consumer: results are handed to its loop, no thread waits"""
+        q: "asyncio.Queue" = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.append((source_id, q, loop))
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] is not q]
+
+    def _publish(self, result: Dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for source_id, q, loop in subscribers:
+            if source_id is not None and source_id != result['source_id']:
+                continue
+            if loop is None:
+                _offer(q, result)
+                continue
+            try:
+                loop.call_soon_threadsafe(_offer, q, result)  # asyncio.Queue is not thread-safe
+            except RuntimeError:
+                pass  # Loop closed; the subscriber is gone
+
+    # ------------------------------------------------------------------
+    # Inference
+    # ------------------------------------------------------------------
+
+    def _collect_batch(self) -> List[tuple]:
+        """One fresh frame per source, visiting sources round-robin from a rotating start"""
+        with self._lock:
+            sources = list(self.sources.values())
+        if not sources:
+            return []
+
+        now = time.time()
+        batch = []
+        start = self._rr_index % len(sources)
+        for i in range(len(sources)):
+            source = sources[(start + i) % len(sources)]
+            taken = source.take_fresh_frame(now)
+            if taken:
+                batch.append((source, *taken))
+                if len(batch) >= self.batch_size:
+                    # Next round starts after the last source served this round
+                    self._rr_index = start + i + 1
+                    return batch
+        self._rr_index = start + 1
+        return batch
+
+    def _inference_loop(self):
+        logger.info("🔀 Stream multiplexer inference loop started")
+        # Camera frames: ahead of uploads and batch jobs, dropped if the model is busy too long
+        with inference_class(LIVE):
+            self._run_inference()
+
+    def _run_inference(self):
+        while True:
+            if not self.sources:
+                # Sleep until a source is added
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            detector = self.detector_provider()
+            batch = self._collect_batch() if detector is not None else []
+            if not batch:
+                time.sleep(IDLE_WAIT_S)
+                continue
+
+            frames = [item[1] for item in batch]
+            started = time.perf_counter()
+            try:
+                if hasattr(detector, 'predict_frames') and len(frames) > 1:
+                    results = detector.predict_frames(frames)
+                else:
+                    results = [detector.predict_frame(frame) for frame in frames]
+            except FrameExpired:
+                # Missed the live deadline; the next batch takes fresher frames
+                continue
+            except Exception as e:
+                logger.error("❌ Multiplexed inference failed: %s", e)
+                continue
+            inference_ms = (time.perf_counter() - started) * 1000
+            now = time.time()
+
+            for (source, frame, seq, frame_time), result in zip(batch, results):
+                h, w = frame.shape[:2]
+                source.frames_processed += 1
+                source.last_inference_at = now
+                source._infer_fps.tick(now)
+                source.last_lag_ms = (now - frame_time) * 1000
+
+                published = {
+                    'source_id': source.id,
+                    'frame_seq': seq,
+                    'captured_at': frame_time,
+                    'lag_ms': round(source.last_lag_ms, 1),
+                    'inference_ms': round(inference_ms, 1),
+                    'batch_size': len(batch),
+                    'frame_size': [h, w],
+                    'detections': [{
+                        'class': det['class_name'],
+                        'conf': round(det['confidence'] * 100, 1),
+                        'x1': round(det['x1'] / w, 4),
+                        'y1': round(det['y1'] / h, 4),
+                        'x2': round(det['x2'] / w, 4),
+                        'y2': round(det['y2'] / h, 4)
+                    } for det in result.get('detections', [])]
+                }
+                source.record(published['detections'])
+                source.latest_result = published
+                self._publish(published)
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [source.stats() for source in self.sources.values()]
@@ -0,0 +1,480 @@
+"""
+Request-scoped tracing across routes, decode, inference and LLM calls.
+
+A farmer's action spans several requests (upload, /predict, /analyze,
+/llm/generate_report) and an external LLM call. Each request joins the
+caller's trace from a W3C `traceparent` header, or from an `X-Trace-Id`
+header for clients that only carry an id. Otherwise the request starts a new
+trace. The trace id is returned in `X-Trace-Id`, so a frontend can pass it
+along to the next step.
+
+The current span lives in a context variable. Code on the request path opens
+stages with
+
+    with tracing.span('yolo.forward', frames=len(frames)):
+        ...
+
+and never passes a tracer around. Finished spans go to an exporter: a JSONL
+file (summarise it with `python tracing.py summarize traces.jsonl`) or an
+OTLP/HTTP collector (Jaeger, Tempo, the OpenTelemetry Collector). With no
+exporter, trace ids are still propagated but no spans are recorded, and each
+span() costs one context variable lookup.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import logging
+import secrets
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVICE_NAME = 'agrovision-api'
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """Identity of a span as it propagates (W3C trace context)"""
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def _is_hex(value: str, length: int) -> bool:
+    return len(value) == length and all(c in '0123456789abcdef' for c in value) and value.strip('0') != ''
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[SpanContext]:
+    """SpanContext from a `traceparent` header, or None if it is missing or malformed"""
+    if not header:
+        return None
+    parts = header.strip().lower().split('-')
+    if len(parts) < 4 or parts[0] == 'ff' or not _is_hex(parts[1], 32) or not _is_hex(parts[2], 16):
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    return SpanContext(parts[1], parts[2], bool(flags & 1))
+
+
+@dataclass
+class Span:
+    """A timed stage of a trace"""
+    name: str
+    context: SpanContext
+    parent_id: Optional[str] = None
+    kind: int = KIND_INTERNAL
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, message: str):
+        self.error = message
+
+    @property
+    def duration_ms(self) -> float:
+        return round(((self.end_ns or time.time_ns()) - self.start_ns) / 1e6, 3)
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.context.trace_id,
+            'span_id': self.context.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': self.duration_ms,
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class _NoopSpan:
+    """Stands in for a Span that is not recorded, so callers never check for None"""
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def fail(self, message: str):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar('trace_span', default=None)
+
+
+# ============================================================================
+# Exporters
+# ============================================================================
+
+class FileExporter:
+    """
+    Append finished spans to a JSONL file, one span per line.
+
+    Args:
+        path: Output file; every worker process appends to the same file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + '\n'
+        with self._lock:
+            if self._file is None or self._pid != os.getpid():
+                # Opened per process: a pre-fork master must not share its handle with workers
+                self._file = open(self.path, 'a', buffering=1, encoding='utf-8')
+                self._pid = os.getpid()
+            self._file.write(line)
+
+    def shutdown(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OTLPExporter:
+    """
+    Send spans to an OTLP/HTTP collector as JSON (POST <endpoint>/v1/traces).
+
+    Spans are batched on a background thread; when the collector is slow or
+    down the queue fills and new spans are dropped rather than blocking requests.
+
+    Args:
+        endpoint: Collector base URL (e.g. http://localhost:4318) or the full /v1/traces URL
+        service_name: resource service.name
+        headers: Extra HTTP headers (e.g. an API key for a hosted collector)
+        max_queue: Spans buffered before dropping
+        batch_size: Spans per POST, at most
+        flush_interval_s: Longest a span waits before it is sent
+    """
+
+    def __init__(self, endpoint: str, service_name: str = DEFAULT_SERVICE_NAME, headers: Optional[Dict] = None,
+                 max_queue: int = 2048, batch_size: int = 256, flush_interval_s: float = 2.0):
+        endpoint = endpoint.rstrip('/')
+        self.url = endpoint if endpoint.endswith('/v1/traces') else endpoint + '/v1/traces'
+        self.service_name = service_name
+        self.headers = {'Content-Type': 'application/json', **(headers or {})}
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        if self._pid != os.getpid():
+            # Threads don't survive fork: start the sender in the process that exports
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._thread = threading.Thread(target=self._run, name='otlp-exporter', daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        import requests
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval_s
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            stop = None in batch
+            spans = [s for s in batch if s is not None]
+            if spans:
+                try:
+                    response = requests.post(self.url, data=json.dumps(self._payload(spans)),
+                                             headers=self.headers, timeout=5)
+                    if response.status_code >= 400:
+                        logger.warning(f"⚠️  OTLP export rejected ({response.status_code}): {response.text[:200]}")
+                except Exception as e:
+                    logger.warning(f"⚠️  OTLP export failed ({len(spans)} spans dropped): {e}")
+            if stop:
+                return
+
+    def _payload(self, spans: List[Span]) -> Dict:
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': {'stringValue': self.service_name}},
+                {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}}
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': 'agrovision.tracing'},
+                'spans': [{
+                    'traceId': s.context.trace_id,
+                    'spanId': s.context.span_id,
+                    **({'parentSpanId': s.parent_id} if s.parent_id else {}),
+                    'name': s.name,
+                    'kind': s.kind,
+                    'startTimeUnixNano': str(s.start_ns),
+                    'endTimeUnixNano': str(s.end_ns or s.start_ns),
+                    'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in s.attributes.items()],
+                    'status': {'code': 2, 'message': s.error} if s.error else {'code': 1}
+                } for s in spans]
+            }]
+        }]}
+
+    def shutdown(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join(timeout=self.flush_interval_s + 5)
+
+
+# ============================================================================
+# Tracer
+# ============================================================================
+
+class Tracer:
+    """
+    Args:
+        exporter: FileExporter / OTLPExporter; None records nothing (ids still propagate)
+        sample_rate: Share of new traces recorded; joined traces follow the caller's sampled flag
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def _sample(self) -> bool:
+        return self.enabled and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+
+    def start_request(self, name: str, traceparent: Optional[str] = None, trace_id: Optional[str] = None,
+                      **attributes):
+        """
+        Open the server span of an incoming request and make it current.
+
+        Args:
+            name: Span name (the route endpoint)
+            traceparent: Caller's W3C traceparent header
+            trace_id: Caller's X-Trace-Id header (used when there is no valid traceparent)
+
+        Returns:
+            Handle for end_request()
+        """
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            context = SpanContext(parent.trace_id, secrets.token_hex(8), parent.sampled and self.enabled)
+        else:
+            trace_id = (trace_id or '').strip().lower()
+            context = SpanContext(trace_id if _is_hex(trace_id, 32) else secrets.token_hex(16),
+                                  secrets.token_hex(8), self._sample())
+        span = Span(name, context, parent.span_id if parent else None, KIND_SERVER, attributes)
+        return span, _current.set(context)
+
+    def end_request(self, handle, error: Optional[str] = None):
+        span, token = handle
+        _current.reset(token)
+        if error:
+            span.fail(error)
+        self._finish(span)
+
+    def _finish(self, span: Span):
+        span.end_ns = time.time_ns()
+        if span.context.sampled and self.exporter is not None:
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                logger.warning(f"⚠️  Span export failed: {e}")
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[SpanContext] = None, kind: int = KIND_INTERNAL,
+             children: bool = True, **attributes) -> Iterator:
+        """
+        Time a stage as a child of the current span (or of `parent`).
+
+        Args:
+            name: Stage name, dotted by subsystem (yolo.forward, llm.http)
+            parent: Explicit parent, for work that outlives the request context (streamed bodies, threads)
+            kind: KIND_INTERNAL, or KIND_CLIENT for outgoing calls
+            children: False keeps nested stages out of the trace (per-frame spans of a long video)
+        """
+        parent = parent or _current.get()
+        if parent is None or not parent.sampled:
+            yield NOOP_SPAN
+            return
+        context = SpanContext(parent.trace_id, secrets.token_hex(8), True)
+        span = Span(name, context, parent.span_id, kind, attributes)
+        token = _current.set(context if children else SpanContext(context.trace_id, context.span_id, False))
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(span)
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+_tracer = Tracer()
+
+
+def install(tracer: Tracer) -> Tracer:
+    """Make `tracer` the one behind the module-level span()"""
+    global _tracer
+    _tracer = tracer
+    return tracer
+
+
+def span(name: str, **kwargs):
+    """tracing.span(...) on the installed Tracer"""
+    return _tracer.span(name, **kwargs)
+
+
+def current() -> Optional[SpanContext]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    context = _current.get()
+    return context.trace_id if context else None
+
+
+def inject(headers: Optional[Dict] = None) -> Dict:
+    """Headers for an outgoing call, with the current span's traceparent added"""
+    headers = dict(headers or {})
+    context = _current.get()
+    if context is not None:
+        headers['traceparent'] = context.traceparent
+    return headers
+
+
+def from_env() -> Tracer:
+    """
+    Tracer configured from the environment.
+
+    TRACE_EXPORTER is none, file or otlp (otlp by default when
+    OTEL_EXPORTER_OTLP_ENDPOINT is set). TRACE_FILE is the JSONL path
+    (default traces.jsonl). OTEL_EXPORTER_OTLP_HEADERS takes "k=v,k2=v2".
+    TRACE_SAMPLE_RATE sets the share of new traces recorded (default 1.0).
+    OTEL_SERVICE_NAME names the service.
+    """
+    endpoint = os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT', '')
+    kind = os.environ.get('TRACE_EXPORTER', 'otlp' if endpoint else 'none').lower()
+    sample_rate = float(os.environ.get('TRACE_SAMPLE_RATE', '1.0'))
+    exporter = None
+    if kind == 'file':
+        exporter = FileExporter(os.environ.get('TRACE_FILE', 'traces.jsonl'))
+        logger.info(f"🧭 Tracing to {exporter.path} (sample rate {sample_rate})")
+    elif kind == 'otlp':
+        if not endpoint:
+            logger.warning("⚠️  TRACE_EXPORTER=otlp needs OTEL_EXPORTER_OTLP_ENDPOINT; tracing disabled")
+        else:
+            headers = dict(pair.split('=', 1) for pair in
+                           os.environ.get('OTEL_EXPORTER_OTLP_HEADERS', '').split(',') if '=' in pair)
+            exporter = OTLPExporter(endpoint, os.environ.get('OTEL_SERVICE_NAME', DEFAULT_SERVICE_NAME),
+                                    {k.strip(): v.strip() for k, v in headers.items()})
+            logger.info(f"🧭 Tracing to OTLP collector {exporter.url} (sample rate {sample_rate})")
+    elif kind != 'none':
+        logger.warning(f"⚠️  Unknown TRACE_EXPORTER '{kind}'; tracing disabled")
+    return Tracer(exporter, sample_rate)
+
+
+# ============================================================================
+# Trace file summary
+# ============================================================================
+
+def summarize(path: str, slowest: int = 10) -> str:
+    """
+    Slowest traces in a JSONL trace file, with time per stage.
+
+    Stage times are summed per span name. Stages nest (yolo.forward sits
+    inside the predict request), so they don't add up to the total.
+    """
+    traces: Dict[str, List[Dict]] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                traces.setdefault(record['trace_id'], []).append(record)
+
+    rows = []
+    for trace_id, spans in traces.items():
+        start = min(s['start_ns'] for s in spans)
+        end = max(s['end_ns'] or s['start_ns'] for s in spans)
+        rows.append(((end - start) / 1e6, trace_id, spans))
+    rows.sort(key=lambda r: r[0], reverse=True)
+
+    lines = [f"{len(traces)} traces in {path}"]
+    for total_ms, trace_id, spans in rows[:slowest]:
+        requests = [s['name'] for s in sorted(spans, key=lambda s: s['start_ns']) if s['kind'] == KIND_SERVER]
+        errors = sum(1 for s in spans if s.get('error'))
+        lines.append(f"\n{trace_id}  {total_ms:.1f} ms  {' → '.join(requests) or '(no request span)'}"
+                     f"{f'  [{errors} error(s)]' if errors else ''}")
+        stages: Dict[str, List[float]] = {}
+        for s in spans:
+            stages.setdefault(s['name'], []).append(s['duration_ms'])
+        for name, durations in sorted(stages.items(), key=lambda kv: sum(kv[1]), reverse=True):
+            lines.append(f"  {name:<32} {sum(durations):>10.1f} ms  x{len(durations)}")
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Inspect traces written by the file exporter')
+    sub = parser.add_subparsers(dest='command', required=True)
+    summary = sub.add_parser('summarize', help='Slowest traces with time per stage')
+    summary.add_argument('path', nargs='?', default='traces.jsonl')
+    summary.add_argument('--slowest', type=int, default=10)
+    args = parser.parse_args(argv)
+    print(summarize(args.path, args.slowest))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
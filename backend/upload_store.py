@@ -0,0 +1,551 @@
+"""
+Content-addressed upload storage with opaque ids, a quota and TTL cleanup.
+
+Layout under the upload folder:
+
+    blobs/<sha[:2]>/<sha256>.<ext>   file content, stored once per distinct content
+    ids/<upload_id>.json             what a client was handed: blob, filename, size, last access
+    .incoming/                       uploads being streamed in (hashed while they are written)
+
+An upload is copied to .incoming in COPY_BUFFER_SIZE blocks and hashed along
+the way. It is then renamed into blobs/, or dropped when a blob with the
+same hash already exists. Clients only ever see the upload_id, never a
+server path.
+
+A client can get an id for content the server already holds without
+sending it again (link()), but only by proving it has the file. challenge()
+hands out a signed, expiring byte range, and the client answers with the
+SHA-256 of the token followed by those bytes. A hash alone proves nothing,
+and the challenge looks the same whether or not the content is stored, so
+link() can't be used to probe what other clients uploaded.
+
+Blobs have no reference counts. A blob is garbage once no id refers to it.
+The sweeper thread removes ids not used for ttl_s, then unreferenced blobs,
+then evicts the least recently used ids while the blobs exceed quota_bytes.
+A blob that was just written or re-linked (recent mtime) is never removed,
+so a sweep in another worker can't delete content an upload is linking.
+Blobs the `pinned` hook reports (videos of queued or running jobs) are never
+removed, and neither are the ids that refer to them.
+"""
+import os
+import hmac
+import json
+import time
+import uuid
+import random
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from werkzeug.utils import secure_filename
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 1024 * 1024  # 1 MiB
+# Ids used and blobs written more recently than this are never swept
+GRACE_S = 300
+# How often last_access is written back for an id that keeps being resolved
+TOUCH_INTERVAL_S = 60
+# Proof-of-possession challenges for link(): bytes hashed and how long a challenge stays valid
+CHALLENGE_BYTES = 64 * 1024
+CHALLENGE_TTL_S = 600
+
+
+class UploadStoreError(Exception):
+    """Storage error carrying the HTTP status the route should return"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class StoredUpload:
+    id: str
+    sha256: str
+    filename: str
+    size: int
+    blob: str  # Path relative to the store root
+    created_at: float = 0.0
+    last_access: float = 0.0
+
+    def to_dict(self) -> Dict:
+        """Client-facing fields (no server paths)"""
+        body = asdict(self)
+        body.pop('blob')
+        return body
+
+
+class UploadStore:
+    """
+    Deduplicated upload blobs behind opaque ids.
+
+    Args:
+        root: Upload folder
+        quota_bytes: Total blob size kept before the least recently used ids are evicted (0: no quota)
+        ttl_s: Ids unused for this long are removed (0: never)
+        sweep_interval_s: Seconds between background sweeps
+    """
+
+    BLOB_DIR = 'blobs'
+    INDEX_DIR = 'ids'
+    INCOMING_DIR = '.incoming'
+
+    def __init__(self, root: str, quota_bytes: int = 0, ttl_s: float = 0, sweep_interval_s: float = 300):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.ttl_s = ttl_s
+        self.sweep_interval_s = sweep_interval_s
+        # Extra cleanup run on every sweep (e.g. abandoned chunked-upload sessions)
+        self.on_sweep: Optional[Callable[[], int]] = None
+        # Server paths still in use (e.g. videos of unfinished jobs); never removed
+        self.pinned: Optional[Callable[[], Iterable[str]]] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._stop = threading.Event()
+        for name in (self.BLOB_DIR, self.INDEX_DIR, self.INCOMING_DIR):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+        self._link_key = self._load_link_key()
+
+    # ------------------------------------------------------------------
+    # Paths
+    # ------------------------------------------------------------------
+
+    def _index_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, self.INDEX_DIR, f"{upload_id}.json")
+
+    def _blob_rel(self, sha256: str, filename: str) -> str:
+        ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'bin'
+        return os.path.join(self.BLOB_DIR, sha256[:2], f"{sha256}.{ext}")
+
+    def _find_blob(self, sha256: str) -> Optional[str]:
+        """Relative path of the blob holding this content, if any"""
+        shard = os.path.join(self.root, self.BLOB_DIR, sha256[:2])
+        try:
+            names = os.listdir(shard)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.split('.', 1)[0] == sha256:
+                return os.path.join(self.BLOB_DIR, sha256[:2], name)
+        return None
+
+    # ------------------------------------------------------------------
+    # Index records
+    # ------------------------------------------------------------------
+
+    def _save(self, record: StoredUpload):
+        """Persist an id record atomically (write temp file, then rename)"""
+        path = self._index_path(record.id)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(asdict(record), f)
+        os.replace(path + '.tmp', path)
+
+    def _records(self) -> List[StoredUpload]:
+        records = []
+        index_dir = os.path.join(self.root, self.INDEX_DIR)
+        for name in os.listdir(index_dir):
+            if name.endswith('.json'):
+                record = self.get(name[:-5])
+                if record:
+                    records.append(record)
+        return records
+
+    def get(self, upload_id: str) -> Optional[StoredUpload]:
+        """The record for an id, or None (unknown, removed or malformed id)"""
+        if not upload_id or not upload_id.isalnum():
+            return None
+        try:
+            with open(self._index_path(upload_id), 'r') as f:
+                return StoredUpload(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"⚠️ Unreadable upload record {upload_id}: {e}")
+            return None
+
+    def _register(self, sha256: str, blob: str, filename: str, size: int,
+                  upload_id: Optional[str] = None) -> StoredUpload:
+        now = time.time()
+        record = StoredUpload(id=upload_id or uuid.uuid4().hex, sha256=sha256, filename=filename, size=size,
+                              blob=blob, created_at=now, last_access=now)
+        self._save(record)
+        return record
+
+    # ------------------------------------------------------------------
+    # Storing
+    # ------------------------------------------------------------------
+
+    def _install(self, temp_path: str, sha256: str, filename: str) -> Tuple[str, bool]:
+        """
+        Move a fully written, hashed file into blobs/.
+
+        Returns:
+            (relative blob path, True if identical content was already stored)
+        """
+        with self._lock:
+            existing = self._find_blob(sha256)
+            if existing:
+                os.remove(temp_path)
+                # A fresh mtime keeps the sweeper off this blob while the new id is written
+                os.utime(os.path.join(self.root, existing))
+                return existing, True
+            blob = self._blob_rel(sha256, filename)
+            os.makedirs(os.path.dirname(os.path.join(self.root, blob)), exist_ok=True)
+            os.replace(temp_path, os.path.join(self.root, blob))
+            return blob, False
+
+    def put(self, stream: BinaryIO, filename: str, max_bytes: Optional[int] = None) -> Tuple[StoredUpload, bool]:
+        """
+        Stream an upload to disk while hashing it.
+
+        Args:
+            stream: Readable binary stream (e.g. the multipart file's stream)
+            filename: Client file name (sanitized; its extension is kept on the blob)
+            max_bytes: Reject larger uploads with 413
+
+        Returns:
+            (record, deduplicated)
+        """
+        safe_name = secure_filename(filename or '')
+        if not safe_name:
+            raise UploadStoreError('Invalid filename')
+
+        temp_path = os.path.join(self.root, self.INCOMING_DIR, uuid.uuid4().hex)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+                    size += len(block)
+                    if max_bytes is not None and size > max_bytes:
+                        raise UploadStoreError(f'Upload exceeds {max_bytes} bytes', status=413)
+                    hasher.update(block)
+                    f.write(block)
+            if size == 0:
+                raise UploadStoreError('Empty upload')
+            sha256 = hasher.hexdigest()
+            if not self._find_blob(sha256):
+                self._make_room(size)
+            blob, deduplicated = self._install(temp_path, sha256, safe_name)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        record = self._register(sha256, blob, safe_name, size)
+        logger.info(f"💾 Upload stored: {record.id} ({safe_name}, {size} bytes"
+                    f"{', deduplicated' if deduplicated else ''})")
+        return record, deduplicated
+
+    def adopt(self, path: str, filename: str, upload_id: Optional[str] = None,
+              sha256: Optional[str] = None) -> Tuple[StoredUpload, bool]:
+        """
+        Move a file that is already on disk (e.g. an assembled chunked upload) into the store.
+
+        Args:
+            path: File to take over; it is moved or, when deduplicated, removed
+            filename: Client file name
+            upload_id: Id to register it under (default: a new one)
+            sha256: Content hash if already verified, skipping a re-read
+        """
+        safe_name = secure_filename(filename or '') or 'upload.bin'
+        if not sha256:
+            hasher = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+                    hasher.update(block)
+            sha256 = hasher.hexdigest()
+        size = os.path.getsize(path)
+        if not self._find_blob(sha256):
+            self._make_room(size)
+        blob, deduplicated = self._install(path, sha256, safe_name)
+        record = self._register(sha256, blob, safe_name, size, upload_id)
+        logger.info(f"💾 Upload stored: {record.id} ({safe_name}, {size} bytes"
+                    f"{', deduplicated' if deduplicated else ''})")
+        return record, deduplicated
+
+    def _load_link_key(self) -> bytes:
+        """Challenge signing key, shared by every worker through a file in the store"""
+        path = os.path.join(self.root, '.link_key')
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(os.urandom(32))
+        except FileExistsError:
+            pass
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _sign(self, sha256: str, size: int, offset: int, length: int, expires: int) -> str:
+        message = f"{sha256}:{size}:{offset}:{length}:{expires}".encode()
+        return hmac.new(self._link_key, message, hashlib.sha256).hexdigest()
+
+    def challenge(self, sha256: str, size: int) -> Dict:
+        """
+        A proof-of-possession challenge for link(): a random byte range of the file.
+
+        Built from the client's claim alone, so it is the same whether or not the content is stored.
+        """
+        length = min(CHALLENGE_BYTES, size)
+        offset = random.SystemRandom().randrange(0, size - length + 1)
+        expires = int(time.time() + CHALLENGE_TTL_S)
+        token = f"{expires}.{offset}.{length}.{self._sign(sha256.lower(), size, offset, length, expires)}"
+        return {'token': token, 'offset': offset, 'length': length, 'expires_at': expires}
+
+    def link(self, sha256: str, filename: str, size: int, token: str, proof: str) -> Optional[StoredUpload]:
+        """
+        A new id for content that is already stored, without sending it again.
+
+        Args:
+            sha256 / size: The client's file
+            token: From challenge(sha256, size)
+            proof: Hex SHA-256 of the token (UTF-8) followed by the challenged bytes
+
+        Returns:
+            The record, or None when the content is unknown or the proof is wrong (indistinguishable)
+        """
+        sha256 = (sha256 or '').lower()
+        safe_name = secure_filename(filename or '')
+        if len(sha256) != 64 or not safe_name or not isinstance(size, int) or size <= 0:
+            return None
+        try:
+            expires, offset, length, mac = str(token).split('.')
+            expires, offset, length = int(expires), int(offset), int(length)
+        except ValueError:
+            return None
+        if expires < time.time() or not hmac.compare_digest(mac, self._sign(sha256, size, offset, length, expires)):
+            return None
+
+        with self._lock:
+            blob = self._find_blob(sha256)
+            if not blob:
+                return None
+            blob_path = os.path.join(self.root, blob)
+            if os.path.getsize(blob_path) != size:
+                return None
+            with open(blob_path, 'rb') as f:
+                f.seek(offset)
+                expected = hashlib.sha256(token.encode() + f.read(length)).hexdigest()
+            if not hmac.compare_digest(expected, str(proof or '').lower()):
+                return None
+            os.utime(blob_path)
+        record = self._register(sha256, blob, safe_name, size)
+        logger.info(f"🔗 Upload linked to stored content: {record.id} ({safe_name})")
+        return record
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def resolve(self, upload_id: str) -> str:
+        """
+        Server path of an upload's content, refreshing its last access.
+
+        Raises:
+            UploadStoreError: 404 for unknown or expired ids
+        """
+        record = self.get(upload_id)
+        path = os.path.join(self.root, record.blob) if record else None
+        if not record or not os.path.exists(path):
+            raise UploadStoreError('Upload not found (unknown or expired upload_id)', status=404)
+        now = time.time()
+        if now - record.last_access > TOUCH_INTERVAL_S:
+            record.last_access = now
+            self._save(record)
+        return os.path.abspath(path)
+
+    def delete(self, upload_id: str) -> bool:
+        """Forget an id; its blob goes with the next sweep once nothing else refers to it"""
+        if not self.get(upload_id):
+            return False
+        try:
+            os.remove(self._index_path(upload_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def usage(self) -> Dict:
+        """Blob count and bytes, id count, and the configured limits"""
+        blobs, total = self._blob_sizes()
+        return {
+            'blobs': len(blobs),
+            'bytes': total,
+            'ids': sum(1 for name in os.listdir(os.path.join(self.root, self.INDEX_DIR)) if name.endswith('.json')),
+            'quota_bytes': self.quota_bytes,
+            'ttl_s': self.ttl_s
+        }
+
+    # ------------------------------------------------------------------
+    # Garbage collection
+    # ------------------------------------------------------------------
+
+    def _blob_sizes(self) -> Tuple[Dict[str, os.stat_result], int]:
+        blobs = {}
+        blob_root = os.path.join(self.root, self.BLOB_DIR)
+        for shard in os.listdir(blob_root):
+            shard_dir = os.path.join(blob_root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                try:
+                    blobs[os.path.join(self.BLOB_DIR, shard, name)] = os.stat(os.path.join(shard_dir, name))
+                except FileNotFoundError:
+                    pass
+        return blobs, sum(st.st_size for st in blobs.values())
+
+    def _pinned_blobs(self) -> Set[str]:
+        """Blob paths (relative to the root) the pinned hook reports as in use"""
+        if not self.pinned:
+            return set()
+        root = os.path.realpath(self.root)
+        pinned = set()
+        for path in self.pinned():
+            if path:
+                rel = os.path.relpath(os.path.realpath(path), root)
+                if not rel.startswith('..'):
+                    pinned.add(rel)
+        return pinned
+
+    def _remove_unreferenced(self, records: List[StoredUpload], now: float,
+                             pinned: Set[str]) -> Tuple[int, int]:
+        """Delete blobs no id refers to; returns (count, bytes)"""
+        referenced = {record.blob for record in records} | pinned
+        blobs, _ = self._blob_sizes()
+        removed = freed = 0
+        for blob, st in blobs.items():
+            if blob in referenced or now - st.st_mtime < GRACE_S:
+                continue
+            try:
+                os.remove(os.path.join(self.root, blob))
+                removed += 1
+                freed += st.st_size
+            except FileNotFoundError:
+                pass
+        return removed, freed
+
+    def _evict(self, target_bytes: int, now: float) -> int:
+        """Drop least recently used ids (and then their blobs) until blobs fit in target_bytes"""
+        records = self._records()
+        blobs, total = self._blob_sizes()
+        pinned = self._pinned_blobs()
+        evicted = 0
+        # Blob bytes each id would free if it were the last reference
+        by_blob: Dict[str, List[StoredUpload]] = {}
+        for record in records:
+            by_blob.setdefault(record.blob, []).append(record)
+        for record in sorted(records, key=lambda r: r.last_access):
+            if total <= target_bytes:
+                break
+            if now - record.last_access < GRACE_S:
+                break  # Everything after this one is in active use too
+            if record.blob in pinned:
+                continue
+            self.delete(record.id)
+            evicted += 1
+            holders = by_blob[record.blob]
+            holders.remove(record)
+            if not holders and record.blob in blobs:
+                try:
+                    os.remove(os.path.join(self.root, record.blob))
+                    total -= blobs[record.blob].st_size
+                except FileNotFoundError:
+                    pass
+        return evicted
+
+    def _make_room(self, incoming: int):
+        """Evict for an upload of `incoming` bytes, or reject it with 507"""
+        if not self.quota_bytes:
+            return
+        if incoming > self.quota_bytes:
+            raise UploadStoreError('Upload is larger than the storage quota', status=507)
+        with self._lock:
+            _, total = self._blob_sizes()
+            if total + incoming <= self.quota_bytes:
+                return
+            self._evict(self.quota_bytes - incoming, time.time())
+            _, total = self._blob_sizes()
+        if total + incoming > self.quota_bytes:
+            raise UploadStoreError('Upload storage is full, retry later', status=507)
+
+    def sweep(self) -> Dict[str, int]:
+        """
+        One garbage-collection pass: expired ids, unreferenced blobs, stale
+        incoming files, then quota eviction.
+
+        Returns:
+            Counts of what was removed
+        """
+        now = time.time()
+        stats = {'expired_ids': 0, 'blobs_removed': 0, 'bytes_freed': 0, 'evicted_ids': 0, 'other': 0}
+        pinned = self._pinned_blobs()
+        with self._lock:
+            records = []
+            for record in self._records():
+                if self.ttl_s and now - record.last_access > max(self.ttl_s, GRACE_S) and record.blob not in pinned:
+                    stats['expired_ids'] += self.delete(record.id)
+                else:
+                    records.append(record)
+            stats['blobs_removed'], stats['bytes_freed'] = self._remove_unreferenced(records, now, pinned)
+
+            incoming_dir = os.path.join(self.root, self.INCOMING_DIR)
+            for name in os.listdir(incoming_dir):
+                path = os.path.join(incoming_dir, name)
+                try:
+                    if now - os.path.getmtime(path) > 3600:  # Left behind by a crashed worker
+                        os.remove(path)
+                        stats['other'] += 1
+                except FileNotFoundError:
+                    pass
+
+            if self.quota_bytes:
+                stats['evicted_ids'] = self._evict(self.quota_bytes, now)
+
+        if self.on_sweep:
+            try:
+                stats['other'] += self.on_sweep() or 0
+            except Exception as e:
+                logger.error(f"❌ Upload sweep hook failed: {e}")
+        if any(stats.values()):
+            logger.info(f"🧹 Upload sweep: {stats}")
+        return stats
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval_s):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"❌ Upload sweep failed: {e}")
+
+    def start(self):
+        """Start the background sweeper in this process (again after a fork)"""
+        if self._pid == os.getpid() or not (self.ttl_s or self.quota_bytes):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sweep_loop, name='upload-sweeper', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def stop(self):
+        self._stop.set()
+
+
+def from_env(root: str) -> UploadStore:
+    """
+    UploadStore from the environment.
+
+    UPLOAD_QUOTA_MB (10240, 0 = unlimited), UPLOAD_TTL_HOURS (24, 0 = keep
+    forever) and UPLOAD_SWEEP_INTERVAL_S (300).
+    """
+    store = UploadStore(
+        root,
+        quota_bytes=int(float(os.environ.get('UPLOAD_QUOTA_MB', '10240')) * 1024 * 1024),
+        ttl_s=float(os.environ.get('UPLOAD_TTL_HOURS', '24')) * 3600,
+        sweep_interval_s=float(os.environ.get('UPLOAD_SWEEP_INTERVAL_S', '300'))
+    )
+    logger.info(f"💾 Upload store: quota {store.quota_bytes // (1024 * 1024) or 'unlimited'} MB, "
+                f"TTL {store.ttl_s / 3600:g} h")
+    return store
@@ -0,0 +1,501 @@
+"""
+Background video analysis jobs.
+
+Each job decodes a video on a worker thread and appends NDJSON detection
+records to jobs/<job_id>/detections.ndjson. Progress is checkpointed to
+jobs/<job_id>/job.json (last processed frame + results byte offset), so a
+job interrupted by a restart resumes from its checkpoint instead of frame 0.
+
+Finished jobs (record, results and renders) are deleted retention_s after
+they end, so the directory and every listing of it stay bounded.
+
+Several processes (pre-forked web workers) can share one jobs directory: one
+process owns the queue (start(watch_disk=True)) and picks up jobs that the
+others (attach()) write to disk; cancellation crosses processes through a
+marker file in the job directory.
+"""
+import os
+import json
+import uuid
+import time
+import queue
+import shutil
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, asdict
+from typing import AsyncGenerator, Callable, Dict, Generator, List, Optional, Tuple
+
+import cv2
+
+from frame_sampler import AdaptiveFrameSampler
+from video_pipeline import iter_video_detections
+from inference_scheduler import inference_class, BATCH
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_INTERVAL_S = 2.0  # Max seconds of work lost on a crash
+DETECTOR_WAIT_S = 1.0  # Poll interval while the model is still loading
+DISK_SCAN_S = 1.0  # Owner process: poll interval for jobs submitted by attached processes
+CANCEL_MARKER = 'cancel'
+QUEUE_FULL_RETRY_S = 60  # Retry-After when max_queued jobs are already waiting
+PRUNE_INTERVAL_S = 600.0  # Owner process: how often finished jobs past retention are deleted
+
+
+class VideoJobError(Exception):
+    """Submission error carrying the HTTP status (and Retry-After) the route should return"""
+
+    def __init__(self, message: str, status: int = 400, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+@dataclass
+class VideoJob:
+    id: str
+    video_path: str
+    every_n: int = 2
+    adaptive: bool = True  # Adaptive stride (every_n is only used when False)
+    target_fps: float = 10.0  # Adaptive: frames analysed per video second while diseases are visible
+    min_speed: float = 1.0  # Adaptive: minimum processing speed relative to real time
+    status: str = 'queued'  # 'queued' | 'running' | 'complete' | 'failed' | 'cancelled'
+    total_frames: int = 0
+    source_fps: float = 0.0
+    last_frame: int = 0  # Checkpoint: last frame whose record is durable on disk
+    current_frame: int = 0  # Most recent frame processed (may be ahead of the checkpoint)
+    results_offset: int = 0  # Checkpoint: byte length of the NDJSON file at last_frame
+    records: int = 0
+    fps: float = 0.0  # Decode throughput (frames/s) of the current run
+    error: Optional[str] = None
+    resumed: int = 0  # Number of times this job was resumed from a checkpoint
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    updated_at: float = 0.0
+    finished_at: Optional[float] = None
+
+    @property
+    def progress(self) -> float:
+        if self.status == 'complete':
+            return 100.0
+        if self.total_frames <= 0:
+            return 0.0
+        return round(min(max(self.current_frame, self.last_frame) / self.total_frames, 1.0) * 100, 1)
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        if self.status != 'running' or self.fps <= 0 or self.total_frames <= 0:
+            return None
+        remaining = self.total_frames - max(self.current_frame, self.last_frame)
+        return round(max(remaining, 0) / self.fps, 1)
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), 'progress': self.progress, 'eta_seconds': self.eta_seconds}
+
+
+class VideoJobManager:
+    """
+    Queue + worker pool for video jobs with on-disk checkpoints.
+
+    Args:
+        jobs_dir: Directory holding one sub-directory per job
+        detector_provider: Callable returning the current detector (or None while loading)
+        num_workers: Number of concurrent jobs
+        max_queued: submit() refuses new jobs while this many are queued (None = no limit)
+        retention_s: Delete finished jobs this long after they end (0 = keep forever)
+    """
+
+    TERMINAL_STATES = ('complete', 'failed', 'cancelled')
+
+    def __init__(self, jobs_dir: str, detector_provider: Callable, num_workers: int = 1,
+                 max_queued: Optional[int] = None, retention_s: float = 0.0):
+        self.jobs_dir = jobs_dir
+        self.detector_provider = detector_provider
+        self.num_workers = max(1, num_workers)
+        self.max_queued = max_queued
+        self.retention_s = retention_s
+        self.jobs: Dict[str, VideoJob] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._cancelled = set()
+        self._lock = threading.Lock()
+        self._submit_lock = threading.Lock()  # Makes the max_queued check and the submission one step
+        self._workers: List[threading.Thread] = []
+        self.attached = False  # True when another process runs the jobs
+        # Attached mode: job.json records by id, re-read only when the file was replaced
+        self._disk_records: Dict[str, Tuple[Tuple[int, int], VideoJob]] = {}
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, job_id)
+
+    def results_path(self, job_id: str) -> str:
+        return os.path.join(self._job_dir(job_id), 'detections.ndjson')
+
+    def _save(self, job: VideoJob):
+        """Persist job state atomically"""
+        job.updated_at = time.time()
+        meta_path = os.path.join(self._job_dir(job.id), 'job.json')
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(asdict(job), f)
+        os.replace(tmp_path, meta_path)
+
+    def _load(self, job_id: str) -> Optional[VideoJob]:
+        meta_path = os.path.join(self._job_dir(job_id), 'job.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r') as f:
+                return VideoJob(**json.load(f))
+        except Exception as e:
+            logger.warning(f"⚠️ Skipping unreadable job {job_id}: {e}")
+            return None
+
+    def _load_cached(self, job_id: str) -> Optional[VideoJob]:
+        """_load() that parses job.json only when it changed since the last read (attached mode)"""
+        try:
+            st = os.stat(os.path.join(self._job_dir(job_id), 'job.json'))
+        except OSError:
+            self._disk_records.pop(job_id, None)
+            return None
+        version = (st.st_ino, st.st_mtime_ns)  # _save() replaces the file, so the inode changes too
+        cached = self._disk_records.get(job_id)
+        if cached and cached[0] == version:
+            return cached[1]
+        job = self._load(job_id)
+        if job is not None:
+            self._disk_records[job_id] = (version, job)
+        return job
+
+    def _all_jobs(self) -> List[VideoJob]:
+        if not self.attached:
+            return list(self.jobs.values())
+        job_ids = os.listdir(self.jobs_dir)
+        for gone in self._disk_records.keys() - set(job_ids):
+            self._disk_records.pop(gone, None)
+        return [job for job in map(self._load_cached, job_ids) if job]
+
+    def _recover(self):
+        """Reload jobs from disk and requeue the ones that never finished"""
+        for job_id in sorted(os.listdir(self.jobs_dir)):
+            job = self._load(job_id)
+            if job is None:
+                continue
+
+            self.jobs[job.id] = job
+            if job.status not in self.TERMINAL_STATES:
+                job.status = 'queued'
+                job.resumed += 1
+                self._save(job)
+                self._queue.put(job.id)
+                logger.info(f"♻️  Resuming video job {job.id} from frame {job.last_frame}")
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def start(self, watch_disk: bool = False):
+        """
+        Recover persisted jobs and start the worker threads
+        
+        Args:
+            watch_disk: Also pick up jobs and cancellations written by attached processes
+        """
+        if self._workers:
+            return
+        self.attached = False
+        self._recover()
+        self.prune()
+        for i in range(self.num_workers):
+            worker = threading.Thread(target=self._worker_loop, name=f"video-job-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        if watch_disk:
+            threading.Thread(target=self._scan_loop, name='video-job-scan', daemon=True).start()
+        if self.retention_s:
+            threading.Thread(target=self._prune_loop, name='video-job-prune', daemon=True).start()
+        logger.info(f"🎬 Video job workers started: {self.num_workers}")
+
+    def attach(self):
+        """Submit to / read from a jobs directory whose queue another process runs"""
+        self.attached = True
+
+    def prune(self) -> int:
+        """Delete finished jobs that ended more than retention_s ago; returns how many"""
+        if not self.retention_s or self.attached:
+            return 0
+        cutoff = time.time() - self.retention_s
+        with self._lock:
+            expired = [job for job in self.jobs.values()
+                       if job.status in self.TERMINAL_STATES and (job.finished_at or job.updated_at) < cutoff]
+            for job in expired:
+                del self.jobs[job.id]
+                self._cancelled.discard(job.id)
+        for job in expired:
+            shutil.rmtree(self._job_dir(job.id), ignore_errors=True)
+        if expired:
+            logger.info(f"🧹 Pruned {len(expired)} finished video jobs older than {self.retention_s / 3600:.0f} h")
+        return len(expired)
+
+    def _prune_loop(self):
+        while True:
+            time.sleep(PRUNE_INTERVAL_S)
+            try:
+                self.prune()
+            except Exception as e:
+                logger.warning(f"⚠️ Video job pruning failed: {e}")
+
+    def _scan_loop(self):
+        while True:
+            time.sleep(DISK_SCAN_S)
+            try:
+                for job_id in os.listdir(self.jobs_dir):
+                    job = self.jobs.get(job_id)
+                    if job is None:
+                        job = self._load(job_id)
+                        if job is None or job.status != 'queued':
+                            continue
+                        with self._lock:
+                            self.jobs[job.id] = job
+                        self._queue.put(job.id)
+                        logger.info(f"📥 Video job picked up from disk: {job.id}")
+                    if (job.status not in self.TERMINAL_STATES and job.id not in self._cancelled
+                            and os.path.exists(os.path.join(self._job_dir(job.id), CANCEL_MARKER))):
+                        self.cancel(job.id)
+            except Exception as e:
+                logger.warning(f"⚠️ Job directory scan failed: {e}")
+
+    def submit(self, video_path: str, every_n: Optional[int] = None, target_fps: float = 10.0,
+               min_speed: float = 1.0) -> VideoJob:
+        """
+        Queue a new video for background analysis (adaptive stride unless every_n is given).
+
+        Raises:
+            VideoJobError: 429 when max_queued jobs are already waiting
+        """
+        with self._submit_lock:
+            if self.max_queued is not None:
+                queued = self.count_by_status().get('queued', 0)
+                if queued >= self.max_queued:
+                    raise VideoJobError(f'Video job queue is full ({queued} queued), retry later',
+                                        status=429, retry_after=QUEUE_FULL_RETRY_S)
+            return self._submit(video_path, every_n, target_fps, min_speed)
+
+    def _submit(self, video_path: str, every_n: Optional[int], target_fps: float, min_speed: float) -> VideoJob:
+        now = time.time()
+        job = VideoJob(
+            id=uuid.uuid4().hex,
+            video_path=os.path.abspath(video_path),
+            every_n=max(1, int(every_n or 2)),
+            adaptive=every_n is None,
+            target_fps=float(target_fps),
+            min_speed=float(min_speed),
+            created_at=now,
+            updated_at=now
+        )
+        os.makedirs(self._job_dir(job.id), exist_ok=True)
+        open(self.results_path(job.id), 'wb').close()
+
+        self._save(job)
+        if self.attached:
+            # The owning process picks it up from disk
+            logger.info(f"📥 Video job written for the queue owner: {job.id} ({video_path})")
+            return job
+        with self._lock:
+            self.jobs[job.id] = job
+        self._queue.put(job.id)
+        logger.info(f"📥 Video job queued: {job.id} ({video_path})")
+        return job
+
+    def get(self, job_id: str) -> Optional[VideoJob]:
+        if self.attached:
+            # Progress is written by the owning process; read its latest checkpoint
+            return self._load_cached(os.path.basename(job_id))
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict]:
+        jobs = self._all_jobs()
+        return [job.to_dict() for job in sorted(jobs, key=lambda j: j.created_at, reverse=True)]
+
+    def count_by_status(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self._all_jobs():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def video_paths_in_use(self) -> List[str]:
+        """Videos of queued and running jobs"""
+        return [job.video_path for job in self._all_jobs() if job.status not in self.TERMINAL_STATES]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if not job or job.status in self.TERMINAL_STATES:
+            return False
+        if self.attached:
+            open(os.path.join(self._job_dir(job.id), CANCEL_MARKER), 'w').close()
+            return True
+        self._cancelled.add(job_id)
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            self._save(job)
+        return True
+
+    def stream_results(self, job_id: str, follow: bool = False,
+                       poll_interval: float = 0.5) -> Generator[bytes, None, None]:
+        """
+        Yield complete NDJSON lines from a job's results file.
+        With follow=True, keeps tailing the file until the job reaches a terminal state.
+        """
+        with open(self.results_path(job_id), 'rb') as f:
+            pending = b''
+            while True:
+                complete, pending = self._read_lines(f, pending)
+                if complete:
+                    yield complete
+                    continue
+                if self._tail_done(job_id, follow):
+                    break
+                time.sleep(poll_interval)
+
+    async def astream_results(self, job_id: str, follow: bool = False,
+                              poll_interval: float = 0.5) -> AsyncGenerator[bytes, None]:
+        """stream_results() for the ASGI event loop: waits for new lines without holding a thread"""
+        with open(self.results_path(job_id), 'rb') as f:
+            pending = b''
+            while True:
+                complete, pending = self._read_lines(f, pending)
+                if complete:
+                    yield complete
+                    continue
+                if self._tail_done(job_id, follow):
+                    break
+                await asyncio.sleep(poll_interval)
+
+    @staticmethod
+    def _read_lines(f, pending: bytes):
+        """(complete lines read so far, or b'' at end of file; the partial last line)"""
+        while True:
+            chunk = f.read(64 * 1024)
+            if not chunk:
+                return b'', pending
+            complete, _, pending = (pending + chunk).rpartition(b'\n')
+            if complete:
+                return complete + b'\n', pending
+
+    def _tail_done(self, job_id: str, follow: bool) -> bool:
+        job = self.get(job_id)
+        return not follow or job is None or job.status in self.TERMINAL_STATES
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _worker_loop(self):
+        while True:
+            job_id = self._queue.get()
+            job = self.jobs.get(job_id)
+            try:
+                if job and job.status == 'queued':
+                    # Lowest priority: runs in the model's idle time, aged so it still progresses under load
+                    with inference_class(BATCH):
+                        self._run(job)
+            except Exception as e:
+                logger.error(f"❌ Video job {job_id} failed: {e}")
+                job.status = 'failed'
+                job.error = str(e)
+                job.finished_at = time.time()
+                self._save(job)
+            finally:
+                self._queue.task_done()
+
+    def _wait_for_detector(self, job: VideoJob):
+        """Block until a detector is loaded (jobs resumed at startup race the model loader)"""
+        detector = self.detector_provider()
+        while detector is None:
+            if job.id in self._cancelled:
+                return None
+            time.sleep(DETECTOR_WAIT_S)
+            detector = self.detector_provider()
+        return detector
+
+    def _run(self, job: VideoJob):
+        if not os.path.exists(job.video_path):
+            raise FileNotFoundError(f"Video not found: {job.video_path}")
+
+        detector = self._wait_for_detector(job)
+        if detector is None:
+            self._mark_cancelled(job)
+            return
+
+        if not job.total_frames:
+            cap = cv2.VideoCapture(job.video_path)
+            job.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            job.source_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            cap.release()
+
+        job.status = 'running'
+        job.started_at = job.started_at or time.time()
+        self._save(job)
+        logger.info(f"🎬 Video job {job.id} running from frame {job.last_frame}/{job.total_frames}")
+
+        run_start = time.time()
+        start_frame = job.last_frame
+        job.current_frame = start_frame
+        last_checkpoint = run_start
+
+        with open(self.results_path(job.id), 'r+b') as out:
+            # Drop anything written after the last durable checkpoint
+            out.truncate(job.results_offset)
+            job.records = sum(block.count(b'\n') for block in iter(lambda: out.read(1024 * 1024), b''))
+            out.seek(job.results_offset)
+
+            sampler = None
+            if job.adaptive:
+                sampler = AdaptiveFrameSampler(job.source_fps, target_fps=job.target_fps, min_speed=job.min_speed)
+
+            for record in iter_video_detections(detector, job.video_path, job.every_n,
+                                                start_frame=start_frame, sampler=sampler):
+                if job.id in self._cancelled:
+                    break
+
+                out.write((json.dumps(record) + '\n').encode('utf-8'))
+                job.records += 1
+                job.current_frame = record['frame']
+                job.fps = round((job.current_frame - start_frame) / max(time.time() - run_start, 1e-6), 2)
+
+                if time.time() - last_checkpoint >= CHECKPOINT_INTERVAL_S:
+                    self._checkpoint(job, out, job.current_frame)
+                    last_checkpoint = time.time()
+
+            cancelled = job.id in self._cancelled
+            # On a clean finish the trailing unprocessed frames were decoded as well
+            end_frame = job.current_frame if cancelled else max(job.current_frame, job.total_frames)
+            self._checkpoint(job, out, end_frame)
+
+        if cancelled:
+            self._mark_cancelled(job)
+            return
+
+        job.status = 'complete'
+        job.finished_at = time.time()
+        self._save(job)
+        logger.info(f"✅ Video job {job.id} complete: {job.records} records")
+
+    def _checkpoint(self, job: VideoJob, out, frame_no: int):
+        """Make results durable up to frame_no and record the resume point"""
+        out.flush()
+        os.fsync(out.fileno())
+        job.last_frame = frame_no
+        job.results_offset = out.tell()
+        self._save(job)
+
+    def _mark_cancelled(self, job: VideoJob):
+        job.status = 'cancelled'
+        job.finished_at = time.time()
+        self._save(job)
+        logger.info(f"🛑 Video job cancelled: {job.id}")
@@ -0,0 +1,119 @@
+"""
+Video detection pipeline - shared frame loop for uploaded video files.
+Used by the NDJSON streaming route and by background video jobs.
+"""
+import cv2
+import time
+import logging
+from typing import Dict, Generator, Optional
+
+from frame_sampler import AdaptiveFrameSampler
+
+logger = logging.getLogger(__name__)
+
+
+def open_video_at(video_path: str, start_frame: int = 0) -> cv2.VideoCapture:
+    """
+    Open a video positioned so the next read returns frame number start_frame + 1.
+
+    Tries a direct seek first; if the container reports a different position
+    (inexact seeking in some codecs) it reopens and skips with grab(), which
+    avoids the cost of retrieving/converting the skipped frames.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if start_frame <= 0 or not cap.isOpened():
+        return cap
+
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == start_frame:
+        return cap
+
+    logger.debug("Inexact seek in %s, skipping %d frames with grab()", video_path, start_frame)
+    cap.release()
+    cap = cv2.VideoCapture(video_path)
+    for _ in range(start_frame):
+        if not cap.grab():
+            break
+    return cap
+
+
+def source_timestamp(cap: cv2.VideoCapture, frame_number: int, fps: float) -> float:
+    """Presentation time (seconds) of the frame last grabbed from cap"""
+    pos_msec = cap.get(cv2.CAP_PROP_POS_MSEC)
+    if pos_msec and pos_msec > 0:
+        return round(pos_msec / 1000.0, 3)
+    return round((frame_number - 1) / fps, 3) if fps > 0 else 0.0
+
+
+def iter_video_detections(detector, video_path: str, every_n: int = 2, start_frame: int = 0,
+                          sampler: Optional[AdaptiveFrameSampler] = None, profile=None) -> Generator[Dict, None, None]:
+    """
+    Decode a video file sequentially and run detection on a subset of frames.
+
+    Args:
+        detector: Loaded YOLODetector (anything exposing predict_frame)
+        video_path: Path to a video file readable by OpenCV
+        every_n: Process every Nth frame (fixed stride, ignored when sampler is given)
+        start_frame: Number of frames already processed (resume point)
+        sampler: Adaptive stride controller; picks frames from latency and activity
+        profile: Optional InferenceProfile passed through to the detector
+
+    Yields:
+        {'frame': int, 'timestamp': float, 'detections': [...], 'frame_size': [h, w]}
+        with boxes normalized to 0-1 and timestamp in source seconds
+    """
+    cap = open_video_at(video_path, start_frame)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    frame_count = start_frame
+    if sampler:
+        sampler.next_frame = start_frame + 1
+
+    try:
+        while cap.isOpened():
+            # grab() only demuxes/decodes; retrieve() is skipped for frames we don't process
+            if not cap.grab():
+                break
+
+            frame_count += 1
+
+            if sampler:
+                if not sampler.should_process(frame_count):
+                    continue
+            elif frame_count % every_n != 0:
+                continue
+
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+
+            timestamp = source_timestamp(cap, frame_count, fps)
+            started = time.perf_counter()
+            result = detector.predict_frame(frame, profile=profile) if profile else detector.predict_frame(frame)
+            detections = result.get('detections', [])
+            if sampler:
+                sampler.update(time.perf_counter() - started, len(detections), timestamp, frame_count)
+
+            h, w = frame.shape[:2]
+            boxes = []
+            for det in detections:
+                x1, y1, x2, y2 = det['x1'], det['y1'], det['x2'], det['y2']
+                boxes.append({
+                    'class': det['class_name'],
+                    'conf': round(det['confidence'] * 100, 1),
+                    'x1': round(x1 / w, 4),
+                    'y1': round(y1 / h, 4),
+                    'x2': round(x2 / w, 4),
+                    'y2': round(y2 / h, 4)
+                })
+
+            record = {
+                'frame': frame_count,
+                'timestamp': timestamp,
+                'detections': boxes,
+                'frame_size': [h, w]
+            }
+            if sampler:
+                record['stride'] = sampler.stride
+            yield record
+    finally:
+        cap.release()
@@ -0,0 +1,250 @@
+"""
+Annotated video rendering.
+
+Turns a video plus its NDJSON detection records into an annotated MP4:
+  - decode + draw on the calling thread
+  - encode on a dedicated thread fed through a bounded queue, so a slow
+    encoder applies back-pressure instead of buffering decoded frames
+  - label glyphs (class name, confidence) are rendered once and cached,
+    instead of calling cv2.getTextSize/putText for every box on every frame
+"""
+import os
+import json
+import queue
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 0.6
+FONT_THICKNESS = 1
+LABEL_PAD = 4
+BOX_THICKNESS = 2
+
+# BGR palette; classes are assigned colours deterministically by name
+PALETTE = [
+    (0, 255, 0), (0, 165, 255), (255, 128, 0), (255, 0, 255),
+    (0, 255, 255), (128, 0, 255), (255, 255, 0), (0, 128, 255)
+]
+
+
+class LabelGlyphCache:
+    """
+    Pre-rendered label patches.
+
+    Class-name glyphs are cached per (class, colour) and confidence glyphs per
+    integer percent, so steady-state drawing is a pair of numpy slice copies.
+    """
+
+    def __init__(self):
+        self._names: Dict[Tuple[str, Tuple[int, int, int]], np.ndarray] = {}
+        self._confs: Dict[Tuple[int, Tuple[int, int, int]], np.ndarray] = {}
+        self._colors: Dict[str, Tuple[int, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def color_for(self, class_name: str) -> Tuple[int, int, int]:
+        color = self._colors.get(class_name)
+        if color is None:
+            color = PALETTE[sum(class_name.encode('utf-8')) % len(PALETTE)]
+            self._colors[class_name] = color
+        return color
+
+    @staticmethod
+    def _render(text: str, color: Tuple[int, int, int]) -> np.ndarray:
+        (text_w, text_h), baseline = cv2.getTextSize(text, FONT, FONT_SCALE, FONT_THICKNESS)
+        patch = np.empty((text_h + baseline + LABEL_PAD, text_w + LABEL_PAD, 3), dtype=np.uint8)
+        patch[:] = color
+        cv2.putText(patch, text, (LABEL_PAD // 2, text_h + LABEL_PAD // 2), FONT, FONT_SCALE,
+                    (0, 0, 0), FONT_THICKNESS, cv2.LINE_AA)
+        return patch
+
+    def name_glyph(self, class_name: str, color: Tuple[int, int, int]) -> np.ndarray:
+        key = (class_name, color)
+        glyph = self._names.get(key)
+        if glyph is None:
+            with self._lock:
+                glyph = self._names.setdefault(key, self._render(f"{class_name} ", color))
+        return glyph
+
+    def conf_glyph(self, percent: int, color: Tuple[int, int, int]) -> np.ndarray:
+        key = (percent, color)
+        glyph = self._confs.get(key)
+        if glyph is None:
+            with self._lock:
+                glyph = self._confs.setdefault(key, self._render(f"{percent}%", color))
+        return glyph
+
+    def draw_label(self, frame: np.ndarray, x: int, y: int, class_name: str, confidence: float,
+                   color: Tuple[int, int, int]):
+        """Blit '<class> <conf>%' with its bottom-left corner at (x, y), clipped to the frame"""
+        percent = int(round(confidence * 100 if confidence <= 1 else confidence))
+        name = self.name_glyph(class_name, color)
+        conf = self.conf_glyph(max(0, min(percent, 100)), color)
+
+        label_h = max(name.shape[0], conf.shape[0])
+        top = y - label_h if y - label_h >= 0 else y
+        for glyph in (name, conf):
+            _blit(frame, glyph, x, top)
+            x += glyph.shape[1]
+
+
+def _blit(frame: np.ndarray, patch: np.ndarray, x: int, y: int):
+    """Copy patch into frame at (x, y), clipping at the frame edges"""
+    fh, fw = frame.shape[:2]
+    ph, pw = patch.shape[:2]
+    if x >= fw or y >= fh or x + pw <= 0 or y + ph <= 0:
+        return
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + pw, fw), min(y + ph, fh)
+    frame[y0:y1, x0:x1] = patch[y0 - y:y1 - y, x0 - x:x1 - x]
+
+
+# Shared by the renderer and RealtimeYOLO.draw_detections
+glyph_cache = LabelGlyphCache()
+
+
+def draw_normalized_detections(frame: np.ndarray, detections: Iterable[Dict],
+                               glyphs: LabelGlyphCache = glyph_cache) -> np.ndarray:
+    """
+    Draw NDJSON-style detections (x1/y1/x2/y2 normalized 0-1, conf in percent) in place
+    """
+    h, w = frame.shape[:2]
+    for det in detections:
+        x1, y1 = int(det['x1'] * w), int(det['y1'] * h)
+        x2, y2 = int(det['x2'] * w), int(det['y2'] * h)
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(w - 1, x2), min(h - 1, y2)
+        if x2 <= x1 or y2 <= y1:
+            continue
+        class_name = det.get('class', 'Unknown')
+        color = glyphs.color_for(class_name)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, BOX_THICKNESS)
+        glyphs.draw_label(frame, x1, y1, class_name, det.get('conf', 0), color)
+    return frame
+
+
+class AnnotatedVideoWriter:
+    """
+    cv2.VideoWriter running on its own thread behind a bounded queue.
+
+    write() blocks when the queue is full, which throttles decoding to the
+    encoder's pace and keeps memory bounded to queue_size frames.
+    """
+
+    CODECS = ('avc1', 'mp4v')  # Prefer browser-playable H.264 when the OpenCV build has it
+
+    def __init__(self, output_path: str, fps: float, frame_size: Tuple[int, int], queue_size: int = 32):
+        self.output_path = output_path
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.frame_size = frame_size  # (width, height)
+        self.frames_written = 0
+        self.error: Optional[Exception] = None
+        self._queue: "queue.Queue[Optional[np.ndarray]]" = queue.Queue(maxsize=queue_size)
+        self._writer = self._open_writer()
+        self._thread = threading.Thread(target=self._encode_loop, name='video-encoder', daemon=True)
+        self._thread.start()
+
+    def _open_writer(self) -> cv2.VideoWriter:
+        for codec in self.CODECS:
+            writer = cv2.VideoWriter(self.output_path, cv2.VideoWriter_fourcc(*codec), self.fps, self.frame_size)
+            if writer.isOpened():
+                logger.debug(f"Encoder opened with codec {codec}")
+                return writer
+            writer.release()
+        raise RuntimeError(f"No usable video encoder for {self.output_path}")
+
+    def _encode_loop(self):
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                self._writer.write(frame)
+                self.frames_written += 1
+        except Exception as e:
+            self.error = e
+            logger.error(f"❌ Encoder thread failed: {e}")
+            # Drain so producers blocked on put() can finish
+            while self._queue.get() is not None:
+                pass
+        finally:
+            self._writer.release()
+
+    def write(self, frame: np.ndarray):
+        if self.error:
+            raise RuntimeError(f"Encoder failed: {self.error}")
+        self._queue.put(frame)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self.error:
+            raise RuntimeError(f"Encoder failed: {self.error}")
+
+
+def _iter_records(results_path: str):
+    with open(results_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def render_annotated_video(video_path: str, results_path: str, output_path: str,
+                           hold_frames: Optional[int] = None, queue_size: int = 32) -> Dict:
+    """
+    Render an annotated copy of video_path using the detection records in results_path.
+
+    Records only exist for sampled frames, so each record's boxes are held on the
+    following frames until the next record (or for hold_frames frames, if set).
+    The file is written to a temporary name and renamed when complete.
+
+    Returns:
+        {'output_path', 'frames', 'annotated_frames'}
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    tmp_path = output_path + '.part.mp4'
+
+    records = _iter_records(results_path)
+    pending = next(records, None)
+    current: List[Dict] = []
+    current_frame = 0
+    frame_no = 0
+    annotated = 0
+
+    writer = AnnotatedVideoWriter(tmp_path, fps, size, queue_size=queue_size)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_no += 1
+
+            # Advance to the latest record at or before this frame (records are frame-ordered)
+            while pending is not None and pending['frame'] <= frame_no:
+                current, current_frame = pending['detections'], pending['frame']
+                pending = next(records, None)
+
+            if current and (hold_frames is None or frame_no - current_frame < hold_frames):
+                # The decoded frame is ours; draw in place instead of copying
+                draw_normalized_detections(frame, current)
+                annotated += 1
+
+            writer.write(frame)
+    finally:
+        cap.release()
+        writer.close()
+
+    os.replace(tmp_path, output_path)
+    logger.info(f"🎞️  Rendered {frame_no} frames ({annotated} annotated) -> {output_path}")
+    return {'output_path': output_path, 'frames': frame_no, 'annotated_frames': annotated}
@@ -4,21 +4,31 @@ Optimized for crop disease detection with Ultralytics YOLOv8/v11
 """
 import os
 import cv2
+import threading
 import numpy as np
 from pathlib import Path
 from typing import List, Dict, Optional
+import time
 import logging
-import torch
+from contextlib import ExitStack, nullcontext
+
+from letterbox import LetterboxPreprocessor, LetterboxMeta, tile_windows
+from inference_scheduler import FrameExpired
+import tracing
 
 logger = logging.getLogger(__name__)
 
+TILE_MERGE_IOU = 0.5  # Boxes of one class from overlapping tiles above this IoU are duplicates
+
 class YOLODetector:
     """
     Singleton YOLO detector with lazy model loading and inference optimization
     Supports both image and frame inference
     """
     
-    def __init__(self, model_path: Optional[str] = None, conf_threshold: float = 0.25, device: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, conf_threshold: float = 0.25, device: Optional[str] = None,
+                 imgsz: int = 640, warmup: Optional[bool] = None, prepare_in_background: bool = True,
+                 scheduler=None):
         """
         Initialize YOLO detector
         
@@ -26,10 +36,29 @@ class YOLODetector:
             model_path: Path to YOLO model (.pt file)
             conf_threshold: Confidence threshold (0-1)
             device: 'cpu', '0' (GPU), or 'cuda'
+            imgsz: Square model input size for frame inference
+            warmup: Run a warm-up inference after loading (default: MODEL_WARMUP env, on)
+            prepare_in_background: Write the model-cache artifact on a thread (False writes it
+                inline, e.g. in a pre-fork master where no thread may be running at fork time)
+            scheduler: Optional InferenceScheduler; every forward pass then waits for a slot
+                in the caller's priority class (may raise FrameExpired)
         """
+        # torch/Ultralytics are imported here rather than at module import, so only
+        # processes that actually build a detector pay for the ML stack
+        started = time.perf_counter()
+        import torch
+        self.timings: Dict[str, float] = {'import_torch_ms': round((time.perf_counter() - started) * 1000, 1)}
+        self.cache_status = 'disabled'
+        
         self.conf_threshold = conf_threshold
         self.device = device or ('0' if torch.cuda.is_available() else 'cpu')
         self.model = None
+        # Frames are letterboxed into reusable buffers instead of Ultralytics' per-call allocations
+        self.preprocessor = LetterboxPreprocessor(imgsz)
+        self.fast_preprocess = os.environ.get('YOLO_FAST_PREPROCESS', '1') != '0'
+        self._warmup = os.environ.get('MODEL_WARMUP', '1') != '0' if warmup is None else warmup
+        self._prepare_in_background = prepare_in_background
+        self.scheduler = scheduler
         self.model_path = None
         # Always use best_wheat_yolo.pt in backend/model if available
         forced_model_path = os.path.join('backend', 'model', 'best_wheat_yolo.pt')
@@ -110,22 +139,64 @@ class YOLODetector:
         return 'yolov11n.pt'
     
     def _load_model(self):
-        """Load YOLO model to specified device"""
+        """
+        Load YOLO model to specified device
+        
+        Loads a prepared (fused/exported) artifact from the model cache when one
+        exists for this weights file + device; otherwise loads the .pt, warms up
+        and prepares the artifact in the background for the next start.
+        Per-phase durations are recorded in self.timings.
+        """
         try:
+            started = time.perf_counter()
             from ultralytics import YOLO
+            self._mark('import_ultralytics_ms', started)
             
-            logger.info(f"📦 Loading YOLO model: {self.model_path}")
-            logger.info(f"🖥️  Device: {self.device} (GPU available: {torch.cuda.is_available()})")
+            cache = None
+            load_path = self.model_path
+            if os.environ.get('MODEL_CACHE', '1') != '0':
+                started = time.perf_counter()
+                try:
+                    from model_cache import ModelCache
+                    cache = ModelCache()
+                    cached = cache.lookup(self.model_path, self.device, self.preprocessor.imgsz)
+                    self.cache_status = 'hit' if cached else 'miss'
+                    load_path = cached or self.model_path
+                except Exception as e:
+                    logger.warning(f"⚠️  Model cache unavailable: {e}")
+                    cache, self.cache_status = None, 'error'
+                self._mark('cache_lookup_ms', started)
             
-            self.model = YOLO(self.model_path)
-            self.model.to(self.device)
+            logger.info(f"📦 Loading YOLO model: {load_path} (cache: {self.cache_status})")
+            logger.info(f"🖥️  Device: {self.device}")
             
-            # Test inference to ensure model is ready
-            logger.info("🧪 Running test inference...")
-            test_frame = np.zeros((640, 640, 3), dtype=np.uint8)
-            _ = self.model.predict(test_frame, conf=0.5, verbose=False)
+            started = time.perf_counter()
+            try:
+                self.model = YOLO(load_path, task='detect')
+                if self.cache_status != 'hit' or cache.format == 'fused':
+                    self.model.to(self.device)  # Exported graphs are already bound to their device
+            except Exception as e:
+                if self.cache_status != 'hit':
+                    raise
+                # Corrupt or incompatible artifact: fall back to the source weights
+                logger.warning(f"⚠️  Cached model failed to load ({e}); loading source weights")
+                self.cache_status = 'invalid'
+                self.model = YOLO(self.model_path)
+                self.model.to(self.device)
+            self._mark('load_ms', started)
+            
+            if self._warmup:
+                self.warmup()
             
-            logger.info(f"✅ Model loaded successfully!")
+            if cache is not None and self.cache_status in ('miss', 'invalid'):
+                args = (self.model, self.model_path, self.device, self.preprocessor.imgsz)
+                if self._prepare_in_background:
+                    # Preparing the artifact must not delay readiness of this process
+                    threading.Thread(target=cache.store, args=args, name='model-cache-store', daemon=True).start()
+                else:
+                    cache.store(*args)
+            
+            logger.info(f"✅ Model loaded successfully! Timings: {self.timings}")
             logger.info(f"   Model: {self.model.model_name if hasattr(self.model, 'model_name') else 'YOLO'}")
             logger.info(f"   Classes: {len(self.model.names)}")
             logger.info(f"   Task: {self.model.task if hasattr(self.model, 'task') else 'detect'}")
@@ -134,13 +205,33 @@ class YOLODetector:
             logger.error(f"❌ Failed to load model: {e}")
             raise RuntimeError(f"Model loading failed: {e}")
     
-    def predict(self, image_path: str, conf_threshold: Optional[float] = None) -> Dict:
+    def warmup(self):
+        """Warm-up inference (predictor setup, cuDNN autotune, preprocessing buffers)"""
+        logger.info("🧪 Running warm-up inference...")
+        started = time.perf_counter()
+        imgsz = self.preprocessor.imgsz
+        self._infer_frames([np.zeros((imgsz, imgsz, 3), dtype=np.uint8)], 0.5)
+        self._mark('warmup_ms', started)
+    
+    def set_device(self, device: str):
+        """Move the loaded model to another device (e.g. a GPU after a CPU load in a pre-fork master)"""
+        if str(device) == str(self.device):
+            return
+        self.model.to(device)
+        self.device = device
+        logger.info(f"🖥️  Model moved to device: {device}")
+    
+    def _mark(self, phase: str, started: float):
+        self.timings[phase] = round((time.perf_counter() - started) * 1000, 1)
+    
+    def predict(self, image_path: str, conf_threshold: Optional[float] = None, profile=None) -> Dict:
         """
         Run YOLO inference on single image
         
         Args:
             image_path: Path to image file
             conf_threshold: Optional override of confidence threshold
+            profile: Optional InferenceProfile (resolution, NMS, precision, tiling)
         
         Returns:
             Dict containing:
@@ -154,23 +245,38 @@ class YOLODetector:
         
         try:
             # Read image
-            img = cv2.imread(image_path)
+            with tracing.span('yolo.read'):
+                img = cv2.imread(image_path)
             if img is None:
                 raise ValueError(f"Cannot read image: {image_path}")
             
             h, w = img.shape[:2]
-            conf = conf_threshold or self.conf_threshold
+            conf = conf_threshold or (profile and profile.conf) or self.conf_threshold
+            
+            if profile is not None:
+                # Profiles go through the frame path (own letterbox size, optional tiling)
+                frame_detections = self._predict_with_profile([img], conf, profile)[0]
+                detections = self._to_image_detections(frame_detections, h, w)
+                return {
+                    'image_path': str(image_path),
+                    'image_shape': [h, w],
+                    'detections': detections,
+                    'detection_count': len(detections),
+                    'profile': profile.name
+                }
             
             # Run inference
-            results = self.model.predict(
-                source=image_path,
-                conf=conf,
-                device=self.device,
-                verbose=False
-            )
+            with self._slot(), tracing.span('yolo.forward', frames=1):
+                results = self.model.predict(
+                    source=image_path,
+                    conf=conf,
+                    device=self.device,
+                    verbose=False
+                )
             
             # Extract detections
-            detections = self._extract_detections(results, h, w)
+            with tracing.span('yolo.postprocess'):
+                detections = self._extract_detections(results, h, w)
             
             return {
                 'image_path': str(image_path),
@@ -180,16 +286,17 @@ class YOLODetector:
             }
         
         except Exception as e:
-            logger.error(f"❌ Prediction error for {image_path}: {e}")
+            logger.error("❌ Prediction error for %s: %s", image_path, e)
             raise
     
-    def predict_frame(self, frame: np.ndarray, conf_threshold: Optional[float] = None) -> Dict:
+    def predict_frame(self, frame: np.ndarray, conf_threshold: Optional[float] = None, profile=None) -> Dict:
         """
         Run YOLO inference on video frame (optimized for speed)
         
         Args:
             frame: np.ndarray BGR image from OpenCV
             conf_threshold: Optional override
+            profile: Optional InferenceProfile (resolution, NMS, precision, tiling)
         
         Returns:
             Dict with frame_shape and detections (pixel coordinates for direct rendering)
@@ -199,62 +306,206 @@ class YOLODetector:
         
         try:
             h, w = frame.shape[:2]
-            conf = conf_threshold or self.conf_threshold
+            conf = conf_threshold or (profile and profile.conf) or self.conf_threshold
             
-            # Run inference
-            results = self.model.predict(
-                source=frame,
-                conf=conf,
-                device=self.device,
-                verbose=False
-            )
-            
-            # Extract detections in pixel coordinates
-            detections = []
-            if results and len(results) > 0:
-                result = results[0]
-                boxes = result.boxes
-                
-                for box in boxes:
-                    try:
-                        xyxy = box.xyxy[0].cpu().numpy()
-                        conf = float(box.conf[0].cpu().item())
-                        cls_id = int(box.cls[0].cpu().item())
-                        
-                        x1, y1, x2, y2 = xyxy.astype(int)
-                        
-                        # Get class name
-                        class_name = result.names.get(cls_id, f"Class_{cls_id}")
-                        
-                        # Apply Custom Rule: Rename "Mite" -> "Human Interference"
-                        if str(class_name).lower() == 'mite':
-                            class_name = "Human Interference"
-                        
-                        detections.append({
-                            'class_name': str(class_name),
-                            'confidence': round(float(conf), 3),
-                            'x1': int(x1),
-                            'y1': int(y1),
-                            'x2': int(x2),
-                            'y2': int(y2),
-                            'width': int(x2 - x1),
-                            'height': int(y2 - y1),
-                            'center_x': int((x1 + x2) / 2),
-                            'center_y': int((y1 + y2) / 2)
-                        })
-                    except Exception as e:
-                        logger.debug(f"Error extracting box: {e}")
-                        continue
+            # Run inference; detections come back in source-frame pixel coordinates
+            detections = self._predict_with_profile([frame], conf, profile)[0]
             
             return {
                 'frame_shape': [h, w],
                 'detections': detections
             }
         
+        except FrameExpired:
+            raise
         except Exception as e:
-            logger.error(f"❌ Frame prediction error: {e}")
+            logger.error("❌ Frame prediction error: %s", e)
             return {'frame_shape': [h, w], 'detections': []}
     
+    def predict_frames(self, frames: List[np.ndarray], conf_threshold: Optional[float] = None,
+                       profile=None) -> List[Dict]:
+        """
+        Run YOLO inference on a batch of video frames in a single forward pass
+        
+        Args:
+            frames: List of BGR images from OpenCV
+            conf_threshold: Optional override
+            profile: Optional InferenceProfile (resolution, NMS, precision, tiling)
+        
+        Returns:
+            One predict_frame-style dict per input frame, in order
+        """
+        if not self.model:
+            raise RuntimeError("Model not loaded")
+        if not frames:
+            return []
+        
+        conf = conf_threshold or (profile and profile.conf) or self.conf_threshold
+        try:
+            batch_detections = self._predict_with_profile(list(frames), conf, profile)
+            return [
+                {'frame_shape': list(frame.shape[:2]), 'detections': detections}
+                for frame, detections in zip(frames, batch_detections)
+            ]
+        except FrameExpired:
+            raise
+        except Exception as e:
+            logger.error("❌ Batch prediction error: %s", e)
+            return [{'frame_shape': list(frame.shape[:2]), 'detections': []} for frame in frames]
+    
+    def _predict_kwargs(self, profile=None) -> Dict:
+        """Ultralytics predict() arguments for a profile (model defaults when None)"""
+        if profile is None:
+            return {'imgsz': self.preprocessor.imgsz}
+        return {
+            'imgsz': profile.tile_size if profile.tile else profile.imgsz,
+            'iou': profile.iou,
+            'max_det': profile.max_det,
+            'half': profile.half and self.device != 'cpu',  # FP16 only pays off (and works) on GPU
+            'classes': profile.classes
+        }
+    
+    def _slot(self):
+        """Scheduler slot for one forward pass (no-op without a scheduler)"""
+        return self.scheduler.slot() if self.scheduler is not None else nullcontext()
+    
+    def _predict_with_profile(self, frames: List[np.ndarray], conf: float, profile=None) -> List[List[Dict]]:
+        with self._slot():
+            if profile is not None and profile.tile:
+                return [self._infer_tiled(frame, conf, profile) for frame in frames]
+            return self._infer_frames(frames, conf, profile)
+    
+    def _infer_tiled(self, frame: np.ndarray, conf: float, profile) -> List[Dict]:
+        """
+        Scan a frame at profile.imgsz effective resolution as overlapping tiles.
+        
+        Each window covers tile_size * (long side / imgsz) source pixels, so after its
+        single letterbox resize it is seen at imgsz/long-side scale; all tiles of the
+        frame run as one batch and duplicates along the overlaps are suppressed.
+        """
+        h, w = frame.shape[:2]
+        window = max(32, int(round(profile.tile_size * max(h, w) / profile.imgsz)))
+        windows = tile_windows(h, w, window, profile.tile_overlap)
+        tiles = [frame[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+        
+        detections = []
+        for (x0, y0, _, _), tile_detections in zip(windows, self._infer_frames(tiles, conf, profile)):
+            for det in tile_detections:
+                det['x1'] += x0
+                det['x2'] += x0
+                det['y1'] += y0
+                det['y2'] += y0
+                det['center_x'] += x0
+                det['center_y'] += y0
+                detections.append(det)
+        return self._merge_tile_detections(detections) if len(windows) > 1 else detections
+    
+    @staticmethod
+    def _merge_tile_detections(detections: List[Dict]) -> List[Dict]:
+        """Class-aware NMS over detections gathered from overlapping tiles"""
+        merged = []
+        by_class: Dict[str, List[Dict]] = {}
+        for det in detections:
+            by_class.setdefault(det['class_name'], []).append(det)
+        for dets in by_class.values():
+            boxes = [[d['x1'], d['y1'], d['width'], d['height']] for d in dets]
+            scores = [d['confidence'] for d in dets]
+            keep = cv2.dnn.NMSBoxes(boxes, scores, 0.0, TILE_MERGE_IOU)
+            merged.extend(dets[int(i)] for i in np.array(keep).flatten())
+        merged.sort(key=lambda d: d['confidence'], reverse=True)
+        return merged
+    
+    def _infer_frames(self, frames: List[np.ndarray], conf: float, profile=None) -> List[List[Dict]]:
+        """
+        Run the model on BGR frames and return pixel-space detections per frame.
+        
+        The fast path letterboxes into the preprocessor's reusable buffers and feeds
+        the model a tensor view of them, so each frame is resized exactly once. If the
+        installed Ultralytics rejects tensor input it falls back to ndarray input.
+        """
+        kwargs = self._predict_kwargs(profile)
+        if self.fast_preprocess:
+            try:
+                # The tensor is a view of a buffer set checked out for this call alone
+                with ExitStack() as checkout:
+                    with tracing.span('yolo.preprocess', frames=len(frames)):
+                        batch, metas = checkout.enter_context(self.preprocessor.prepared(frames, kwargs['imgsz']))
+                    with tracing.span('yolo.forward', frames=len(frames)):
+                        results = self.model.predict(
+                            source=_torch().from_numpy(batch),
+                            conf=conf,
+                            device=self.device,
+                            verbose=False,
+                            **kwargs
+                        )
+                with tracing.span('yolo.postprocess'):
+                    return [self._extract_frame_detections(result, meta) for result, meta in zip(results, metas)]
+            except Exception as e:
+                logger.warning("⚠️  Fast preprocessing unavailable (%s); using Ultralytics preprocessing", e)
+                self.fast_preprocess = False
+        
+        with tracing.span('yolo.forward', frames=len(frames), fast_preprocess=False):
+            results = self.model.predict(
+                source=frames if len(frames) > 1 else frames[0],
+                conf=conf,
+                device=self.device,
+                verbose=False,
+                **kwargs
+            )
+        with tracing.span('yolo.postprocess'):
+            return [self._extract_frame_detections(result) for result in results]
+    
+    @staticmethod
+    def _extract_frame_detections(result, meta: Optional[LetterboxMeta] = None) -> List[Dict]:
+        """
+        Extract detections in pixel coordinates from a single YOLO result
+        
+        Args:
+            result: Ultralytics result
+            meta: Letterbox geometry when the model ran on a preprocessed buffer
+        """
+        detections = []
+        if result.boxes is None or len(result.boxes) == 0:
+            return detections
+        
+        # One device->host copy per result instead of three per box
+        all_xyxy = result.boxes.xyxy.cpu().numpy()
+        if meta is not None:
+            all_xyxy = meta.to_source(all_xyxy)
+        all_conf = result.boxes.conf.cpu().numpy()
+        all_cls = result.boxes.cls.cpu().numpy()
+        
+        for xyxy, conf, cls_id in zip(all_xyxy, all_conf, all_cls):
+            try:
+                cls_id = int(cls_id)
+                x1, y1, x2, y2 = xyxy.astype(int)
+                
+                # Get class name
+                class_name = result.names.get(cls_id, f"Class_{cls_id}")
+                
+                # Apply Custom Rule: Rename "Mite" -> "Human Interference"
+                if str(class_name).lower() == 'mite':
+                    class_name = "Human Interference"
+                
+                detections.append({
+                    'class_id': cls_id,
+                    'class_name': str(class_name),
+                    'confidence': round(float(conf), 3),
+                    'x1': int(x1),
+                    'y1': int(y1),
+                    'x2': int(x2),
+                    'y2': int(y2),
+                    'width': int(x2 - x1),
+                    'height': int(y2 - y1),
+                    'center_x': int((x1 + x2) / 2),
+                    'center_y': int((y1 + y2) / 2)
+                })
+            except Exception as e:
+                logger.debug("Error extracting box: %s", e)
+                continue
+        
+        return detections
+    
     @staticmethod
     def _extract_detections(results, h: int, w: int) -> List[Dict]:
         """Extract detections from YOLO results with normalization"""
@@ -311,16 +562,39 @@ class YOLODetector:
                     'area_percent': round(area_percent, 2)
                 })
             except Exception as e:
-                logger.debug(f"Error processing box: {e}")
+                logger.debug("Error processing box: %s", e)
                 continue
         
         return detections
     
+    @staticmethod
+    def _to_image_detections(frame_detections: List[Dict], h: int, w: int) -> List[Dict]:
+        """Convert pixel-space frame detections into predict()'s normalized image format"""
+        detections = []
+        for det in frame_detections:
+            norm_w = det['width'] / w
+            norm_h = det['height'] / h
+            detections.append({
+                'class_id': det['class_id'],
+                'class_name': det['class_name'],
+                'confidence': det['confidence'],
+                'bbox_normalized': {
+                    'x': round(det['x1'] / w, 4),
+                    'y': round(det['y1'] / h, 4),
+                    'width': round(norm_w, 4),
+                    'height': round(norm_h, 4)
+                },
+                'bbox_pixel': {k: det[k] for k in ('x1', 'y1', 'x2', 'y2', 'width', 'height')},
+                'area_percent': round(norm_w * norm_h * 100.0, 2)
+            })
+        return detections
+    
     def get_model_info(self) -> Dict:
         """Get model metadata"""
         if not self.model:
             return {}
         
+        torch = _torch()
         return {
             'model_path': str(self.model_path),
             'device': str(self.device),
@@ -329,10 +603,18 @@ class YOLODetector:
             'class_names': list(self.model.names.values()) if hasattr(self.model, 'names') else [],
             'task': getattr(self.model, 'task', 'detect'),
             'gpu_available': torch.cuda.is_available(),
-            'gpu_name': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
+            'gpu_name': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+            'cache': self.cache_status,
+            'timings': self.timings
         }
 
 
+def _torch():
+    """torch module (already imported by YOLODetector.__init__; this is a dict lookup)"""
+    import torch
+    return torch
+
+
 # Backward compatibility: Keep old function interface
 def detect(image_path: str, conf_thresh: float = 0.25) -> List[Dict]:
     """
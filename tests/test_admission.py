@@ -0,0 +1,147 @@
+"""
+Admission control: shedding when the queue is full, Retry-After hints,
+priority displacement and ticket release (including streamed responses).
+
+Run with pytest from the repository root.
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import pytest
+
+from admission import (AdmissionController, AdmissionRejected, RouteLimit, TicketedStream,
+                       PRIORITY_LIVE, PRIORITY_UPLOAD, PRIORITY_BULK)
+
+
+def make_controller(max_concurrent=1, max_queue=2, wait_s=5.0):
+    return AdmissionController(max_concurrent=max_concurrent, max_queue=max_queue, routes={
+        'live': RouteLimit(1, max_queue, wait_s, PRIORITY_LIVE),
+        'predict': RouteLimit(1, max_queue, wait_s, PRIORITY_UPLOAD),
+        'video': RouteLimit(1, max_queue, wait_s, PRIORITY_BULK),
+    })
+
+
+def start_waiter(controller, route, outcome):
+    """Acquire on a thread; outcome[route] becomes the ticket or the AdmissionRejected"""
+    def run():
+        try:
+            outcome[route] = controller.acquire(route)
+        except AdmissionRejected as e:
+            outcome[route] = e
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for_queue(controller, depth, timeout=2.0):
+    deadline = time.time() + timeout
+    while controller.stats()['queue_depth'] != depth:
+        assert time.time() < deadline, f"queue never reached {depth}"
+        time.sleep(0.005)
+
+
+def test_full_queue_sheds_with_retry_after():
+    controller = make_controller(max_queue=1)
+    ticket = controller.acquire('predict')
+    outcome = {}
+    thread = start_waiter(controller, 'predict', outcome)
+    wait_for_queue(controller, 1)
+
+    with pytest.raises(AdmissionRejected) as shed:
+        controller.acquire('predict')
+    assert shed.value.reason == 'queue_full'
+    assert shed.value.retry_after >= 1
+    assert controller.stats()['routes']['predict']['rejected']['queue_full'] == 1
+
+    ticket.release()
+    thread.join(2)
+    outcome['predict'].release()
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_retry_after_scales_with_service_time_and_queue():
+    controller = make_controller()
+    ticket = controller.acquire('predict')
+    ticket.started -= 2.5  # Pretend the request ran for two and a half seconds
+    ticket.release()
+    assert controller.retry_after('predict') == 3
+
+    ticket = controller.acquire('predict')
+    outcome = {}
+    thread = start_waiter(controller, 'predict', outcome)
+    wait_for_queue(controller, 1)
+    assert controller.retry_after('predict') > 3  # One more request ahead
+    ticket.release()
+    thread.join(2)
+    outcome['predict'].release()
+
+
+def test_waiter_times_out():
+    controller = make_controller(wait_s=0.05)
+    ticket = controller.acquire('predict')
+    with pytest.raises(AdmissionRejected) as shed:
+        controller.acquire('predict')
+    assert shed.value.reason == 'timeout'
+    assert controller.stats()['routes']['predict']['queued'] == 0
+    ticket.release()
+
+
+def test_higher_priority_displaces_lower_priority_waiter():
+    controller = make_controller(max_queue=1)
+    ticket = controller.acquire('video')
+    outcome = {}
+    thread = start_waiter(controller, 'predict', outcome)
+    wait_for_queue(controller, 1)
+
+    live = {}
+    live_thread = start_waiter(controller, 'live', live)
+    thread.join(2)
+    assert isinstance(outcome['predict'], AdmissionRejected)
+    assert outcome['predict'].reason == 'evicted'
+
+    ticket.release()
+    live_thread.join(2)
+    live['live'].release()
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_context_manager_releases_on_error():
+    controller = make_controller()
+    with pytest.raises(RuntimeError):
+        with controller.admit('predict'):
+            raise RuntimeError('boom')
+    assert controller.stats()['in_flight'] == 0
+
+
+def test_ticket_release_is_idempotent():
+    controller = make_controller()
+    ticket = controller.acquire('predict')
+    ticket.release()
+    ticket.release()
+    assert controller.stats()['in_flight'] == 0
+    assert controller.stats()['routes']['predict']['in_flight'] == 0
+
+
+def test_ticketed_stream_releases_on_close_before_first_chunk():
+    controller = make_controller()
+    closed = []
+
+    def body():
+        try:
+            yield b'chunk'
+        finally:
+            closed.append(True)
+
+    stream = TicketedStream(body(), controller.acquire('predict'))
+    stream.close()  # Client disconnected before anything was sent
+    assert controller.stats()['in_flight'] == 0
+
+    stream = TicketedStream(body(), controller.acquire('predict'))
+    assert next(iter(stream)) == b'chunk'
+    stream.close()
+    assert closed == [True]
+    assert controller.stats()['in_flight'] == 0
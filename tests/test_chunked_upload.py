@@ -0,0 +1,168 @@
+"""
+Resumable chunked uploads: offset-addressed chunks, checksums, resume after
+a restart, and completion handed to the on_complete hook.
+
+Run with pytest from the repository root.
+"""
+import io
+import os
+import sys
+import hashlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import pytest
+
+from chunked_upload import ChunkedUploadManager, ChunkedUploadError
+from upload_store import UploadStore, UploadStoreError
+
+DATA = os.urandom(10_000)
+
+
+def send(manager, session, start, end, checksum=None):
+    chunk = DATA[start:end]
+    return manager.write_chunk(session.id, start, io.BytesIO(chunk), len(chunk), checksum=checksum)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ChunkedUploadManager(str(tmp_path))
+
+
+def test_chunks_assemble_into_the_original_file(manager):
+    session = manager.create('field.mp4', len(DATA), sha256=hashlib.sha256(DATA).hexdigest())
+    for start in range(0, len(DATA), 4096):
+        session = send(manager, session, start, min(start + 4096, len(DATA)))
+    assert session.status == 'complete' and session.offset == len(DATA)
+    with open(session.file_path, 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_offset_mismatch_reports_the_resume_point(manager):
+    session = manager.create('field.mp4', len(DATA))
+    send(manager, session, 0, 1000)
+    with pytest.raises(ChunkedUploadError) as mismatch:
+        send(manager, session, 2000, 3000)
+    assert mismatch.value.status == 409 and mismatch.value.offset == 1000
+
+
+def test_bad_chunk_checksum_is_rolled_back(manager):
+    session = manager.create('field.mp4', len(DATA))
+    with pytest.raises(ChunkedUploadError) as corrupt:
+        send(manager, session, 0, 1000, checksum='0' * 64)
+    assert corrupt.value.status == 422 and corrupt.value.offset == 0
+    session = send(manager, session, 0, 1000, checksum=hashlib.sha256(DATA[:1000]).hexdigest())
+    assert session.offset == 1000
+
+
+def test_short_chunk_is_rolled_back(manager):
+    session = manager.create('field.mp4', len(DATA))
+    with pytest.raises(ChunkedUploadError) as short:
+        manager.write_chunk(session.id, 0, io.BytesIO(DATA[:500]), 1000)
+    assert short.value.status == 400
+    assert manager.get(session.id).offset == 0
+
+
+def test_chunk_past_declared_size_is_rejected(manager):
+    session = manager.create('field.mp4', 100)
+    with pytest.raises(ChunkedUploadError) as too_long:
+        manager.write_chunk(session.id, 0, io.BytesIO(DATA[:200]), 200)
+    assert too_long.value.status == 416
+
+
+def test_whole_file_checksum_mismatch_restarts_upload(manager):
+    session = manager.create('field.mp4', 1000, sha256='0' * 64)
+    with pytest.raises(ChunkedUploadError) as mismatch:
+        send(manager, session, 0, 1000)
+    assert mismatch.value.status == 422 and mismatch.value.offset == 0
+    assert manager.get(session.id).status == 'uploading'
+
+
+def test_session_resumes_after_restart(tmp_path):
+    manager = ChunkedUploadManager(str(tmp_path))
+    session = manager.create('field.mp4', len(DATA))
+    send(manager, session, 0, 4000)
+
+    restarted = ChunkedUploadManager(str(tmp_path))
+    session = restarted.get(session.id)
+    assert session.offset == 4000
+    session = send(restarted, session, 4000, len(DATA))
+    assert session.status == 'complete'
+
+
+def test_abort_and_expire_remove_state(manager):
+    session = manager.create('field.mp4', len(DATA))
+    assert manager.abort(session.id)
+    assert manager.get(session.id) is None
+
+    stale = manager.create('field.mp4', len(DATA))
+    assert manager.expire(max_age_s=3600) == 0
+    assert manager.expire(max_age_s=-1) == 1
+    assert manager.get(stale.id) is None
+
+
+def test_invalid_sessions_are_rejected(manager):
+    with pytest.raises(ChunkedUploadError):
+        manager.create('', 100)
+    with pytest.raises(ChunkedUploadError):
+        manager.create('field.mp4', 0)
+    with pytest.raises(ChunkedUploadError) as missing:
+        manager.write_chunk('0' * 32, 0, io.BytesIO(b'x'), 1)
+    assert missing.value.status == 404
+
+
+def test_completion_hook_adopts_into_the_store(tmp_path):
+    store = UploadStore(str(tmp_path))
+
+    def adopt(session):
+        record, _ = store.adopt(session.file_path, session.filename, upload_id=session.id)
+        session.file_path = os.path.join(store.root, record.blob)
+
+    manager = ChunkedUploadManager(str(tmp_path), on_complete=adopt)
+    session = manager.create('field.mp4', len(DATA))
+    session = send(manager, session, 0, len(DATA))
+    assert session.status == 'complete'
+    with open(store.resolve(session.id), 'rb') as f:
+        assert f.read() == DATA
+
+
+def test_failed_completion_is_reported_and_can_be_retried(tmp_path):
+    store = UploadStore(str(tmp_path), quota_bytes=100)
+    submitted, queue_down = [], [True]
+
+    def complete(session):
+        """Like app._on_chunked_upload_complete: adopt once, then submit a job"""
+        record = store.get(session.id)
+        if record is None:
+            record, _ = store.adopt(session.file_path, session.filename, upload_id=session.id)
+        session.file_path = os.path.join(store.root, record.blob)
+        if queue_down[0]:
+            raise RuntimeError('job queue unavailable')
+        submitted.append(session.file_path)
+
+    manager = ChunkedUploadManager(str(tmp_path), on_complete=complete)
+    session = manager.create('field.mp4', len(DATA))
+
+    # Fails before adopt: the bytes stay with the session
+    with pytest.raises(ChunkedUploadError) as full:
+        send(manager, session, 0, len(DATA))
+    assert full.value.status == 507
+    session = manager.get(session.id)
+    assert session.status == 'uploading' and session.offset == len(DATA)
+    with pytest.raises(UploadStoreError):
+        store.resolve(session.id)
+
+    # Space freed, but fails after adopt: the store already holds the file
+    store.quota_bytes = 0
+    with pytest.raises(ChunkedUploadError) as down:
+        manager.write_chunk(session.id, len(DATA), io.BytesIO(b''), 0)
+    assert down.value.status == 500 and down.value.offset == len(DATA)
+    assert manager.get(session.id).status == 'uploading'
+
+    # An empty PUT at offset == size retries only what is left
+    queue_down[0] = False
+    session = manager.write_chunk(session.id, len(DATA), io.BytesIO(b''), 0)
+    assert session.status == 'complete'
+    assert submitted == [session.file_path] and store.usage()['ids'] == 1
+    with open(store.resolve(session.id), 'rb') as f:
+        assert f.read() == DATA
@@ -0,0 +1,87 @@
+"""
+Columnar detection format: Accept negotiation (with and without msgpack),
+row <-> column round trips, and video-stream records.
+
+Run with pytest from the repository root.
+"""
+import os
+import sys
+import json
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import pytest
+from werkzeug.datastructures import MIMEAccept
+
+import detection_format
+from detection_format import (JSON, COLUMNAR_JSON, COLUMNAR_MSGPACK, negotiate, columns_from_detections,
+                              columns_from_boxes, boxes_from_columns, stream_record, stream_mimetype)
+
+DETECTIONS = [
+    {'class_name': 'Blast', 'confidence': 0.9123, 'x1': 64, 'y1': 48, 'x2': 320, 'y2': 240},
+    {'class_name': 'Aphid', 'confidence': 0.64, 'x1': 0, 'y1': 0, 'x2': 10, 'y2': 5},
+    {'class_name': 'Blast', 'confidence': 0.405, 'x1': 100, 'y1': 100, 'x2': 640, 'y2': 480},
+]
+BOXES = [
+    {'class': 'Blast', 'conf': 91.2, 'x1': 0.1, 'y1': 0.1, 'x2': 0.5, 'y2': 0.5},
+    {'class': 'Aphid', 'conf': 64.0, 'x1': 0.0, 'y1': 0.0, 'x2': 0.0156, 'y2': 0.0104},
+    {'class': 'Blast', 'conf': 40.5, 'x1': 0.1562, 'y1': 0.2083, 'x2': 1.0, 'y2': 1.0},
+]
+
+
+@pytest.fixture
+def fake_msgpack(monkeypatch):
+    """Stands in for the optional msgpack package (JSON bytes, no trailing newline)"""
+    monkeypatch.setattr(detection_format, 'msgpack',
+                        types.SimpleNamespace(packb=lambda body, use_single_float: json.dumps(body).encode()))
+
+
+def accept(*types_):
+    return MIMEAccept([(t, 1) for t in types_])
+
+
+def test_negotiation_defaults_to_row_json():
+    assert negotiate(accept('*/*')) == JSON
+    assert negotiate(MIMEAccept()) == JSON
+    assert negotiate(accept(COLUMNAR_JSON)) == COLUMNAR_JSON
+
+
+def test_msgpack_is_offered_only_when_installed(monkeypatch, fake_msgpack):
+    assert negotiate(accept(COLUMNAR_MSGPACK)) == COLUMNAR_MSGPACK
+    assert negotiate(accept('application/x-msgpack')) == COLUMNAR_MSGPACK
+    monkeypatch.setattr(detection_format, 'msgpack', None)
+    assert negotiate(accept(COLUMNAR_MSGPACK)) == JSON
+
+
+def test_detector_output_round_trips_to_rows():
+    columns = columns_from_detections(DETECTIONS, width=640, height=480)
+    assert columns['classes'] == ['Blast', 'Aphid'] and columns['cls'] == [0, 1, 0]
+    assert boxes_from_columns(columns) == BOXES
+
+
+def test_rows_round_trip_through_columns():
+    assert boxes_from_columns(columns_from_boxes(BOXES)) == BOXES
+    empty = columns_from_boxes([])
+    assert empty['classes'] == [] and boxes_from_columns(empty) == []
+
+
+def test_stream_records_per_format(fake_msgpack):
+    record = {'frame': 12, 'timestamp': 0.4, 'detections': BOXES, 'frame_size': [480, 640]}
+
+    row = stream_record(record, JSON)
+    assert row.endswith(b'\n') and json.loads(row) == record
+
+    columnar = stream_record(record, COLUMNAR_JSON)
+    assert columnar.endswith(b'\n')
+    decoded = json.loads(columnar)
+    assert boxes_from_columns(decoded['detections']) == BOXES
+    assert {k: v for k, v in decoded.items() if k != 'detections'} == {k: v for k, v in record.items()
+                                                                      if k != 'detections'}
+
+    packed = stream_record(record, COLUMNAR_MSGPACK)
+    assert not packed.endswith(b'\n')  # MessagePack maps are concatenated, not line-delimited
+    assert boxes_from_columns(json.loads(packed)['detections']) == BOXES
+
+    assert stream_mimetype(COLUMNAR_MSGPACK) == COLUMNAR_MSGPACK
+    assert stream_mimetype(COLUMNAR_JSON) == stream_mimetype(JSON) == 'application/x-ndjson'
@@ -0,0 +1,100 @@
+"""
+Adaptive frame sampling: stride bounds, dense/sparse hysteresis, the
+latency-driven stride that keeps long videos in bounded time, and source
+timestamps.
+
+Run with pytest from the repository root.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import pytest
+
+from frame_sampler import AdaptiveFrameSampler
+from video_pipeline import source_timestamp
+
+
+def run(sampler, frames, latency_s=0.01, active=lambda ts: False):
+    """Drive sampler over `frames` frames; returns the processed (1-based) frame indices"""
+    processed = []
+    for index in range(1, frames + 1):
+        if sampler.should_process(index):
+            ts = (index - 1) / sampler.source_fps
+            sampler.update(latency_s, 1 if active(ts) else 0, ts, index)
+            processed.append(index)
+    return processed
+
+
+def test_strides_follow_target_and_idle_fps():
+    sampler = AdaptiveFrameSampler(30, target_fps=10, idle_fps=2)
+    assert (sampler.active_stride, sampler.idle_stride) == (3, 15)
+    assert sampler.stride == 3 and sampler.should_process(1)
+    # Unknown fps falls back to 30; idle never samples denser than active
+    assert AdaptiveFrameSampler(0).source_fps == 30.0
+    assert AdaptiveFrameSampler(30, target_fps=2, idle_fps=10).idle_stride == 15
+
+
+def test_stride_stays_within_bounds():
+    sampler = AdaptiveFrameSampler(30, target_fps=10, idle_fps=2)
+    processed = run(sampler, 3000, active=lambda ts: int(ts) % 20 < 3)
+    gaps = [b - a for a, b in zip(processed, processed[1:])]
+    assert min(gaps) >= sampler.active_stride
+    assert max(gaps) <= sampler.idle_stride
+
+
+def test_empty_field_ramps_gradually_to_sparse():
+    sampler = AdaptiveFrameSampler(30, target_fps=10, idle_fps=2)
+    processed = run(sampler, 300)
+    gaps = [b - a for a, b in zip(processed, processed[1:])]
+    assert gaps[:4] == [5, 8, 12, 15]  # Eases out (x1.5) instead of jumping to the idle stride
+    assert set(gaps[4:]) == {15}
+    assert sampler.stats()['mode'] == 'sparse'
+
+
+def test_detections_hold_dense_sampling_for_hold_seconds():
+    sampler = AdaptiveFrameSampler(30, target_fps=10, idle_fps=2, hold_seconds=2.0)
+    sampler.update(0.01, 3, 10.0, 301)  # Disease seen at t=10s
+    assert sampler.stride == sampler.active_stride and sampler.stats()['mode'] == 'dense'
+
+    sampler.update(0.01, 0, 11.9, 358)  # Empty, but within hold: stays dense
+    assert sampler.stride == sampler.active_stride
+    sampler.update(0.01, 0, 12.1, 364)  # Hold expired: starts ramping
+    assert sampler.stride == 5 and sampler.stats()['mode'] == 'sparse'
+    sampler.update(0.01, 1, 12.3, 369)  # A new detection snaps straight back to dense
+    assert sampler.stride == sampler.active_stride
+
+
+def test_latency_raises_the_stride_even_while_active():
+    sampler = AdaptiveFrameSampler(30, target_fps=10, min_speed=1.0)
+    sampler.update(0.5, 2, 0.0, 1)  # 0.5 s per inference: must skip 15 frames to keep up
+    assert sampler.latency_stride == 15 and sampler.stride == 15
+    unbounded = AdaptiveFrameSampler(30, target_fps=10, min_speed=0.0)
+    unbounded.update(0.5, 2, 0.0, 1)
+    assert unbounded.stride == unbounded.active_stride
+
+
+@pytest.mark.parametrize('latency_s,min_speed', [(0.2, 1.0), (0.05, 2.0), (1.0, 0.5)])
+def test_processing_time_is_bounded_by_duration_over_min_speed(latency_s, min_speed):
+    fps, minutes = 30, 10
+    sampler = AdaptiveFrameSampler(fps, target_fps=30, min_speed=min_speed)
+    processed = run(sampler, fps * 60 * minutes, latency_s=latency_s, active=lambda ts: True)
+    inference_s = len(processed) * latency_s
+    assert inference_s <= minutes * 60 / min_speed * 1.01
+
+
+class FakeCapture:
+    def __init__(self, pos_msec):
+        self.pos_msec = pos_msec
+
+    def get(self, prop):
+        assert prop == cv2.CAP_PROP_POS_MSEC
+        return self.pos_msec
+
+
+def test_source_timestamps():
+    assert source_timestamp(FakeCapture(1234.5678), 38, 30.0) == 1.235  # Container timestamps win
+    assert source_timestamp(FakeCapture(0), 31, 30.0) == 1.0  # Else derived from the frame number
+    assert source_timestamp(FakeCapture(0), 31, 0.0) == 0.0
@@ -0,0 +1,122 @@
+"""
+Inference scheduler: class priority, live-frame deadlines and aging of
+long-waiting batch work.
+
+Run with pytest from the repository root.
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import pytest
+
+from inference_scheduler import (InferenceScheduler, PriorityClass, FrameExpired, inference_class,
+                                 LIVE, UPLOAD, BATCH, _Waiter)
+
+
+def make_scheduler(live_deadline_ms=None, batch_aging_ms=None):
+    return InferenceScheduler({
+        LIVE: PriorityClass(LIVE, 0, 250.0, deadline_ms=live_deadline_ms),
+        UPLOAD: PriorityClass(UPLOAD, 1, 2000.0),
+        BATCH: PriorityClass(BATCH, 2, 10000.0, aging_ms=batch_aging_ms),
+    })
+
+
+def queue_worker(scheduler, name, order, errors, label=None):
+    """Take a slot as class name on a thread; appends label (default: name) to order once granted"""
+    def run():
+        try:
+            with inference_class(name):
+                with scheduler.slot():
+                    order.append(name if label is None else label)
+        except FrameExpired as e:
+            errors.append(e)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_queued(scheduler, count, timeout=2.0):
+    deadline = time.time() + timeout
+    while sum(c['queued'] for c in scheduler.stats()['classes'].values()) != count:
+        assert time.time() < deadline, f"queue never reached {count}"
+        time.sleep(0.005)
+
+
+def test_waiters_are_served_by_class_rank():
+    scheduler = make_scheduler()
+    order, errors, threads = [], [], []
+    with scheduler.slot():  # Model busy
+        for name in (BATCH, UPLOAD, LIVE):
+            threads.append(queue_worker(scheduler, name, order, errors))
+            wait_queued(scheduler, len(threads))
+    for thread in threads:
+        thread.join(2)
+    assert order == [LIVE, UPLOAD, BATCH]
+    assert not errors
+
+
+def test_same_class_is_first_come_first_served():
+    scheduler = make_scheduler()
+    order, errors, threads = [], [], []
+    with scheduler.slot():
+        for i in range(3):
+            threads.append(queue_worker(scheduler, UPLOAD, order, errors, label=i))
+            wait_queued(scheduler, len(threads))
+    for thread in threads:
+        thread.join(2)
+    assert order == [0, 1, 2]
+
+
+def test_live_frame_past_deadline_is_dropped():
+    scheduler = make_scheduler(live_deadline_ms=30)
+    order, errors = [], []
+    with scheduler.slot():
+        thread = queue_worker(scheduler, LIVE, order, errors)
+        thread.join(2)
+    assert order == []
+    assert len(errors) == 1 and errors[0].class_name == LIVE
+    stats = scheduler.stats()['classes'][LIVE]
+    assert stats['dropped_deadline'] == 1 and stats['queued'] == 0
+
+
+def test_deadline_counts_from_since():
+    scheduler = make_scheduler(live_deadline_ms=50)
+    with pytest.raises(FrameExpired):
+        with inference_class(LIVE, since=time.perf_counter() - 1.0):
+            with scheduler.slot():
+                pass
+
+
+def test_aging_promotes_long_waiting_batch_work():
+    scheduler = make_scheduler(batch_aging_ms=20)
+    order, errors, threads = [], [], []
+    with scheduler.slot():
+        threads.append(queue_worker(scheduler, BATCH, order, errors))
+        wait_queued(scheduler, 1)
+        time.sleep(0.1)  # Batch ages past both upload and live rank
+        threads.append(queue_worker(scheduler, UPLOAD, order, errors))
+        wait_queued(scheduler, 2)
+    for thread in threads:
+        thread.join(2)
+    assert order == [BATCH, UPLOAD]
+    assert scheduler.stats()['classes'][BATCH]['promoted_by_aging'] == 1
+
+
+def test_expired_waiter_does_not_count_as_promotion():
+    scheduler = make_scheduler(live_deadline_ms=30)
+    order, errors = [], []
+    with scheduler.slot():
+        # A live frame whose deadline passed but which hasn't woken up to remove itself yet
+        with scheduler._cond:
+            scheduler._seq += 1
+            expired = time.perf_counter() - 1.0
+            scheduler._waiters.append(_Waiter(scheduler.classes[LIVE], scheduler._seq, expired, expired))
+        thread = queue_worker(scheduler, BATCH, order, errors)
+        wait_queued(scheduler, 2)
+    thread.join(2)
+    assert order == [BATCH]
+    assert scheduler.stats()['classes'][BATCH]['promoted_by_aging'] == 0
@@ -0,0 +1,98 @@
+"""
+Letterbox preprocessing: geometry, box round-trips back to source pixels,
+buffer reuse and tiling windows.
+
+Run with pytest from the repository root.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+import pytest
+
+from letterbox import LetterboxPreprocessor, LetterboxMeta, tile_windows, PAD_VALUE
+
+
+def to_letterbox(meta: LetterboxMeta, boxes: np.ndarray) -> np.ndarray:
+    """Forward mapping (source pixels -> letterbox space), the inverse of LetterboxMeta.to_source"""
+    out = boxes.astype(np.float32) * meta.scale
+    out[:, [0, 2]] += meta.pad_x
+    out[:, [1, 3]] += meta.pad_y
+    return out
+
+
+@pytest.mark.parametrize('height,width', [(480, 640), (1080, 1920), (640, 480), (333, 222), (640, 640), (100, 700)])
+def test_box_round_trip(height, width):
+    preprocessor = LetterboxPreprocessor(320)
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    with preprocessor.prepared([frame]) as (_, metas):
+        meta = metas[0]
+    boxes = np.array([[0, 0, width, height], [width * 0.25, height * 0.1, width * 0.5, height * 0.9]],
+                     dtype=np.float32)
+    np.testing.assert_allclose(meta.to_source(to_letterbox(meta, boxes)), boxes, atol=1e-3)
+
+
+def test_to_source_clips_to_frame():
+    meta = LetterboxMeta(scale=0.5, pad_x=0, pad_y=40, width=640, height=480)
+    boxes = np.array([[-10, 0, 330, 330]], dtype=np.float32)  # Spills into the padding
+    assert meta.to_source(boxes).tolist() == [[0, 0, 640, 480]]
+
+
+def test_image_lands_centered_with_grey_padding():
+    preprocessor = LetterboxPreprocessor(320)
+    frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    with preprocessor.prepared([frame]) as (batch, metas):
+        meta = metas[0]
+        assert batch.shape == (1, 3, 320, 320) and batch.dtype == np.float32
+        assert (meta.pad_x, meta.pad_y) == (0, 40)
+        rgb = np.rint(batch[0].transpose(1, 2, 0) * 255).astype(np.uint8)
+    np.testing.assert_array_equal(rgb[:40], PAD_VALUE)
+    np.testing.assert_array_equal(rgb[280:], PAD_VALUE)
+    expected = cv2.resize(frame, (320, 240), interpolation=cv2.INTER_AREA)[..., ::-1]
+    np.testing.assert_array_equal(rgb[40:280], expected)
+
+
+def test_geometry_change_repaints_padding():
+    preprocessor = LetterboxPreprocessor(320)
+    white = np.full((480, 640, 3), 255, dtype=np.uint8)
+    with preprocessor.prepared([white]):
+        pass
+    with preprocessor.prepared([np.full((640, 480, 3), 255, dtype=np.uint8)]) as (batch, metas):
+        assert metas[0].pad_y == 0
+        rgb = np.rint(batch[0].transpose(1, 2, 0) * 255).astype(np.uint8)
+    # Rows that were image in the landscape frame are side padding now
+    np.testing.assert_array_equal(rgb[100:200, :metas[0].pad_x], PAD_VALUE)
+
+
+def test_buffers_are_reused_and_bounded():
+    preprocessor = LetterboxPreprocessor(160)
+    for height, width in [(480, 640), (360, 640), (720, 1280), (333, 222), (100, 700)] * 4:
+        with preprocessor.prepared([np.zeros((height, width, 3), dtype=np.uint8)]):
+            pass
+    stats = preprocessor.stats()
+    assert stats['buffer_sets'] == [[1, 160]]
+    assert stats['buffer_sets_in_use'] == 0
+
+
+def test_concurrent_callers_get_separate_buffers():
+    preprocessor = LetterboxPreprocessor(160)
+    frame = np.zeros((160, 160, 3), dtype=np.uint8)
+    with preprocessor.prepared([frame]) as (first, _):
+        with preprocessor.prepared([frame]) as (second, _):
+            assert first is not second
+            assert preprocessor.stats()['buffer_sets_in_use'] == 2
+    with preprocessor.prepared([frame]) as (again, _):
+        assert again is first or again is second
+
+
+def test_tile_windows_cover_the_frame():
+    windows = tile_windows(1080, 1920, 640, overlap=0.2)
+    covered = np.zeros((1080, 1920), dtype=bool)
+    for x0, y0, x1, y1 in windows:
+        assert x1 - x0 <= 640 and y1 - y0 <= 640
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+    assert tile_windows(300, 400, 640) == [(0, 0, 400, 300)]
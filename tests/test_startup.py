@@ -0,0 +1,50 @@
+"""
+Startup benchmark: a control-plane process (APP_ROLE=control) must import
+app.py quickly and without pulling in the ML stack.
+
+Runs the import in a fresh interpreter so modules cached by other tests
+don't hide a regression. Budget override: STARTUP_BUDGET_S (default 1.0).
+Run with pytest, or directly: python tests/test_startup.py
+"""
+import os
+import sys
+import json
+import subprocess
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+STARTUP_BUDGET_S = float(os.environ.get('STARTUP_BUDGET_S', '1.0'))
+HEAVY_MODULES = ['torch', 'ultralytics', 'tensorflow', 'cv2', 'requests']
+
+PROBE = f"""
+import sys, time, json
+sys.path.insert(0, {os.path.abspath(BACKEND_DIR)!r})
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({{'import_s': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_control_plane_import():
+    env = dict(os.environ, APP_ROLE='control')
+    # Fresh working dir: app.py creates uploads/ and reads models.json relative to cwd
+    with tempfile.TemporaryDirectory() as workdir:
+        out = subprocess.run([sys.executable, '-c', PROBE], cwd=workdir, env=env,
+                             capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_control_plane_import_is_fast_and_ml_free():
+    result = measure_control_plane_import()
+    assert result['loaded'] == [], f"Control plane imported heavy modules: {result['loaded']}"
+    assert result['import_s'] < STARTUP_BUDGET_S, (
+        f"Control-plane import took {result['import_s']:.3f}s (budget {STARTUP_BUDGET_S}s)"
+    )
+
+
+if __name__ == '__main__':
+    result = measure_control_plane_import()
+    print(f"✓ import app (APP_ROLE=control): {result['import_s'] * 1000:.0f} ms, heavy modules: {result['loaded'] or 'none'}")
+    sys.exit(0 if not result['loaded'] and result['import_s'] < STARTUP_BUDGET_S else 1)
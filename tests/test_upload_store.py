@@ -0,0 +1,156 @@
+"""
+Upload store: streaming dedupe, opaque ids, proof-of-possession links,
+TTL and quota cleanup, and pinning of blobs that jobs still use.
+
+Run with pytest from the repository root.
+"""
+import io
+import os
+import sys
+import hashlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import pytest
+
+import upload_store
+from upload_store import UploadStore, UploadStoreError
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path))
+
+
+@pytest.fixture
+def no_grace(monkeypatch):
+    """Let the sweeper touch blobs and ids immediately"""
+    monkeypatch.setattr(upload_store, 'GRACE_S', 0)
+
+
+def put(store, data: bytes, name='field.mp4'):
+    return store.put(io.BytesIO(data), name)
+
+
+def age(store, record, seconds):
+    """Pretend an id was last used `seconds` ago"""
+    record.last_access -= seconds
+    store._save(record)
+
+
+def answer(challenge, data: bytes) -> str:
+    start = challenge['offset']
+    return hashlib.sha256(challenge['token'].encode() + data[start:start + challenge['length']]).hexdigest()
+
+
+def test_identical_content_is_stored_once(store):
+    data = os.urandom(4096)
+    first, deduplicated = put(store, data)
+    assert not deduplicated
+    second, deduplicated = put(store, data, 'copy.mp4')
+    assert deduplicated
+    assert first.id != second.id and first.blob == second.blob
+    assert first.sha256 == hashlib.sha256(data).hexdigest()
+    assert store.usage()['blobs'] == 1 and store.usage()['ids'] == 2
+
+
+def test_ids_are_opaque_and_resolve_to_content(store):
+    data = os.urandom(1024)
+    record, _ = put(store, data)
+    assert 'blob' not in record.to_dict()
+    with open(store.resolve(record.id), 'rb') as f:
+        assert f.read() == data
+    with pytest.raises(UploadStoreError) as missing:
+        store.resolve('0' * 32)
+    assert missing.value.status == 404
+    assert store.get('../etc/passwd') is None
+
+
+def test_oversized_and_empty_uploads_are_rejected(store):
+    with pytest.raises(UploadStoreError) as too_big:
+        store.put(io.BytesIO(b'x' * 100), 'a.mp4', max_bytes=10)
+    assert too_big.value.status == 413
+    with pytest.raises(UploadStoreError):
+        put(store, b'')
+    assert os.listdir(os.path.join(store.root, store.INCOMING_DIR)) == []
+
+
+def test_link_requires_proof_of_possession(store):
+    data = os.urandom(200 * 1024)
+    record, _ = put(store, data)
+    sha256 = record.sha256
+
+    challenge = store.challenge(sha256, len(data))
+    unknown = store.challenge('0' * 64, len(data))
+    assert challenge.keys() == unknown.keys() and challenge['length'] == unknown['length']
+
+    assert store.link(sha256, 'x.mp4', len(data), challenge['token'], '0' * 64) is None
+    assert store.link(sha256, 'x.mp4', len(data) - 1, challenge['token'], answer(challenge, data)) is None
+    linked = store.link(sha256, 'x.mp4', len(data), challenge['token'], answer(challenge, data))
+    assert linked is not None and linked.blob == record.blob
+
+
+def test_link_rejects_expired_or_forged_tokens(store, monkeypatch):
+    data = os.urandom(1024)
+    record, _ = put(store, data)
+    challenge = store.challenge(record.sha256, len(data))
+    expires, offset, length, mac = challenge['token'].split('.')
+    forged = dict(challenge, token=f"{expires}.{offset}.{length}.{'0' * 64}")
+    assert store.link(record.sha256, 'x.mp4', len(data), forged['token'], answer(forged, data)) is None
+
+    monkeypatch.setattr(upload_store, 'CHALLENGE_TTL_S', -1)
+    stale = store.challenge(record.sha256, len(data))
+    assert store.link(record.sha256, 'x.mp4', len(data), stale['token'], answer(stale, data)) is None
+
+
+def test_sweep_expires_unused_ids_and_their_blobs(tmp_path, no_grace):
+    store = UploadStore(str(tmp_path), ttl_s=60)
+    old, _ = put(store, os.urandom(512))
+    fresh, _ = put(store, os.urandom(512))
+    age(store, old, 120)
+    stats = store.sweep()
+    assert stats['expired_ids'] == 1 and stats['blobs_removed'] == 1
+    assert store.get(old.id) is None and store.get(fresh.id) is not None
+
+
+def test_shared_blob_survives_until_last_id_goes(store, no_grace):
+    data = os.urandom(512)
+    first, _ = put(store, data)
+    second, _ = put(store, data)
+    store.delete(first.id)
+    store.sweep()
+    assert os.path.exists(store.resolve(second.id))
+    store.delete(second.id)
+    assert store.sweep()['blobs_removed'] == 1
+
+
+def test_quota_evicts_least_recently_used(tmp_path, no_grace):
+    store = UploadStore(str(tmp_path), quota_bytes=2500)
+    oldest, _ = put(store, os.urandom(1000))
+    newer, _ = put(store, os.urandom(1000))
+    age(store, oldest, 20)
+    age(store, newer, 10)
+    latest, _ = put(store, os.urandom(1000))
+    assert store.get(oldest.id) is None
+    assert store.get(newer.id) is not None and store.get(latest.id) is not None
+    with pytest.raises(UploadStoreError) as too_big:
+        put(store, os.urandom(3000))
+    assert too_big.value.status == 507
+
+
+def test_pinned_blobs_survive_ttl_and_quota(tmp_path, no_grace):
+    store = UploadStore(str(tmp_path), quota_bytes=2500, ttl_s=60)
+    in_use, _ = put(store, os.urandom(1000))
+    idle, _ = put(store, os.urandom(1000))
+    store.pinned = lambda: [os.path.join(store.root, in_use.blob)]
+    age(store, in_use, 120)
+    age(store, idle, 30)
+
+    put(store, os.urandom(1000))  # Over quota: the unpinned id goes, even though it is newer
+    assert store.get(idle.id) is None
+    store.sweep()
+    assert store.get(in_use.id) is not None
+
+    store.pinned = lambda: []
+    store.sweep()
+    assert store.get(in_use.id) is None
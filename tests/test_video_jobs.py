@@ -0,0 +1,127 @@
+"""
+Background video jobs: resuming from the checkpoint after a restart, the
+queue cap every producer goes through, and retention of finished jobs.
+
+Run with pytest from the repository root.
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import cv2
+import numpy as np
+import pytest
+
+import video_jobs
+from video_jobs import VideoJobManager, VideoJobError
+
+FRAMES = 20
+
+
+class Crash(BaseException):
+    """Stands in for the process dying mid-job (not an Exception, so the job isn't marked failed)"""
+
+
+class FrameDetector:
+    """Reads the frame number painted into each frame; optionally dies at a given frame"""
+
+    def __init__(self, crash_at=None):
+        self.seen = []
+        self.crash_at = crash_at
+
+    def predict_frame(self, frame):
+        frame_no = int(round(frame[..., 0].mean() / 10))
+        if frame_no == self.crash_at:
+            raise Crash()
+        self.seen.append(frame_no)
+        return {'detections': []}
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / 'field.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(1, FRAMES + 1):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def wait_status(manager, job_id, status, timeout=10.0):
+    deadline = time.time() + timeout
+    while manager.get(job_id).status != status:
+        assert time.time() < deadline, f"job never reached {status}"
+        time.sleep(0.02)
+
+
+def test_interrupted_job_resumes_from_its_checkpoint(tmp_path, video, monkeypatch):
+    monkeypatch.setattr(video_jobs, 'CHECKPOINT_INTERVAL_S', 0)  # Checkpoint after every record
+    jobs_dir = str(tmp_path / 'jobs')
+    first = VideoJobManager(jobs_dir, detector_provider=lambda: FrameDetector(crash_at=10))
+    job = first.submit(video, every_n=2)
+    with pytest.raises(Crash):
+        first._run(job)
+    assert job.status == 'running' and job.last_frame == 8
+    with open(first.results_path(job.id), 'ab') as f:
+        f.write(b'{"frame": 10, "half-writ')  # Work lost with the process, past the checkpoint
+
+    detector = FrameDetector()
+    restarted = VideoJobManager(jobs_dir, detector_provider=lambda: detector)
+    restarted.start()
+    wait_status(restarted, job.id, 'complete')
+
+    assert detector.seen == list(range(10, FRAMES + 1, 2))  # Nothing before the checkpoint is redone
+    with open(restarted.results_path(job.id), 'rb') as f:
+        frames = [json.loads(line)['frame'] for line in f]
+    assert frames == list(range(2, FRAMES + 1, 2))
+    assert restarted.get(job.id).resumed == 1
+
+
+def test_submit_refuses_jobs_past_max_queued(tmp_path):
+    manager = VideoJobManager(str(tmp_path), detector_provider=lambda: None, max_queued=2)
+    first = manager.submit('field.mp4')
+    manager.submit('field.mp4')
+    with pytest.raises(VideoJobError) as full:
+        manager.submit('field.mp4')
+    assert full.value.status == 429 and full.value.retry_after
+    assert manager.count_by_status() == {'queued': 2}
+
+    manager.cancel(first.id)  # A cancelled job frees its place
+    manager.submit('field.mp4')
+
+
+def test_attached_process_counts_jobs_on_disk(tmp_path):
+    owner = VideoJobManager(str(tmp_path), detector_provider=lambda: None, max_queued=1)
+    owner.submit('field.mp4')
+    other = VideoJobManager(str(tmp_path), detector_provider=lambda: None, max_queued=1)
+    other.attach()
+    with pytest.raises(VideoJobError):
+        other.submit('field.mp4')
+
+
+def test_finished_jobs_are_pruned_after_retention(tmp_path):
+    manager = VideoJobManager(str(tmp_path), detector_provider=lambda: None, retention_s=3600)
+    old, recent, waiting = (manager.submit('field.mp4') for _ in range(3))
+    for job, ended in ((old, time.time() - 7200), (recent, time.time() - 60)):
+        job.status, job.finished_at = 'complete', ended
+        manager._save(job)
+
+    assert manager.prune() == 1
+    assert manager.get(old.id) is None and not os.path.exists(os.path.join(str(tmp_path), old.id))
+    assert manager.get(recent.id) is not None and manager.get(waiting.id) is not None
+
+
+def test_attached_listing_follows_updates_on_disk(tmp_path):
+    owner = VideoJobManager(str(tmp_path), detector_provider=lambda: None)
+    job = owner.submit('field.mp4')
+    other = VideoJobManager(str(tmp_path), detector_provider=lambda: None)
+    other.attach()
+    assert other.count_by_status() == {'queued': 1}
+
+    job.status = 'running'
+    owner._save(job)
+    assert other.count_by_status() == {'running': 1}
+    assert other.video_paths_in_use() == [job.video_path]
@@ -0,0 +1,63 @@
+"""
+Client-supplied video paths: only VIDEO_PATH_ROOTS are readable, and stored
+uploads are reachable by upload_id only, never by a path built from a hash.
+
+Imports app.py as a control-plane process (no model). Run with pytest from
+the repository root.
+"""
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+
+import pytest
+
+from upload_store import UploadStore
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    # app.py creates uploads/ relative to the working directory at import
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv('APP_ROLE', 'control')
+        patch.chdir(tmp_path_factory.mktemp('app'))
+        import app
+    return app
+
+
+@pytest.fixture
+def resolve(app_module, tmp_path, monkeypatch):
+    """_resolve_video with tmp_path as the only allowed root and the upload store inside it"""
+    monkeypatch.setattr(app_module, 'VIDEO_PATH_ROOTS', [str(tmp_path)])
+    monkeypatch.setattr(app_module, 'uploads', UploadStore(str(tmp_path / 'uploads')))
+
+    def run(data):
+        with app_module.app.test_request_context():
+            path, error = app_module._resolve_video(data)
+            return path, (error[1] if error else None)
+    return run
+
+
+def test_video_inside_allowed_root_resolves(resolve, tmp_path):
+    video = tmp_path / 'field.mp4'
+    video.write_bytes(b'video')
+    assert resolve({'video_path': str(video)}) == (os.path.realpath(video), None)
+    assert resolve({'video_path': str(tmp_path / 'missing.mp4')}) == (None, 404)
+
+
+def test_path_outside_allowed_roots_is_refused(resolve):
+    assert resolve({'video_path': '/etc/passwd'}) == (None, 403)
+    assert resolve({'video_path': '../../etc/passwd'}) == (None, 403)
+
+
+def test_stored_upload_is_reachable_by_id_only(app_module, resolve):
+    record, _ = app_module.uploads.put(io.BytesIO(os.urandom(1024)), 'field.mp4')
+    blob = os.path.join(app_module.uploads.root, record.blob)
+    assert os.path.exists(blob)
+
+    # Knowing the hash (and so the blob path) must not be enough, not even to learn that it exists
+    assert resolve({'video_path': blob}) == (None, 403)
+    assert resolve({'video_path': blob + '.missing'}) == (None, 403)
+    assert resolve({'video_path': os.path.join(app_module.uploads.root, '.chunked', 'x.part')}) == (None, 403)
+    assert resolve({'upload_id': record.id}) == (blob, None)